@@ -3,6 +3,7 @@ Celery configuration for PDF automation
 """
 import os
 from celery import Celery
+from celery.signals import before_task_publish, task_prerun, worker_process_init, worker_process_shutdown
 
 # Set default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pdf_automation.settings')
@@ -16,6 +17,37 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+@worker_process_init.connect
+def _init_worker_process(**kwargs):
+    # Imported here: the signal fires after Django is set up in the worker
+    from processing.worker_bootstrap import bootstrap_worker_process
+
+    bootstrap_worker_process(**kwargs)
+
+
+@worker_process_shutdown.connect
+def _shutdown_worker_process(**kwargs):
+    from processing.worker_bootstrap import shutdown_worker_process
+
+    shutdown_worker_process(**kwargs)
+
+
+@before_task_publish.connect
+def _count_published_task(sender=None, body=None, **kwargs):
+    # Protocol 2 body: (args, kwargs, embed)
+    from processing.job_leases import task_published
+
+    args, task_kwargs = (body[0], body[1]) if isinstance(body, (list, tuple)) else ((), {})
+    task_published(sender, args, task_kwargs)
+
+
+@task_prerun.connect
+def _count_started_task(sender=None, args=None, kwargs=None, **extra):
+    from processing.job_leases import task_started
+
+    task_started(getattr(sender, 'name', ''), args, kwargs)
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
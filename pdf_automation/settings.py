@@ -172,12 +172,93 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+# Results of tasks that do keep them (job entry points) are dropped after this many seconds
+CELERY_RESULT_EXPIRES = int(os.getenv('CELERY_RESULT_EXPIRES', 6 * 3600))
+
+# Caches
+# 'page_ranges' holds parsed Word statements keyed by document SHA-256 and is shared
+# by web and Celery workers. Short socket timeouts: a Redis outage only costs a re-parse.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'page_ranges': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('PAGE_RANGE_CACHE_URL', 'redis://localhost:6379/1'),
+        'KEY_PREFIX': 'hyperlink',
+        'TIMEOUT': int(os.getenv('PAGE_RANGE_CACHE_TTL', 7 * 24 * 3600)),
+        'OPTIONS': {
+            'socket_connect_timeout': 1,
+            'socket_timeout': 1,
+        },
+    },
+}
+PAGE_RANGE_CACHE_TTL = int(os.getenv('PAGE_RANGE_CACHE_TTL', 7 * 24 * 3600))
 
 # Split tuning (recommended for typical 300-output PDFs)
 SPLIT_TASK_CHUNK_SIZE = int(os.getenv('SPLIT_TASK_CHUNK_SIZE', 25))
 
+# Adaptive fan-out: outputs are packed into chunks of equal estimated work (pages and
+# bytes per output, model refitted from recorded chunk durations), a few chunks per
+# live 'split' worker slot. SPLIT_TASK_CHUNK_SIZE is only used when this is off.
+SPLIT_ADAPTIVE_CHUNKS = os.getenv('SPLIT_ADAPTIVE_CHUNKS', '1') == '1'
+SPLIT_CHUNKS_PER_SLOT = int(os.getenv('SPLIT_CHUNKS_PER_SLOT', 2))
+# Used when no worker answers the inspect broadcast
+SPLIT_WORKER_SLOTS_FALLBACK = int(os.getenv('SPLIT_WORKER_SLOTS_FALLBACK', 2))
+SPLIT_INSPECT_TIMEOUT = float(os.getenv('SPLIT_INSPECT_TIMEOUT', 1.0))
+
+# Processes a single split chunk task may use (one mmap'd input per process, outputs
+# pulled from a shared queue). The split workers run the solo pool so their tasks may
+# start these pools (prefork children are daemonic and cannot). Shrinks while other
+# jobs are running.
+SPLIT_WORKER_PROCS = int(os.getenv('SPLIT_WORKER_PROCS', 2))
+SPLIT_PARALLEL_MIN_OUTPUTS = int(os.getenv('SPLIT_PARALLEL_MIN_OUTPUTS', 4))
+
+# Split backend: 'auto' (calibrated per input during preflight), 'qpdf', 'pikepdf' or 'pypdf2'
+SPLIT_BACKEND = os.getenv('SPLIT_BACKEND', 'auto')
+# Outputs from the real request timed per backend during calibration
+SPLIT_CALIBRATION_SAMPLES = int(os.getenv('SPLIT_CALIBRATION_SAMPLES', 3))
+
+# Split worker processes import the backend libraries when they start (worker_process_init)
+# and keep up to SPLIT_INPUT_HANDLES inputs open between a job's chunk tasks (LRU, keyed
+# by job and input file). Handles idle for SPLIT_INPUT_HANDLE_IDLE_S are closed; an open
+# handle keeps the input locked on Windows. 0 opens the input in every task.
+WORKER_PRELOAD_SPLIT_BACKENDS = os.getenv('WORKER_PRELOAD_SPLIT_BACKENDS', '1') == '1'
+SPLIT_INPUT_HANDLES = int(os.getenv('SPLIT_INPUT_HANDLES', 4))
+SPLIT_INPUT_HANDLE_IDLE_S = int(os.getenv('SPLIT_INPUT_HANDLE_IDLE_S', 300))
+
+# Post-pass on split outputs: de-duplicate shared fonts/images, drop unused resources
+# and (optionally) write object streams. Shrinks uploads for scanned records.
+SPLIT_OPTIMIZE_OUTPUTS = os.getenv('SPLIT_OPTIMIZE_OUTPUTS', '1') == '1'
+SPLIT_OBJECT_STREAMS = os.getenv('SPLIT_OBJECT_STREAMS', '1') == '1'
+
+# Split outputs are cached by (input SHA-256, segments, backend version) under
+# MEDIA_ROOT/processing/split_cache and hard-linked into later jobs.
+# Prune with: python manage.py prune_split_cache
+SPLIT_CACHE_ENABLED = os.getenv('SPLIT_CACHE_ENABLED', '1') == '1'
+SPLIT_CACHE_MAX_AGE_DAYS = int(os.getenv('SPLIT_CACHE_MAX_AGE_DAYS', 14))
+
+# Drive API rate limit: one token bucket per service account shared by all workers
+# (Redis, Lua). Keep the rate a little under the project's per-user quota. Upload
+# tasks wait up to DRIVE_API_MAX_WAIT_S for a token and reschedule themselves beyond
+# that; other callers wait for their slot. A 429/403 rate-limit answer drains
+# DRIVE_API_PENALTY_S of quota.
+# DRIVE_API_RATE_PER_SEC=0 disables the limiter.
+DRIVE_API_RATE_PER_SEC = float(os.getenv('DRIVE_API_RATE_PER_SEC', 10))
+DRIVE_API_BURST = int(os.getenv('DRIVE_API_BURST', 20))
+DRIVE_API_MAX_WAIT_S = float(os.getenv('DRIVE_API_MAX_WAIT_S', 10))
+DRIVE_API_PENALTY_S = float(os.getenv('DRIVE_API_PENALTY_S', 1.0))
+DRIVE_RATE_LIMIT_REDIS_URL = os.getenv('DRIVE_RATE_LIMIT_REDIS_URL', CELERY_BROKER_URL)
+
+# Split outputs are uploaded in chunk tasks of up to `batch_size` files and about
+# UPLOAD_CHUNK_TARGET_MB, each uploading UPLOAD_CHUNK_THREADS files at a time.
+# Files that fail are retried one per task (upload_split_file_job).
+UPLOAD_CHUNK_TARGET_MB = int(os.getenv('UPLOAD_CHUNK_TARGET_MB', 64))
+UPLOAD_CHUNK_THREADS = int(os.getenv('UPLOAD_CHUNK_THREADS', 4))
+
 # Celery queue routing
-# On Windows Server, run separate celery workers with --pool=solo per queue.
+# Every task is routed here (no per-call queue= overrides). Start the workers with
+# `python manage.py run_workers` (see WORKER_PROFILES below).
 CELERY_TASK_DEFAULT_QUEUE = os.getenv('CELERY_TASK_DEFAULT_QUEUE', 'default')
 CELERY_TASK_CREATE_MISSING_QUEUES = True
 
@@ -186,16 +267,91 @@ CELERY_TASK_ROUTES = {
     'processing.tasks.preflight_split_job': {'queue': 'split'},
     'processing.tasks.split_pdf_job': {'queue': 'split'},
     'processing.tasks.split_pdf_chunk_job': {'queue': 'split'},
-    'processing.tasks.finalize_split_job': {'queue': 'split'},
+
+    'processing.tasks.batch_link_documents_chunk_job': {'queue': 'split'},
 
     # Network-bound work
     'processing.tasks.upload_split_job': {'queue': 'upload'},
+    'processing.tasks.upload_split_chunk_job': {'queue': 'upload'},
+    'processing.tasks.upload_split_file_job': {'queue': 'upload'},
+    'processing.tasks.batch_process_documents_job': {'queue': 'upload'},
+
+    # Short bookkeeping (aggregate status files, poll progress)
+    'processing.tasks.finalize_split_job': {'queue': 'control'},
+    'processing.tasks.finalize_upload_job': {'queue': 'control'},
+    'processing.tasks.finalize_batch_documents_job': {'queue': 'control'},
 }
 
+# Worker topology used by `python manage.py run_workers`: one worker per profile.
+# - split: CPU bound. Several solo workers side by side (workers 0 = one per
+#   procs_per_task cores), each task free to start its own process pool
+#   (SPLIT_WORKER_PROCS, BATCH_LINK_WORKER_PROCS). Not prefork: its children are
+#   daemonic, so those pools would never start.
+# - upload: waits on Drive, so many threads in one process
+# - control: finalize/status tasks, never stuck behind a split or an upload
+#   (also consumes the default queue)
+WORKER_PROFILES = {
+    'split': {
+        'queues': ['split'],
+        'pool': os.getenv('SPLIT_WORKER_POOL', 'solo'),
+        'workers': int(os.getenv('SPLIT_WORKERS', 0)),
+        'procs_per_task': SPLIT_WORKER_PROCS,
+        'prefetch_multiplier': 1,
+    },
+    'upload': {
+        'queues': ['upload'],
+        'pool': os.getenv('UPLOAD_WORKER_POOL', 'threads'),
+        'concurrency': int(os.getenv('UPLOAD_WORKER_CONCURRENCY', 16)),
+        'prefetch_multiplier': 2,
+    },
+    'control': {
+        'queues': ['control', CELERY_TASK_DEFAULT_QUEUE],
+        'pool': os.getenv('CONTROL_WORKER_POOL', 'threads'),
+        'concurrency': int(os.getenv('CONTROL_WORKER_CONCURRENCY', 4)),
+        'prefetch_multiplier': 4,
+    },
+}
+
+# Lean results: fan-out tasks (chunks, per-file uploads, finalizers) run with
+# ignore_result, so big jobs do not put one result per chunk/file into Redis.
+# Nothing reads those results: progress comes from the status files and chunk
+# completion is counted on disk (see _expect_chunks), not by chords.
+LEAN_TASK_RESULTS = os.getenv('LEAN_TASK_RESULTS', '1') == '1'
+CELERY_TASK_ANNOTATIONS = {
+    f'processing.tasks.{name}': {'ignore_result': True}
+    for name in (
+        'split_pdf_chunk_job',
+        'finalize_split_job',
+        'upload_split_chunk_job',
+        'upload_split_file_job',
+        'finalize_upload_job',
+        'batch_link_documents_chunk_job',
+        'finalize_batch_documents_job',
+    )
+} if LEAN_TASK_RESULTS else {}
+
+# Batch Word linking (many ROR documents in one job)
+BATCH_LINK_CHUNK_SIZE = int(os.getenv('BATCH_LINK_CHUNK_SIZE', 10))
+BATCH_LINK_WORKER_PROCS = int(os.getenv('BATCH_LINK_WORKER_PROCS', 2))
+BATCH_DRIVE_LOOKUP_THREADS = int(os.getenv('BATCH_DRIVE_LOOKUP_THREADS', 4))
+
+# Word documents at or above this size (MB) are linked with the memory-bounded
+# streaming engine (only the document body is parsed; media is stream-copied). 0 disables.
+WORD_STREAMING_THRESHOLD_MB = int(os.getenv('WORD_STREAMING_THRESHOLD_MB', 20))
+
 # Backpressure (limits for concurrent running jobs)
 # These protect the server from RAM spikes when many users start jobs at once.
 MAX_RUNNING_JOBS_TOTAL = int(os.getenv('MAX_RUNNING_JOBS_TOTAL', 4))
 MAX_RUNNING_JOBS_ASYNC = int(os.getenv('MAX_RUNNING_JOBS_ASYNC', 3))
+# Jobs beyond the limits are queued (processing.job_queue): users with fewer running
+# jobs first, then smaller jobs; a job's size counts half after waiting this long.
+JOB_QUEUE_AGING_S = int(os.getenv('JOB_QUEUE_AGING_S', 300))
+# Running jobs hold a Redis lease renewed by their tasks' heartbeats and on fan-out; a
+# run whose lease expires (worker crashed) is finished FAILED and frees its slot, unless
+# its tasks are still waiting in the broker.
+# Reap on demand with: python manage.py reap_job_leases
+JOB_LEASE_TTL_S = int(os.getenv('JOB_LEASE_TTL_S', 900))
+JOB_LEASE_REDIS_URL = os.getenv('JOB_LEASE_REDIS_URL', CELERY_BROKER_URL)
 
 # Authentication Settings
 LOGIN_URL = '/login/'
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Patient, OriginalPDF, PDFSet, DriveFolderCache, SummaryDocument, ProcessingRun, ProcessingStep
+from .models import (
+    Patient, OriginalPDF, PDFSet, DriveFolderCache, SummaryDocument, ProcessingRun, ProcessingStep, JobQueueEntry,
+)
 
 @admin.register(Patient)
 class PatientAdmin(admin.ModelAdmin):
@@ -45,3 +47,10 @@ class ProcessingStepAdmin(admin.ModelAdmin):
     list_display = ('run', 'step', 'status', 'started_at', 'finished_at', 'duration_ms', 'count_total', 'count_done', 'count_failed')
     search_fields = ('run__job_id', 'run__patient_name')
     list_filter = ('step', 'status', 'started_at')
+
+
+@admin.register(JobQueueEntry)
+class JobQueueEntryAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'job_id', 'status', 'user', 'cost', 'created_at', 'admitted_at')
+    search_fields = ('job_id', 'user__username')
+    list_filter = ('kind', 'status', 'created_at')
@@ -4,6 +4,8 @@ from typing import Optional
 
 from django.utils import timezone
 
+from processing import job_leases
+
 from .models import ProcessingRun, ProcessingStep, ProcessingHistory
 
 
@@ -40,10 +42,13 @@ def get_or_create_run(
     if updated:
         run.save(update_fields=["user", "processing_history", "patient_name"])
 
+    if run.status == "RUNNING":
+        job_leases.acquire_lease(run)
     return run
 
 
 def start_step(run: ProcessingRun, step: str, *, extra: Optional[dict] = None) -> ProcessingStep:
+    job_leases.heartbeat(run.job_id, run.run_mode)
     return ProcessingStep.objects.create(
         run=run,
         step=step,
@@ -63,6 +68,7 @@ def finish_step(
     error_message: str = "",
     extra: Optional[dict] = None,
 ) -> ProcessingStep:
+    job_leases.heartbeat(step.run.job_id, step.run.run_mode)
     step.status = status
     step.finished_at = timezone.now()
     if step.started_at and step.finished_at:
@@ -94,6 +100,7 @@ def finish_run(
     error_code: str = "",
     error_message: str = "",
     extra: Optional[dict] = None,
+    dispatch: bool = True,
 ) -> ProcessingRun:
     run.status = status
     run.finished_at = timezone.now()
@@ -110,4 +117,25 @@ def finish_run(
         run.extra = merged
 
     run.save()
+    job_leases.release_lease(run)
+
+    # Pipelines submit their next stage as soon as this one ends (see processing.pipeline)
+    try:
+        from processing import pipeline
+
+        stage_step = run.steps.exclude(step="PIPELINE").order_by("-started_at").first()
+        if stage_step is not None:
+            pipeline.stage_finished(run, stage_step.step, status)
+    except Exception as e:
+        print(f"[analytics] could not advance pipeline: {e}")
+
+    # A slot just freed up: admit the next queued job (the lease reaper pumps once itself)
+    if not dispatch:
+        return run
+    try:
+        from processing.job_queue import dispatch_queued_jobs
+
+        dispatch_queued_jobs()
+    except Exception as e:
+        print(f"[analytics] could not dispatch queued jobs: {e}")
     return run
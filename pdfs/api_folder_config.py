@@ -34,6 +34,7 @@ def get_folder_config(request):
                 'path_template': config.path_template,
                 'pdf_subfolder': config.pdf_subfolder,
                 'description': config.description,
+                'linearize_split_outputs': config.linearize_split_outputs,
                 'is_active': config.is_active,
             }
         })
@@ -58,7 +59,8 @@ def update_folder_config(request):
         "root_folder_id": "1GyZj...",
         "pdf_subfolder": "",  // e.g., "splits" or empty
         "path_template": "",  // for CUSTOM type
-        "description": "..."
+        "description": "...",
+        "linearize_split_outputs": false  // fast web view split outputs
     }
     """
     try:
@@ -88,6 +90,9 @@ def update_folder_config(request):
         if 'description' in request.data:
             config.description = request.data['description']
 
+        if 'linearize_split_outputs' in request.data:
+            config.linearize_split_outputs = str(request.data['linearize_split_outputs']).lower() in ('1', 'true', 'yes', 'on')
+
         config.save()
 
         # Clear cache
@@ -104,6 +109,7 @@ def update_folder_config(request):
                 'pdf_subfolder': config.pdf_subfolder,
                 'path_template': config.path_template,
                 'description': config.description,
+                'linearize_split_outputs': config.linearize_split_outputs,
             }
         })
 
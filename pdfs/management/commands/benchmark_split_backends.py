@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from processing.pdf_utils import get_pdf_page_count
+from processing.split_backends import SPLIT_BACKENDS, SplitBackend
+from processing.split_spec import parse_split_groups
+
+from .benchmark_split_flow import _make_mixed_ranges
+
+
+def _time_per_call(backend: SplitBackend, pdf_path: str, jobs: list) -> float:
+    """Previous behaviour: every output opens (for qpdf: re-parses) the input on its own."""
+    t0 = time.time()
+    for output_pdf, segments in jobs:
+        backend.extract(pdf_path, output_pdf, segments)
+    return time.time() - t0
+
+
+def _time_batched(backend: SplitBackend, pdf_path: str, jobs: list) -> tuple[float, int]:
+    """One extract_many() per input; for qpdf one subprocess run per distinct output length."""
+    t0 = time.time()
+    errors = backend.extract_many(pdf_path, jobs)
+    return time.time() - t0, sum(1 for e in errors if e)
+
+
+def _total_bytes(jobs: list) -> int:
+    return sum(os.path.getsize(output_pdf) for output_pdf, _ in jobs if os.path.exists(output_pdf))
+
+
+class Command(BaseCommand):
+    help = "Benchmark split backends (per-output calls vs one batch per input) without Celery."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pdf",
+            required=True,
+            help="Absolute path to a PDF file (e.g. D:/hyperlink_POC/Sample/benchmark_500_pages.pdf)",
+        )
+        parser.add_argument(
+            "--outputs",
+            nargs="+",
+            type=int,
+            default=[25, 100, 300, 2000],
+            help="List of output counts to test (default: 25 100 300 2000)",
+        )
+        parser.add_argument(
+            "--backends",
+            nargs="+",
+            default=list(SPLIT_BACKENDS),
+            help="Backends to compare (default: all available)",
+        )
+
+    def handle(self, *args, **options):
+        pdf_path = Path(options["pdf"])
+        if not pdf_path.exists():
+            raise SystemExit(f"PDF not found: {pdf_path}")
+
+        total_pages = get_pdf_page_count(str(pdf_path))
+        self.stdout.write(f"PDF pages: {total_pages}")
+
+        backends = []
+        for name in options["backends"]:
+            backend = SPLIT_BACKENDS.get(name)
+            if backend is None or not backend.is_available():
+                self.stdout.write(f"Skipping unavailable backend: {name}")
+                continue
+            backends.append(backend)
+
+        results = {
+            "started_at": datetime.utcnow().isoformat(),
+            "pdf": str(pdf_path),
+            "total_pages": total_pages,
+            "outputs": [],
+        }
+
+        for n in options["outputs"]:
+            groups = parse_split_groups(_make_mixed_ranges(n, total_pages))
+            row = {"n": n, "backends": {}}
+
+            for backend in backends:
+                out_dir = Path(tempfile.mkdtemp(prefix=f"bench_{backend.name}_"))
+                try:
+                    per_call_jobs = [(str(out_dir / "per_call" / f"{i}.pdf"), g["segments"]) for i, g in enumerate(groups)]
+                    batch_jobs = [(str(out_dir / "batch" / f"{i}.pdf"), g["segments"]) for i, g in enumerate(groups)]
+
+                    per_call_s = _time_per_call(backend, str(pdf_path), per_call_jobs)
+                    batch_s, batch_failed = _time_batched(backend, str(pdf_path), batch_jobs)
+                    per_call_bytes = _total_bytes(per_call_jobs)
+                    batch_bytes = _total_bytes(batch_jobs)
+                finally:
+                    shutil.rmtree(out_dir, ignore_errors=True)
+
+                row["backends"][backend.name] = {
+                    "per_call_s": round(per_call_s, 3),
+                    "batch_s": round(batch_s, 3),
+                    "batch_failed": batch_failed,
+                    "speedup": round(per_call_s / batch_s, 2) if batch_s > 0 else None,
+                    # Batch outputs must not grow: shared fonts/images are kept once per output
+                    "per_call_bytes": per_call_bytes,
+                    "batch_bytes": batch_bytes,
+                }
+                self.stdout.write(
+                    f"outputs={n} backend={backend.name} per_call_s={round(per_call_s, 3)} "
+                    f"batch_s={round(batch_s, 3)} failed={batch_failed} bytes={per_call_bytes}/{batch_bytes}"
+                )
+
+            results["outputs"].append(row)
+
+        results["finished_at"] = datetime.utcnow().isoformat()
+
+        out_dir = Path(settings.MEDIA_ROOT) / "benchmarks"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out_path = out_dir / f"split_backends_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
+        out_path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        self.stdout.write(f"\nSaved benchmark results: {out_path}")
+        return ""
@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from processing.pdf_utils import get_pdf_page_count
+from processing.split_backends import SPLIT_BACKENDS, SplitBackend, input_handles
+from processing.split_spec import parse_split_groups
+
+from .benchmark_split_flow import _make_mixed_ranges
+
+
+# Runs in a fresh interpreter: what a new worker process pays before and during its first chunk
+_COLD_START_SCRIPT = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from processing import split_backends, pdf_utils, pdf_optimize
+import_ms = (time.perf_counter() - t0) * 1000
+preload_ms = 0.0
+if sys.argv[3] == '1':
+    t0 = time.perf_counter()
+    split_backends.preload_backends()
+    preload_ms = (time.perf_counter() - t0) * 1000
+backend = split_backends.SPLIT_BACKENDS[sys.argv[2]]
+t0 = time.perf_counter()
+errors = backend.extract_many(sys.argv[1], [(sys.argv[4], [(1, 1)])])
+first_task_ms = (time.perf_counter() - t0) * 1000
+print(json.dumps({
+    'import_ms': round(import_ms, 1),
+    'preload_ms': round(preload_ms, 1),
+    'first_task_ms': round(first_task_ms, 1),
+    'failed': sum(1 for e in errors if e),
+    'ocr_modules_loaded': sorted(m for m in ('pytesseract', 'PIL') if m in sys.modules),
+}))
+"""
+
+
+def _cold_start(backend: SplitBackend, pdf_path: str, preload: bool, out_dir: Path) -> dict:
+    proc = subprocess.run(
+        [sys.executable, '-c', _COLD_START_SCRIPT, pdf_path, backend.name, '1' if preload else '0', str(out_dir / 'cold.pdf')],
+        cwd=str(settings.BASE_DIR),
+        env=dict(os.environ, DJANGO_SETTINGS_MODULE='pdf_automation.settings'),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        return {'error': (proc.stderr or '').strip().splitlines()[-1:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _time_tasks(backend: SplitBackend, pdf_path: str, chunks: list, job_id: str) -> dict:
+    """Run the chunks back to back like one worker process; job_id='' opens the input in every task."""
+    input_handles.close()
+    stats_before = dict(input_handles.stats)
+    durations = []
+    failed = 0
+    for jobs in chunks:
+        t0 = time.perf_counter()
+        errors = backend.extract_many(pdf_path, jobs, job_id=job_id)
+        durations.append((time.perf_counter() - t0) * 1000)
+        failed += sum(1 for e in errors if e)
+    input_handles.close()
+
+    row = {
+        'tasks': len(durations),
+        'first_task_ms': round(durations[0], 1) if durations else None,
+        'per_task_ms': round(sum(durations) / len(durations), 1) if durations else None,
+        'later_tasks_ms': round(sum(durations[1:]) / (len(durations) - 1), 1) if len(durations) > 1 else None,
+        'failed': failed,
+    }
+    if job_id:
+        row.update({k: input_handles.stats[k] - stats_before[k] for k in ('hits', 'misses', 'open_ms')})
+    return row
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark split worker overhead: cold start of a new worker process (with and without "
+        "preloading the backends) and per-task cost with and without the input handle cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pdf", required=True, help="Absolute path to a PDF file")
+        parser.add_argument("--outputs", type=int, default=100, help="Outputs of the simulated job (default: 100)")
+        parser.add_argument("--chunk-size", type=int, default=5, help="Outputs per simulated chunk task (default: 5)")
+        parser.add_argument(
+            "--backends",
+            nargs="+",
+            default=list(SPLIT_BACKENDS),
+            help="Backends to compare (default: all available)",
+        )
+
+    def handle(self, *args, **options):
+        pdf_path = Path(options["pdf"])
+        if not pdf_path.exists():
+            raise SystemExit(f"PDF not found: {pdf_path}")
+
+        total_pages = get_pdf_page_count(str(pdf_path))
+        groups = parse_split_groups(_make_mixed_ranges(options["outputs"], total_pages))
+        chunk_size = max(1, options["chunk_size"])
+        self.stdout.write(f"PDF pages: {total_pages}, outputs: {len(groups)}, chunk size: {chunk_size}")
+
+        results = {
+            "started_at": datetime.utcnow().isoformat(),
+            "pdf": str(pdf_path),
+            "total_pages": total_pages,
+            "outputs": len(groups),
+            "chunk_size": chunk_size,
+            "backends": {},
+        }
+
+        for name in options["backends"]:
+            backend = SPLIT_BACKENDS.get(name)
+            if backend is None or not backend.is_available():
+                self.stdout.write(f"Skipping unavailable backend: {name}")
+                continue
+
+            out_dir = Path(tempfile.mkdtemp(prefix=f"bench_worker_{name}_"))
+            try:
+                cold = {
+                    "no_preload": _cold_start(backend, str(pdf_path), False, out_dir),
+                    "preload": _cold_start(backend, str(pdf_path), True, out_dir),
+                }
+                chunks = []
+                for mode in ("open_per_task", "cached"):
+                    jobs = [(str(out_dir / mode / f"{i}.pdf"), g["segments"]) for i, g in enumerate(groups)]
+                    chunks.append([jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)])
+                per_task = {
+                    "open_per_task": _time_tasks(backend, str(pdf_path), chunks[0], ''),
+                    "cached": _time_tasks(backend, str(pdf_path), chunks[1], f"bench-{name}"),
+                }
+            finally:
+                shutil.rmtree(out_dir, ignore_errors=True)
+
+            results["backends"][name] = {"cold_start": cold, "per_task": per_task}
+            self.stdout.write(
+                f"backend={name} "
+                f"cold first_task_ms={cold['no_preload'].get('first_task_ms')} "
+                f"preloaded first_task_ms={cold['preload'].get('first_task_ms')} "
+                f"(preload_ms={cold['preload'].get('preload_ms')}, import_ms={cold['no_preload'].get('import_ms')}) "
+                f"per_task_ms open={per_task['open_per_task']['per_task_ms']} cached={per_task['cached']['per_task_ms']}"
+            )
+
+        results["finished_at"] = datetime.utcnow().isoformat()
+
+        out_dir = Path(settings.MEDIA_ROOT) / "benchmarks"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out_path = out_dir / f"worker_overhead_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
+        out_path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        self.stdout.write(f"\nSaved benchmark results: {out_path}")
+        return ""
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from processing.split_cache import prune_split_cache
+
+
+class Command(BaseCommand):
+    help = "Remove split cache entries that have not been used recently."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age-days",
+            type=int,
+            default=None,
+            help="Remove entries unused for this many days (default: settings.SPLIT_CACHE_MAX_AGE_DAYS)",
+        )
+
+    def handle(self, *args, **options):
+        result = prune_split_cache(options["max_age_days"])
+        self.stdout.write(f"Removed {result['removed']} cached outputs, freed {result['bytes_freed']} bytes")
+        return ""
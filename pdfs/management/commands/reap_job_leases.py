@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from processing import job_leases
+
+
+class Command(BaseCommand):
+    help = "Mark runs whose job lease expired (worker lost) as FAILED."
+
+    def handle(self, *args, **options):
+        reaped = job_leases.reap_expired_leases(force=True)
+        self.stdout.write(f"Reaped {len(reaped)} abandoned runs")
+        return ""
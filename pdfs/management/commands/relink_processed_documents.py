@@ -0,0 +1,120 @@
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from pdfs.models import ProcessingHistory
+from processing.batch_linker import fetch_folder_pdf_links
+from processing.word_hyperlink_processor_simple import WordHyperlinkProcessorSimple
+
+
+class Command(BaseCommand):
+    help = "Incrementally refresh Drive links in already processed Word documents (e.g. after a Drive migration)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ids",
+            nargs="+",
+            type=int,
+            default=None,
+            help="ProcessingHistory IDs to refresh (default: every successful document with a folder)",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=0,
+            help="Refresh at most this many documents (default: no limit)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would change without saving new outputs",
+        )
+
+    def handle(self, *args, **options):
+        qs = ProcessingHistory.objects.filter(status="SUCCESS").exclude(folder_id="").exclude(output_file="")
+        if options["ids"]:
+            qs = qs.filter(id__in=options["ids"])
+        qs = qs.order_by("id")
+        if options["limit"]:
+            qs = qs[: options["limit"]]
+        histories = list(qs)
+        if not histories:
+            self.stdout.write("Nothing to refresh.")
+            return ""
+
+        # Each Drive folder is listed once, however many documents point at it.
+        t0 = time.time()
+        threads = int(getattr(settings, "BATCH_DRIVE_LOOKUP_THREADS", 4) or 4)
+        folder_links = fetch_folder_pdf_links([h.folder_id for h in histories], max_workers=threads)
+        self.stdout.write(
+            f"Listed {len(folder_links)} folder(s) for {len(histories)} document(s) in {round(time.time() - t0, 3)}s"
+        )
+
+        processor = WordHyperlinkProcessorSimple()
+        totals = {"changed": 0, "unchanged": 0, "failed": 0, "retargeted": 0, "newly_linked": 0}
+
+        for history in histories:
+            listing = folder_links.get(history.folder_id) or {}
+            if listing.get("error"):
+                totals["failed"] += 1
+                self.stdout.write(f"#{history.id} {history.output_filename}: folder listing failed: {listing['error']}")
+                continue
+
+            fd, tmp_out = tempfile.mkstemp(suffix=".docx")
+            os.close(fd)
+            try:
+                source_path = None
+                if history.input_file:
+                    try:
+                        source_path = history.input_file.path
+                        if not os.path.exists(source_path):
+                            source_path = None
+                    except Exception:
+                        source_path = None
+
+                stats = processor.relink_processed_document(
+                    processed_docx_path=history.output_file.path,
+                    pdf_links=listing.get("pdf_links") or {},
+                    output_docx_path=tmp_out,
+                    source_docx_path=source_path,
+                )
+                incremental = stats["incremental"]
+                totals["retargeted"] += incremental["retargeted"]
+                totals["newly_linked"] += incremental["newly_linked"]
+
+                if not incremental["changed"]:
+                    totals["unchanged"] += 1
+                    continue
+
+                totals["changed"] += 1
+                self.stdout.write(
+                    f"#{history.id} {history.output_filename}: retargeted={incremental['retargeted']} "
+                    f"newly_linked={incremental['newly_linked']}"
+                )
+                if options["dry_run"]:
+                    continue
+
+                with open(tmp_out, "rb") as f:
+                    history.output_file.save(history.output_filename, File(f), save=False)
+                history.total_statements = stats["total_statements"]
+                history.linked_statements = stats["linked_statements"]
+                history.unlinked_statements = stats["unlinked_statements"]
+                history.save(update_fields=["output_file", "total_statements", "linked_statements", "unlinked_statements"])
+            except Exception as e:
+                totals["failed"] += 1
+                self.stdout.write(f"#{history.id} {history.output_filename}: {e}")
+            finally:
+                try:
+                    os.remove(tmp_out)
+                except OSError:
+                    pass
+
+        self.stdout.write(
+            f"\nchanged={totals['changed']} unchanged={totals['unchanged']} failed={totals['failed']} "
+            f"retargeted={totals['retargeted']} newly_linked={totals['newly_linked']}"
+        )
+        return ""
@@ -0,0 +1,102 @@
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def worker_count(profile: dict) -> int:
+    """Workers started for a profile: 'workers', 0 = one per procs_per_task cores."""
+    workers = int(profile.get('workers') or 0)
+    if workers > 0:
+        return workers
+    if 'workers' not in profile:
+        return 1
+    return max(1, (os.cpu_count() or 1) // max(1, int(profile.get('procs_per_task') or 1)))
+
+
+def worker_command(name: str, profile: dict, loglevel: str = 'info') -> list:
+    """celery worker command line for one WORKER_PROFILES entry (name is the node name)."""
+    pool = profile.get('pool') or 'solo'
+    concurrency = int(profile.get('concurrency') or 0)
+    if pool == 'solo':
+        concurrency = 1
+    elif concurrency <= 0:
+        concurrency = os.cpu_count() or 1
+
+    cmd = [
+        sys.executable, '-m', 'celery', '-A', 'pdf_automation', 'worker',
+        '-l', loglevel,
+        '-P', pool,
+        '-c', str(concurrency),
+        '-Q', ','.join(profile.get('queues') or [name]),
+        '-n', f'{name}@%h',
+        f"--prefetch-multiplier={int(profile.get('prefetch_multiplier') or 1)}",
+    ]
+    if pool == 'prefork' and profile.get('max_tasks_per_child'):
+        cmd.append(f"--max-tasks-per-child={int(profile['max_tasks_per_child'])}")
+    return cmd
+
+
+class Command(BaseCommand):
+    help = "Start the Celery workers of settings.WORKER_PROFILES (split, upload, control)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--only",
+            nargs="+",
+            default=None,
+            help="Start only these profiles (default: all)",
+        )
+        parser.add_argument("--loglevel", default="info")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print the worker commands instead of starting them",
+        )
+
+    def handle(self, *args, **options):
+        profiles = getattr(settings, 'WORKER_PROFILES', {}) or {}
+        names = options["only"] or list(profiles)
+        unknown = [n for n in names if n not in profiles]
+        if unknown:
+            raise CommandError(f"Unknown worker profile(s): {', '.join(unknown)} (have: {', '.join(profiles)})")
+
+        commands = {}
+        for name in names:
+            count = worker_count(profiles[name])
+            for i in range(1, count + 1):
+                node = name if count == 1 else f'{name}{i}'
+                commands[node] = worker_command(node, profiles[name], options["loglevel"])
+        if options["dry_run"]:
+            for name, cmd in commands.items():
+                self.stdout.write(f"{name}: {shlex.join(cmd)}")
+            return ""
+
+        procs = {}
+        for name, cmd in commands.items():
+            self.stdout.write(f"Starting {name} worker: {shlex.join(cmd)}")
+            procs[name] = subprocess.Popen(cmd)
+
+        try:
+            # Stop everything when one worker exits, so a supervisor restarts the set
+            while all(p.poll() is None for p in procs.values()):
+                time.sleep(1)
+            for name, p in procs.items():
+                if p.returncode is not None:
+                    self.stderr.write(f"{name} worker exited with code {p.returncode}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for p in procs.values():
+                if p.poll() is None:
+                    p.terminate()
+            for p in procs.values():
+                try:
+                    p.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    p.kill()
+        return ""
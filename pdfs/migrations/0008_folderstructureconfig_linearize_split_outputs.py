@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdfs', '0007_processingrun_processingstep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folderstructureconfig',
+            name='linearize_split_outputs',
+            field=models.BooleanField(default=False, help_text='Linearize split PDFs (fast web view) so Drive previews open before the whole file is loaded'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdfs', '0008_folderstructureconfig_linearize_split_outputs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobQueueEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(db_index=True, max_length=64)),
+                ('kind', models.CharField(choices=[('PREFLIGHT', 'Preflight'), ('SPLIT', 'Split'), ('UPLOAD', 'Upload'), ('BATCH', 'Batch Word Process')], max_length=20)),
+                ('cost', models.IntegerField(default=1)),
+                ('task_args', models.JSONField(blank=True, default=list)),
+                ('task_id', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('ADMITTED', 'Admitted'), ('CANCELLED', 'Cancelled')], default='QUEUED', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('admitted_at', models.DateTimeField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='queued_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='pdfs_jobque_status_a9442f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdfs', '0009_jobqueueentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processingstep',
+            name='step',
+            field=models.CharField(choices=[('PREFLIGHT', 'Preflight'), ('SPLIT', 'Split'), ('UPLOAD', 'Upload'), ('WORD_PROCESS', 'Word Process'), ('PIPELINE', 'Pipeline')], max_length=20),
+        ),
+    ]
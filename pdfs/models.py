@@ -161,6 +161,10 @@ class FolderStructureConfig(models.Model):
     pdf_subfolder = models.CharField(max_length=100, blank=True, help_text="Subfolder for PDFs (e.g., 'splits') or empty")
     is_active = models.BooleanField(default=True)
     description = models.TextField(blank=True)
+    linearize_split_outputs = models.BooleanField(
+        default=False,
+        help_text="Linearize split PDFs (fast web view) so Drive previews open before the whole file is loaded",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -363,12 +367,60 @@ class ProcessingRun(models.Model):
         return f"{self.run_mode} {self.job_id or self.id} - {self.status}"
 
 
+class JobQueueEntry(models.Model):
+    """An async job waiting for (or given) one of the MAX_RUNNING_JOBS slots; see processing.job_queue."""
+
+    KIND_CHOICES = [
+        ('PREFLIGHT', 'Preflight'),
+        ('SPLIT', 'Split'),
+        ('UPLOAD', 'Upload'),
+        ('BATCH', 'Batch Word Process'),
+    ]
+
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('ADMITTED', 'Admitted'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+
+    job_id = models.CharField(max_length=64, db_index=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='queued_jobs',
+    )
+
+    # Estimated size (outputs or documents); smaller jobs go first, weighted by waiting time
+    cost = models.IntegerField(default=1)
+    task_args = models.JSONField(default=list, blank=True)
+    task_id = models.CharField(max_length=255, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    created_at = models.DateTimeField(auto_now_add=True)
+    admitted_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.job_id} - {self.status}"
+
+
 class ProcessingStep(models.Model):
     STEP_CHOICES = [
         ('PREFLIGHT', 'Preflight'),
         ('SPLIT', 'Split'),
         ('UPLOAD', 'Upload'),
         ('WORD_PROCESS', 'Word Process'),
+        # Whole preflight -> split -> upload -> link pipeline (stage transitions in extra)
+        ('PIPELINE', 'Pipeline'),
     ]
 
     STATUS_CHOICES = [
@@ -1,3 +1,49 @@
-from django.test import TestCase
+import json
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase, override_settings
+
+from .models import JobQueueEntry, ProcessingRun
+from .views_processor_ui import _submit_async_job
+
+
+@override_settings(MAX_RUNNING_JOBS_TOTAL=1, MAX_RUNNING_JOBS_ASYNC=1)
+class SubmitAsyncJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='x')
+        # No Redis here: admission counts RUNNING ProcessingRuns
+        patcher = mock.patch('processing.job_leases._client', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        task = SimpleNamespace(apply_async=lambda args: SimpleNamespace(id='task-1'))
+        patcher = mock.patch('processing.job_queue._task_for', return_value=task)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def submit(self, job_id):
+        request = RequestFactory().post('/')
+        request.user = self.user
+        response = _submit_async_job(request, 'SPLIT', job_id, [job_id])
+        return response.status_code, json.loads(response.content)
+
+    def test_job_whose_run_holds_a_slot_is_admitted_immediately(self):
+        ProcessingRun.objects.create(job_id='job-1', run_mode='ASYNC', status='RUNNING', user=self.user)
+
+        status_code, body = self.submit('job-1')
+
+        self.assertEqual(status_code, 200)
+        self.assertFalse(body['queued'])
+        self.assertEqual(body['task_id'], 'task-1')
+        self.assertEqual(JobQueueEntry.objects.get(job_id='job-1').status, 'ADMITTED')
+
+    def test_job_without_a_running_run_waits_for_a_free_slot(self):
+        ProcessingRun.objects.create(job_id='other', run_mode='ASYNC', status='RUNNING', user=self.user)
+        ProcessingRun.objects.create(job_id='job-1', run_mode='ASYNC', status='SUCCESS', user=self.user)
+
+        status_code, body = self.submit('job-1')
+
+        self.assertEqual(status_code, 202)
+        self.assertTrue(body['queued'])
+        self.assertEqual(body['queue_position'], 1)
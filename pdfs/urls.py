@@ -39,6 +39,8 @@ urlpatterns = [
     path('upload-document/', views_processor_ui.upload_document, name='upload_document'),
     path('process-document/<int:document_id>/', views_processor_ui.process_document, name='process_document'),
     path('download-document/<int:document_id>/', views_processor_ui.download_document, name='download_document'),
+    path('batch-process-documents/', views_processor_ui.start_batch_process_documents, name='start_batch_process_documents'),
+    path('batch-process-status/<str:job_id>/', views_processor_ui.batch_process_status, name='batch_process_status'),
     path('preflight-split/', views_processor_ui.start_preflight_split, name='start_preflight_split'),
     path('preflight-split-status/<str:job_id>/', views_processor_ui.preflight_split_status, name='preflight_split_status'),
     path('start-async-split/<str:job_id>/', views_processor_ui.start_async_split, name='start_async_split'),
@@ -47,6 +49,9 @@ urlpatterns = [
     path('async-upload-status/<str:job_id>/', views_processor_ui.async_upload_status, name='async_upload_status'),
     path('retry-async-split/<str:job_id>/', views_processor_ui.retry_async_split, name='retry_async_split'),
     path('retry-async-upload/<str:job_id>/', views_processor_ui.retry_async_upload, name='retry_async_upload'),
+    path('pipeline/start/', views_processor_ui.start_pipeline, name='start_pipeline'),
+    path('pipeline/<str:job_id>/resume/', views_processor_ui.resume_pipeline, name='resume_pipeline'),
+    path('pipeline/<str:job_id>/status/', views_processor_ui.pipeline_status, name='pipeline_status'),
     path('split-pdf/', views_processor_ui.split_pdf_document, name='split_pdf_document'),
     path('extract-page-ranges/', views_processor_ui.extract_page_ranges_from_word, name='extract_page_ranges'),
     path('unified-preview/', views_processor_ui.unified_process_preview, name='unified_preview'),
@@ -9,7 +9,7 @@ from datetime import datetime
 
 from .models import Patient, OriginalPDF, PDFSet, SummaryDocument
 from processing.pdf_utils import (
-    compute_sha256, get_pdf_page_count, 
+    HashingFile, get_pdf_page_count,
     detect_section_boundaries, extract_text_from_page
 )
 from processing.tasks import process_pdf_set
@@ -33,15 +33,16 @@ def upload_pdf(request):
     if request.method == 'POST' and request.FILES.get('pdf_file'):
         pdf_file = request.FILES['pdf_file']
         
-        # Save file temporarily
+        # Save file temporarily, hashing it as storage writes the chunks
+        hashed_file = HashingFile(pdf_file, name=pdf_file.name)
         file_path = default_storage.save(
             f'originals/{datetime.now().strftime("%Y/%m/%d")}/{pdf_file.name}',
-            pdf_file
+            hashed_file
         )
         full_path = Path(settings.MEDIA_ROOT) / file_path
         
-        # Compute hash and page count
-        sha256 = compute_sha256(str(full_path))
+        # Hash and page count
+        sha256 = hashed_file.sha256
         total_pages = get_pdf_page_count(str(full_path))
         
         # Check if already exists
@@ -9,13 +9,14 @@ from django.db.models import Avg
 from django.db.models import Count
 from django.db.models import Q
 from django.views.decorators.csrf import csrf_exempt
-from django.core.files.base import ContentFile
+from django.core.files import File
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST, require_http_methods
+import hashlib
 import time
 import os
+import shutil
 import tempfile
-import re
 import uuid
 import zipfile
 from datetime import datetime
@@ -23,10 +24,23 @@ from datetime import datetime
 from .models import ProcessingHistory, FolderStructureConfig, ProcessingRun, ProcessingStep
 from processing.smart_folder_detector_configurable import SmartFolderDetectorConfigurable
 from processing.word_hyperlink_processor_simple import WordHyperlinkProcessorSimple
-from processing.pdf_utils import get_pdf_page_count, split_pdf, merge_pdf_segments
+from processing.docx_streaming import RssPeak, open_document_body
+from processing.page_range_service import analyze_word_document, get_page_ranges
+from processing.pdf_utils import compute_sha256, get_pdf_page_count, split_pdf
+from processing import job_leases, job_queue, pipeline, split_cache, status_journal
+from processing.split_backends import get_split_backend, page_offsets
+from processing.split_spec import compile_split_plan, first_segment_beyond, parse_split_groups
+from processing.drive_rate_limit import throttle_wait_ms
+from processing.pdf_optimize import (
+    linearize_enabled,
+    object_streams_enabled,
+    optimize_enabled,
+    postprocess_output,
+    sum_bytes_saved,
+    sum_duration_ms,
+)
 from processing.drive_path_resolver import DrivePathResolver
 from processing.drive_utils import get_drive_service
-from processing.tasks import preflight_split_job, split_pdf_job, upload_split_job
 from .analytics_utils import get_or_create_run, start_step, finish_step, finish_run
 
 
@@ -44,29 +58,36 @@ def _analytics_dashboard_allowed(request) -> bool:
     }
 
 
-def _async_capacity_allows_new_job() -> tuple[bool, dict]:
+def _word_streaming_threshold_bytes() -> int:
     from django.conf import settings
 
-    max_running_total = int(getattr(settings, 'MAX_RUNNING_JOBS_TOTAL', 4) or 4)
-    max_running_async = int(getattr(settings, 'MAX_RUNNING_JOBS_ASYNC', 3) or 3)
+    return int(getattr(settings, 'WORD_STREAMING_THRESHOLD_MB', 20) or 0) * 1024 * 1024
 
-    running_total = ProcessingRun.objects.filter(status='RUNNING').count()
-    running_async = ProcessingRun.objects.filter(status='RUNNING', run_mode='ASYNC').count()
 
-    if running_total >= max_running_total or running_async >= max_running_async:
-        return False, {
-            'success': False,
-            'error': 'System is busy. Please try again in a few minutes.',
-            'busy': True,
-            'running_total': running_total,
-            'running_async': running_async,
-            'limits': {
-                'max_running_total': max_running_total,
-                'max_running_async': max_running_async,
-            }
-        }
+def _job_output_count(job_id: str) -> int:
+    """Outputs requested for a preflight job (its queue cost); 1 when unknown."""
+    from django.conf import settings
+    import json
 
-    return True, {}
+    req_path = os.path.join(settings.MEDIA_ROOT, 'processing', 'preflight', job_id, 'request.json')
+    try:
+        with open(req_path, 'r', encoding='utf-8') as f:
+            return max(1, len(parse_split_groups(json.load(f).get('page_ranges') or '')))
+    except Exception:
+        return 1
+
+
+def _submit_async_job(request, kind: str, job_id: str, args: list, cost: int = 1, **payload) -> JsonResponse:
+    """Start the job, or queue it (202 with its queue position) while all job slots are busy."""
+    # Preflight leaves the run RUNNING: the next stage inherits its slot instead of queueing behind it
+    run = ProcessingRun.objects.filter(job_id=job_id, run_mode='ASYNC').only('status').first()
+    result = job_queue.submit(
+        kind, job_id, args, user=request.user, cost=cost, holds_slot=run is not None and run.status == 'RUNNING'
+    )
+    return JsonResponse(
+        {'success': True, 'job_id': job_id, 'task_id': result.get('task_id'), **payload, **result},
+        status=202 if result['queued'] else 200,
+    )
 
 
 @require_http_methods(["GET"])
@@ -241,12 +262,8 @@ def processing_history(request):
 @csrf_exempt
 @login_required
 def start_preflight_split(request):
-    """Start an async preflight for a large PDF split job (Celery + Redis)."""
+    """Start an async preflight for a large PDF split job (Celery + Redis). Queued while all job slots are busy."""
     try:
-        allowed, payload = _async_capacity_allows_new_job()
-        if not allowed:
-            return JsonResponse(payload, status=429)
-
         if 'file' not in request.FILES:
             return JsonResponse({'success': False, 'error': 'No PDF uploaded. Please upload a PDF.'}, status=400)
 
@@ -265,8 +282,10 @@ def start_preflight_split(request):
         os.makedirs(job_dir, exist_ok=True)
         input_pdf_path = os.path.join(job_dir, 'input.pdf')
 
+        input_sha256 = hashlib.sha256()
         with open(input_pdf_path, 'wb') as f:
             for chunk in uploaded_file.chunks():
+                input_sha256.update(chunk)
                 f.write(chunk)
 
         # Persist request inputs so later tasks (split/upload) can reuse them by job_id
@@ -274,8 +293,13 @@ def start_preflight_split(request):
         with open(os.path.join(job_dir, 'request.json'), 'w', encoding='utf-8') as f:
             json.dump({'page_ranges': page_ranges_text, 'patient_name': patient_name}, f, ensure_ascii=False)
 
-        task = preflight_split_job.delay(job_id, input_pdf_path, page_ranges_text)
-        return JsonResponse({'success': True, 'job_id': job_id, 'task_id': task.id})
+        return _submit_async_job(
+            request,
+            'PREFLIGHT',
+            job_id,
+            [job_id, input_pdf_path, page_ranges_text, input_sha256.hexdigest()],
+            cost=_job_output_count(job_id),
+        )
 
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
@@ -287,12 +311,7 @@ def start_preflight_split(request):
 def retry_async_split(request, job_id: str):
     """Retry async split for a job_id. Resumable: skips outputs already completed."""
     try:
-        allowed, payload = _async_capacity_allows_new_job()
-        if not allowed:
-            return JsonResponse(payload, status=429)
-
-        task = split_pdf_job.delay(job_id)
-        return JsonResponse({'success': True, 'job_id': job_id, 'task_id': task.id})
+        return _submit_async_job(request, 'SPLIT', job_id, [job_id], cost=_job_output_count(job_id))
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
@@ -303,10 +322,6 @@ def retry_async_split(request, job_id: str):
 def retry_async_upload(request, job_id: str):
     """Retry async upload for a job_id. Resumable: skips files already uploaded."""
     try:
-        allowed, payload = _async_capacity_allows_new_job()
-        if not allowed:
-            return JsonResponse(payload, status=429)
-
         patient_name = (request.POST.get('patient_name') or '').strip()
         if not patient_name:
             from django.conf import settings
@@ -320,8 +335,9 @@ def retry_async_upload(request, job_id: str):
         batch_size = request.POST.get('batch_size')
         batch_size_int = int(batch_size) if batch_size and str(batch_size).isdigit() else 25
 
-        task = upload_split_job.delay(job_id, patient_name, batch_size_int)
-        return JsonResponse({'success': True, 'job_id': job_id, 'task_id': task.id})
+        return _submit_async_job(
+            request, 'UPLOAD', job_id, [job_id, patient_name, batch_size_int], cost=_job_output_count(job_id)
+        )
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
@@ -332,10 +348,6 @@ def retry_async_upload(request, job_id: str):
 def start_async_upload(request, job_id: str):
     """Start async upload of split outputs to Drive for an existing job_id."""
     try:
-        allowed, payload = _async_capacity_allows_new_job()
-        if not allowed:
-            return JsonResponse(payload, status=429)
-
         # Prefer patient name from request (explicit), fallback to preflight request.json
         patient_name = (request.POST.get('patient_name') or '').strip()
         if not patient_name:
@@ -350,18 +362,70 @@ def start_async_upload(request, job_id: str):
         batch_size = request.POST.get('batch_size')
         batch_size_int = int(batch_size) if batch_size and str(batch_size).isdigit() else 25
 
-        task = upload_split_job.delay(job_id, patient_name, batch_size_int)
-        return JsonResponse({'success': True, 'job_id': job_id, 'task_id': task.id})
+        return _submit_async_job(
+            request, 'UPLOAD', job_id, [job_id, patient_name, batch_size_int], cost=_job_output_count(job_id)
+        )
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+def _upload_live_state(job_id: str, state: dict) -> dict:
+    """
+    A RUNNING upload's state.json is only rewritten when the job finishes; count the
+    per-file status JSONs for live progress.
+    """
+    import json
+    from django.conf import settings
+
+    if state.get('stage') != 'UPLOAD' or state.get('status') != 'RUNNING':
+        return state
+
+    upload_dir = os.path.join(settings.MEDIA_ROOT, 'processing', 'uploads', job_id)
+    manifest_path = os.path.join(upload_dir, 'manifest.json')
+    files_dir = os.path.join(upload_dir, 'files')
+
+    total = int((state.get('counts') or {}).get('total') or 0)
+    done = 0
+    failed = 0
+
+    try:
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as mf:
+                manifest = json.load(mf)
+            total = int(len(manifest.get('files') or []) or total)
+
+        if os.path.isdir(files_dir):
+            for name in os.listdir(files_dir):
+                if not name.lower().endswith('.json'):
+                    continue
+                fp = os.path.join(files_dir, name)
+                try:
+                    with open(fp, 'r', encoding='utf-8') as sf:
+                        rec = json.load(sf)
+                    if rec.get('status') == 'SUCCESS':
+                        done += 1
+                    elif rec.get('status') == 'FAILED':
+                        failed += 1
+                except Exception:
+                    continue
+
+        state['counts'] = {'total': total, 'done': done, 'failed': failed}
+        state['progress'] = int(((done + failed) / max(1, total)) * 100)
+    except Exception:
+        pass
+    return state
+
+
 @require_http_methods(["GET"])
 @login_required
 def async_upload_status(request, job_id: str):
     """Poll status for async upload job."""
     try:
         from django.conf import settings
+        queued = job_queue.queue_status(job_id, 'UPLOAD')
+        if queued:
+            return JsonResponse({'success': True, 'job_id': job_id, **queued})
+
         state_path = os.path.join(settings.MEDIA_ROOT, 'processing', 'uploads', job_id, 'state.json')
         if not os.path.exists(state_path):
             return JsonResponse({'success': True, 'job_id': job_id, 'status': 'PENDING'})
@@ -371,40 +435,7 @@ def async_upload_status(request, job_id: str):
             state = json.load(f)
 
         # If upload is running with parallel fan-out, compute live progress from per-file status JSONs.
-        if state.get('stage') == 'UPLOAD' and state.get('status') == 'RUNNING':
-            upload_dir = os.path.join(settings.MEDIA_ROOT, 'processing', 'uploads', job_id)
-            manifest_path = os.path.join(upload_dir, 'manifest.json')
-            files_dir = os.path.join(upload_dir, 'files')
-
-            total = int((state.get('counts') or {}).get('total') or 0)
-            done = 0
-            failed = 0
-
-            try:
-                if os.path.exists(manifest_path):
-                    with open(manifest_path, 'r', encoding='utf-8') as mf:
-                        manifest = json.load(mf)
-                    total = int(len(manifest.get('files') or []) or total)
-
-                if os.path.isdir(files_dir):
-                    for name in os.listdir(files_dir):
-                        if not name.lower().endswith('.json'):
-                            continue
-                        fp = os.path.join(files_dir, name)
-                        try:
-                            with open(fp, 'r', encoding='utf-8') as sf:
-                                rec = json.load(sf)
-                            if rec.get('status') == 'SUCCESS':
-                                done += 1
-                            elif rec.get('status') == 'FAILED':
-                                failed += 1
-                        except Exception:
-                            continue
-
-                state['counts'] = {'total': total, 'done': done, 'failed': failed}
-                state['progress'] = int(((done + failed) / max(1, total)) * 100)
-            except Exception:
-                pass
+        state = _upload_live_state(job_id, state)
 
         state['success'] = True
         return JsonResponse(state)
@@ -418,12 +449,7 @@ def async_upload_status(request, job_id: str):
 def start_async_split(request, job_id: str):
     """Start async split for an existing preflight job_id."""
     try:
-        allowed, payload = _async_capacity_allows_new_job()
-        if not allowed:
-            return JsonResponse(payload, status=429)
-
-        task = split_pdf_job.delay(job_id)
-        return JsonResponse({'success': True, 'job_id': job_id, 'task_id': task.id})
+        return _submit_async_job(request, 'SPLIT', job_id, [job_id], cost=_job_output_count(job_id))
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
@@ -434,6 +460,10 @@ def async_split_status(request, job_id: str):
     """Poll status for async split job."""
     try:
         from django.conf import settings
+        queued = job_queue.queue_status(job_id, 'SPLIT')
+        if queued:
+            return JsonResponse({'success': True, 'job_id': job_id, **queued})
+
         state_path = os.path.join(settings.MEDIA_ROOT, 'processing', 'splits', job_id, 'state.json')
         if not os.path.exists(state_path):
             return JsonResponse({'success': True, 'job_id': job_id, 'status': 'PENDING'})
@@ -443,7 +473,7 @@ def async_split_status(request, job_id: str):
             state = json.load(f)
 
         # If split is running in parallel fan-out mode, state.json is an orchestrator snapshot.
-        # Compute live progress by reading manifest.json and per-output status files.
+        # Compute live progress by reading manifest.json and the per-output status journal.
         if state.get('stage') == 'SPLIT' and state.get('status') == 'RUNNING':
             split_dir = os.path.join(settings.MEDIA_ROOT, 'processing', 'splits', job_id)
             manifest_path = os.path.join(split_dir, 'manifest.json')
@@ -462,29 +492,10 @@ def async_split_status(request, job_id: str):
             except Exception:
                 pass
 
-            done = 0
-            failed = 0
-            outputs_preview = []
-
-            try:
-                if os.path.isdir(output_status_dir):
-                    files = sorted([p for p in os.listdir(output_status_dir) if p.lower().endswith('.json')])
-                    for name in files:
-                        pth = os.path.join(output_status_dir, name)
-                        try:
-                            with open(pth, 'r', encoding='utf-8') as sf:
-                                it = json.load(sf)
-                            st = it.get('status')
-                            if st == 'SUCCESS':
-                                done += 1
-                            elif st == 'FAILED':
-                                failed += 1
-                            if len(outputs_preview) < 20:
-                                outputs_preview.append(it)
-                        except Exception:
-                            continue
-            except Exception:
-                pass
+            statuses = status_journal.read_statuses(output_status_dir)
+            done = sum(1 for it in statuses.values() if it.get('status') == 'SUCCESS')
+            failed = sum(1 for it in statuses.values() if it.get('status') == 'FAILED')
+            outputs_preview = [statuses[idx] for idx in sorted(statuses)[:20]]
 
             if not total:
                 total = max(1, done + failed)
@@ -506,6 +517,10 @@ def preflight_split_status(request, job_id: str):
     """Poll status for a preflight split job."""
     try:
         from django.conf import settings
+        queued = job_queue.queue_status(job_id, 'PREFLIGHT')
+        if queued:
+            return JsonResponse({'success': True, 'job_id': job_id, **queued})
+
         state_path = os.path.join(settings.MEDIA_ROOT, 'processing', 'preflight', job_id, 'state.json')
         if not os.path.exists(state_path):
             return JsonResponse({'success': True, 'job_id': job_id, 'status': 'PENDING'})
@@ -655,10 +670,11 @@ def process_document(request, document_id):
                 'error': history.user_friendly_error
             })
 
-        # Extract patient name from document
-        from docx import Document
-        doc = Document(input_path)
+        # Extract patient name from document (body only for very large documents)
+        streaming_threshold = _word_streaming_threshold_bytes()
+        doc = open_document_body(input_path, streaming_threshold)
         patient_name = processor.extract_patient_name_from_document(doc)
+        del doc
         if patient_name_override:
             history.patient_name = patient_name_override
         else:
@@ -672,13 +688,33 @@ def process_document(request, document_id):
         temp_output_path = temp_output.name
         temp_output.close()
 
+        run = get_or_create_run(
+            job_id=f"document-{history.id}-{uuid.uuid4().hex[:8]}",
+            run_mode='SYNC',
+            user=request.user,
+            processing_history=history,
+            patient_name=history.patient_name,
+        )
+        word_step = start_step(run, 'WORD_PROCESS', extra={'input_bytes': os.path.getsize(input_path)})
+
+        rss = RssPeak()
         try:
-            result = processor.process_word_document(
-                input_docx_path=input_path,
-                pdf_links=pdf_links,
-                output_docx_path=temp_output_path
-            )
+            with rss:
+                result = processor.process_word_document_auto(
+                    input_docx_path=input_path,
+                    pdf_links=pdf_links,
+                    output_docx_path=temp_output_path,
+                    streaming_threshold_bytes=streaming_threshold,
+                )
+
+            # Save output file (streamed copy, never read fully into memory)
+            with open(temp_output_path, 'rb') as f:
+                history.output_file.save(output_filename, File(f), save=False)
         except Exception as e:
+            finish_step(word_step, status='FAILED', error_message=str(e), extra={'peak_rss_delta_mb': rss.peak_mb})
+            finish_run(run, status='FAILED', error_message=str(e))
+            if os.path.exists(temp_output_path):
+                os.unlink(temp_output_path)
             history.status = 'FAILED'
             history.error_message = str(e)
             history.user_friendly_error = f"Document processing failed: {str(e)}"
@@ -690,9 +726,15 @@ def process_document(request, document_id):
                 'details': str(e)
             })
 
-        # Save output file
-        with open(temp_output_path, 'rb') as f:
-            history.output_file.save(output_filename, ContentFile(f.read()), save=False)
+        finish_step(
+            word_step,
+            status='SUCCESS',
+            count_total=int(result.get('total_statements') or 0),
+            count_done=int(result.get('linked_statements') or 0),
+            count_failed=int(result.get('unlinked_statements') or 0),
+            extra={'engine': result.get('engine'), 'peak_rss_delta_mb': rss.peak_mb},
+        )
+        finish_run(run, status='SUCCESS')
 
         # Clean up temp file
         os.unlink(temp_output_path)
@@ -743,54 +785,258 @@ def process_document(request, document_id):
         }, status=404)
 
 
-def _normalize_split_spec(s: str) -> str:
-    s = (s or '').replace('\u00a0', ' ').strip()
-    s = s.replace('–', '-').replace('—', '-').replace('‑', '-')
-    s = re.sub(r'\s+', ' ', s)
-    s = re.sub(r'\s*,\s*', ', ', s)
-    return s.strip()
-
-
-def _parse_split_groups(ranges_text: str):
-    ranges_text = _normalize_split_spec(ranges_text)
-    if not ranges_text:
-        raise ValueError('Page ranges are required')
-
-    groups_raw = [g.strip() for g in re.split(r'[;\n]+', ranges_text) if g.strip()]
-    if not groups_raw:
-        raise ValueError('Page ranges are required')
-
-    groups = []
-    for group_raw in groups_raw:
-        parts = [p.strip() for p in group_raw.split(',') if p.strip()]
-        if not parts:
-            raise ValueError(f"Invalid group: '{group_raw}'")
-
-        segments = []
-        normalized_parts = []
-        for part in parts:
-            part = _normalize_split_spec(part)
-            m_range = re.match(r'^(\d+)\s*-\s*(\d+)$', part)
-            m_single = re.match(r'^(\d+)$', part)
-            if m_range:
-                start = int(m_range.group(1))
-                end = int(m_range.group(2))
-            elif m_single:
-                start = int(m_single.group(1))
-                end = start
-            else:
-                raise ValueError(f"Invalid segment: '{part}'. Use 1-4 or 55")
+@require_POST
+@csrf_exempt
+@login_required
+def start_batch_process_documents(request):
+    """
+    Link many Word documents in one background job.
+    Accepts uploaded .docx files ('files') and/or already uploaded document IDs ('document_ids').
+    Optional 'patient_names' is a JSON object mapping document ID -> patient name override.
+    """
+    try:
+        document_ids = []
+        raw_ids = (request.POST.get('document_ids') or '').strip()
+        if raw_ids:
+            for part in raw_ids.split(','):
+                part = part.strip()
+                if not part.isdigit():
+                    return JsonResponse({'success': False, 'error': f"Invalid document ID: '{part}'"}, status=400)
+                document_ids.append(int(part))
+
+        uploaded_files = request.FILES.getlist('files')
+        for uploaded_file in uploaded_files:
+            if not uploaded_file.name.endswith('.docx'):
+                return JsonResponse({
+                    'success': False,
+                    'error': f"Please upload Word documents (.docx files): '{uploaded_file.name}'"
+                }, status=400)
+
+        for uploaded_file in uploaded_files:
+            history = ProcessingHistory.objects.create(
+                input_filename=uploaded_file.name,
+                input_file=uploaded_file,
+                user=request.user,
+                status='PENDING'
+            )
+            document_ids.append(history.id)
+
+        if not document_ids:
+            return JsonResponse({'success': False, 'error': 'No documents provided'}, status=400)
+
+        patient_names = {}
+        raw_names = (request.POST.get('patient_names') or '').strip()
+        if raw_names:
+            import json
+            try:
+                patient_names = {str(k): str(v) for k, v in json.loads(raw_names).items()}
+            except (ValueError, AttributeError):
+                return JsonResponse({'success': False, 'error': 'patient_names must be a JSON object'}, status=400)
+
+        ProcessingHistory.objects.filter(id__in=document_ids, user__isnull=True).update(user=request.user)
+
+        batch_id = uuid.uuid4().hex
+        return _submit_async_job(
+            request,
+            'BATCH',
+            batch_id,
+            [batch_id, document_ids, patient_names],
+            cost=len(document_ids),
+            document_ids=document_ids,
+        )
+
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
-            if start < 1 or end < 1 or end < start:
-                raise ValueError(f"Invalid segment: '{part}'. Ensure start/end are positive and end >= start")
 
-            segments.append((start, end))
-            normalized_parts.append(f"{start}-{end}" if start != end else f"{start}")
+@require_http_methods(["GET"])
+@login_required
+def batch_process_status(request, job_id: str):
+    """Poll status for a batch document linking job."""
+    try:
+        from django.conf import settings
+        import json
 
-        label = ', '.join(normalized_parts)
-        groups.append({'label': label, 'segments': segments})
+        queued = job_queue.queue_status(job_id, 'BATCH')
+        if queued:
+            return JsonResponse({'success': True, 'job_id': job_id, **queued})
 
-    return groups
+        batch_dir = os.path.join(settings.MEDIA_ROOT, 'processing', 'batches', job_id)
+        state_path = os.path.join(batch_dir, 'state.json')
+        if not os.path.exists(state_path):
+            return JsonResponse({'success': True, 'job_id': job_id, 'status': 'PENDING'})
+
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+        # While running, compute live progress from per-document status files.
+        if state.get('status') == 'RUNNING':
+            docs_dir = os.path.join(batch_dir, 'documents')
+            total = int((state.get('counts') or {}).get('total') or 0)
+            done = 0
+            failed = 0
+            documents = []
+            if os.path.isdir(docs_dir):
+                for name in sorted(os.listdir(docs_dir)):
+                    if not name.lower().endswith('.json'):
+                        continue
+                    try:
+                        with open(os.path.join(docs_dir, name), 'r', encoding='utf-8') as df:
+                            rec = json.load(df)
+                    except Exception:
+                        continue
+                    documents.append(rec)
+                    if rec.get('status') == 'SUCCESS':
+                        done += 1
+                    elif rec.get('status') == 'FAILED':
+                        failed += 1
+
+            state['counts'] = {'total': total, 'done': done, 'failed': failed}
+            state['progress'] = int(((done + failed) / max(1, total)) * 100)
+            state['documents'] = documents
+
+        state['success'] = True
+        return JsonResponse(state)
+
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@require_POST
+@csrf_exempt
+@login_required
+def start_pipeline(request):
+    """
+    Run preflight -> split -> upload (-> link) for one PDF as a single background pipeline.
+    Takes the preflight form fields ('file', 'page_ranges', 'patient_name', optional
+    'batch_size') plus optional Word documents to link once the outputs are in Drive:
+    uploaded .docx 'word_files' and/or already uploaded 'document_ids'.
+    """
+    try:
+        if 'file' not in request.FILES:
+            return JsonResponse({'success': False, 'error': 'No PDF uploaded. Please upload a PDF.'}, status=400)
+
+        uploaded_file = request.FILES['file']
+        if not (uploaded_file.name or '').lower().endswith('.pdf'):
+            return JsonResponse({'success': False, 'error': 'Please upload a PDF file'}, status=400)
+
+        page_ranges_text = request.POST.get('page_ranges', '')
+        patient_name = (request.POST.get('patient_name') or '').strip()
+        if not (page_ranges_text or '').strip():
+            return JsonResponse({'success': False, 'error': 'Page ranges are required'}, status=400)
+        if not patient_name:
+            return JsonResponse({'success': False, 'error': 'Patient name is required'}, status=400)
+
+        document_ids = []
+        for part in (request.POST.get('document_ids') or '').split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if not part.isdigit():
+                return JsonResponse({'success': False, 'error': f"Invalid document ID: '{part}'"}, status=400)
+            document_ids.append(int(part))
+
+        word_files = request.FILES.getlist('word_files')
+        for word_file in word_files:
+            if not word_file.name.endswith('.docx'):
+                return JsonResponse({
+                    'success': False,
+                    'error': f"Please upload Word documents (.docx files): '{word_file.name}'"
+                }, status=400)
+
+        batch_size = request.POST.get('batch_size')
+        batch_size_int = int(batch_size) if batch_size and str(batch_size).isdigit() else 25
+
+        from django.conf import settings
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(settings.MEDIA_ROOT, 'processing', 'preflight', job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        input_pdf_path = os.path.join(job_dir, 'input.pdf')
+
+        input_sha256 = hashlib.sha256()
+        with open(input_pdf_path, 'wb') as f:
+            for chunk in uploaded_file.chunks():
+                input_sha256.update(chunk)
+                f.write(chunk)
+
+        import json
+        with open(os.path.join(job_dir, 'request.json'), 'w', encoding='utf-8') as f:
+            json.dump({'page_ranges': page_ranges_text, 'patient_name': patient_name}, f, ensure_ascii=False)
+
+        for word_file in word_files:
+            history = ProcessingHistory.objects.create(
+                input_filename=word_file.name,
+                input_file=word_file,
+                user=request.user,
+                status='PENDING'
+            )
+            document_ids.append(history.id)
+        ProcessingHistory.objects.filter(id__in=document_ids, user__isnull=True).update(user=request.user)
+
+        spec = {
+            'input_pdf_path': input_pdf_path,
+            'input_sha256': input_sha256.hexdigest(),
+            'page_ranges': page_ranges_text,
+            'patient_name': patient_name,
+            'batch_size': batch_size_int,
+            'document_ids': document_ids,
+            'cost': _job_output_count(job_id),
+        }
+        result = pipeline.start(job_id, spec, user=request.user)
+        return JsonResponse(
+            {'success': True, 'job_id': job_id, 'task_id': result.get('task_id'), **result},
+            status=202 if result['queued'] else 200,
+        )
+
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@require_POST
+@csrf_exempt
+@login_required
+def resume_pipeline(request, job_id: str):
+    """Resume a job's pipeline from 'from_stage' (default: the first stage that did not succeed)."""
+    try:
+        from_stage = (request.POST.get('from_stage') or '').strip().upper() or None
+        result = pipeline.start(job_id, {}, user=request.user, from_stage=from_stage)
+        return JsonResponse(
+            {'success': True, 'job_id': job_id, 'task_id': result.get('task_id'), **result},
+            status=202 if result['queued'] else 200,
+        )
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@require_http_methods(["GET"])
+@login_required
+def pipeline_status(request, job_id: str):
+    """Poll a pipeline: its stage transitions and the state of the current stage."""
+    try:
+        run = ProcessingRun.objects.filter(job_id=job_id, run_mode='ASYNC').first()
+        summary = pipeline.summary(pipeline.latest(run)) if run else None
+        if summary is None:
+            return JsonResponse({'success': False, 'error': 'Pipeline not found'}, status=404)
+
+        # Same payloads as the per-stage status endpoints
+        stage_views = {
+            'PREFLIGHT': preflight_split_status,
+            'SPLIT': async_split_status,
+            'UPLOAD': async_upload_status,
+            'LINK': batch_process_status,
+        }
+        stage = summary['current'] or (summary['transitions'][-1]['stage'] if summary['transitions'] else None)
+        stage_state = None
+        if stage in stage_views:
+            import json
+            stage_state = json.loads(stage_views[stage](request, job_id).content)
+
+        return JsonResponse({'success': True, 'job_id': job_id, **summary, 'stage': stage, 'stage_state': stage_state})
+
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
 @require_POST
@@ -840,7 +1086,7 @@ def split_pdf_document(request):
 
         page_ranges_text = request.POST.get('page_ranges', '')
         try:
-            groups = _parse_split_groups(page_ranges_text)
+            groups = parse_split_groups(page_ranges_text)
         except ValueError as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
@@ -859,31 +1105,39 @@ def split_pdf_document(request):
             if len(groups) > max_outputs:
                 return JsonResponse({'success': False, 'error': f'Too many split outputs requested ({len(groups)}). Maximum allowed is {max_outputs}.'}, status=400)
 
-            total_extracted_pages = 0
-            for grp in groups:
-                for start, end in grp['segments']:
-                    total_extracted_pages += (end - start + 1)
-                    if total_extracted_pages > max_total_extracted_pages:
-                        return JsonResponse({'success': False, 'error': f'Too many total pages requested across splits. Maximum allowed is {max_total_extracted_pages}.'}, status=400)
+            plan = compile_split_plan(groups, page_offsets(input_path))
+            if plan['total_extracted_pages'] > max_total_extracted_pages:
+                return JsonResponse({'success': False, 'error': f'Too many total pages requested across splits. Maximum allowed is {max_total_extracted_pages}.'}, status=400)
+
+            beyond = first_segment_beyond(plan, total_pages)
+            if beyond:
+                return JsonResponse({
+                    'success': False,
+                    'error': f"Segment {beyond[0]}-{beyond[1]} exceeds total pages ({total_pages})"
+                }, status=400)
+
+            # One backend session: the input is parsed once for all outputs, read in
+            # file order; identical groups are copied instead of extracted again.
+            out_paths = {grp['index']: os.path.join(output_dir, f"{grp['label']}.pdf") for grp in plan['groups']}
+            optimize = optimize_enabled()
+            linearize = linearize_enabled()
+            with get_split_backend().open(input_path) as split_session:
+                for idx in plan['order']:
+                    split_session.extract(out_paths[idx], plan['groups'][idx - 1]['segments'])
+                    if optimize or linearize:
+                        postprocess_output(
+                            out_paths[idx], optimize=optimize, object_streams=object_streams_enabled(), linearize=linearize
+                        )
 
             outputs = []
-            for grp in groups:
-                label = grp['label']
-                segments = grp['segments']
-
-                for start, end in segments:
-                    if end > total_pages:
-                        return JsonResponse({
-                            'success': False,
-                            'error': f"Segment {start}-{end} exceeds total pages ({total_pages})"
-                        }, status=400)
-
-                out_name = f"{label}.pdf"
-                out_path = os.path.join(output_dir, out_name)
-                merge_pdf_segments(input_path, out_path, segments)
+            for grp in plan['groups']:
+                out_path = out_paths[grp['index']]
+                if grp['copy_of'] and out_path != out_paths[grp['copy_of']]:
+                    split_cache.link_or_copy(out_paths[grp['copy_of']], out_path)
 
+                out_name = os.path.basename(out_path)
                 outputs.append({
-                    'page_range': label,
+                    'page_range': grp['label'],
                     'filename': out_name,
                     'download_url': f"{settings.MEDIA_URL}processing/splits/{job_id}/{out_name}",
                 })
@@ -1023,16 +1277,16 @@ def extract_page_ranges_from_word(request):
                 'error': 'Please upload a Word document (.docx file)'
             }, status=400)
 
-        # Save to temp file
+        # Save to temp file (hashing while writing, the hash keys the page-range cache)
+        sha256 = hashlib.sha256()
         with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp:
             for chunk in uploaded_file.chunks():
+                sha256.update(chunk)
                 tmp.write(chunk)
             temp_path = tmp.name
 
         try:
-            # Use processor to extract page ranges
-            processor = WordHyperlinkProcessorSimple()
-            ranges = processor.extract_page_ranges_from_file(temp_path)
+            ranges = get_page_ranges(temp_path, sha256=sha256.hexdigest())
 
             # Format for split: semicolon-separated
             formatted = ';'.join(ranges)
@@ -1088,31 +1342,31 @@ def unified_process_preview(request):
             }, status=400)
 
         # Save both files temporarily
+        word_sha256 = hashlib.sha256()
         word_temp = tempfile.NamedTemporaryFile(delete=False, suffix='.docx')
         for chunk in word_file.chunks():
+            word_sha256.update(chunk)
             word_temp.write(chunk)
         word_temp.close()
         word_path = word_temp.name
 
+        pdf_sha256 = hashlib.sha256()
         pdf_temp = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
         for chunk in pdf_file.chunks():
+            pdf_sha256.update(chunk)
             pdf_temp.write(chunk)
         pdf_temp.close()
         pdf_path = pdf_temp.name
 
         try:
-            # Extract page ranges from Word
-            processor = WordHyperlinkProcessorSimple()
-            ranges = processor.extract_page_ranges_from_file(word_path)
+            # Extract page ranges and patient name from Word (cached by document hash)
+            analysis = analyze_word_document(word_path, sha256=word_sha256.hexdigest())
+            ranges = list(analysis['page_ranges'])
+            patient_name = analysis['patient_name']
 
             # Get PDF info
             total_pages = get_pdf_page_count(pdf_path)
 
-            # Extract patient name from Word
-            from docx import Document
-            doc = Document(word_path)
-            patient_name = processor.extract_patient_name_from_document(doc)
-
             # Format ranges for split
             formatted_ranges = ';'.join(ranges)
 
@@ -1141,7 +1395,9 @@ def unified_process_preview(request):
                 'formatted_ranges': formatted_ranges,
                 'pdf_total_pages': total_pages,
                 'word_filename': word_file.name,
-                'pdf_filename': pdf_file.name
+                'word_sha256': analysis['sha256'],
+                'pdf_filename': pdf_file.name,
+                'pdf_sha256': pdf_sha256.hexdigest(),
             }
 
             import json
@@ -1251,25 +1507,86 @@ def progress_generator(session_id, patient_name_override, user=None):
 
         # Parse page ranges and split
         ranges_text = ';'.join(page_ranges)
-        groups = _parse_split_groups(ranges_text)
+        groups = parse_split_groups(ranges_text)
+        plan = compile_split_plan(groups, page_offsets(pdf_path))
 
         yield send_progress('info', f'Splitting PDF into {len(groups)} files...', 20)
 
-        split_files = []
-        for i, grp in enumerate(groups, 1):
-            label = grp['label']
-            segments = grp['segments']
+        split_backend = get_split_backend()
+        run.split_backend = split_backend.name
+        run.save(update_fields=['split_backend'])
+
+        optimize = optimize_enabled()
+        object_streams = object_streams_enabled()
+        linearize = linearize_enabled()
+        optimize_results = []
+        linearize_results = []
+
+        # Outputs from earlier runs of the same PDF come from the split cache; the
+        # input is only opened once something actually has to be extracted.
+        use_cache = split_cache.cache_enabled()
+        pdf_sha256 = (metadata.get('pdf_sha256') or compute_sha256(pdf_path)) if use_cache else ''
+        cache_hits = 0
 
-            yield send_progress('info', f'Splitting: {label}.pdf ({i}/{len(groups)})', 20 + (30 * i / len(groups)))
+        out_paths = {grp['index']: os.path.join(split_dir, f"{grp['label']}.pdf") for grp in plan['groups']}
+        split_session = None
+        try:
+            for i, idx in enumerate(plan['order'], 1):
+                out_path = out_paths[idx]
+                segments = plan['groups'][idx - 1]['segments']
+
+                yield send_progress('info', f'Splitting: {os.path.basename(out_path)} ({i}/{len(plan["order"])})', 20 + (30 * i / len(plan['order'])))
+
+                key = split_cache.cache_key(
+                    pdf_sha256, segments, split_backend, optimize, object_streams, linearize
+                ) if use_cache else ''
+                entry = split_cache.lookup(key) if key else None
+                if entry and split_cache.materialize(entry, out_path):
+                    cache_hits += 1
+                    continue
+
+                if split_session is None:
+                    split_session = split_backend.open(pdf_path)
+                digest = split_session.extract(out_path, segments)
+                if optimize or linearize:
+                    post = postprocess_output(out_path, optimize=optimize, object_streams=object_streams, linearize=linearize)
+                    optimize_results.append(post['optimize'])
+                    linearize_results.append(post['linearize'])
+                    if post['digest'] or (post['linearize'] and 'error' not in post['linearize']):
+                        # None after a qpdf linearize: store() reads the file back
+                        digest = post['digest']
+                if key:
+                    split_cache.store(key, out_path, digest)
+        finally:
+            if split_session is not None:
+                split_session.close()
+
+        split_files = []
+        for grp in plan['groups']:
+            out_path = out_paths[grp['index']]
+            if grp['copy_of'] and out_path != out_paths[grp['copy_of']]:
+                split_cache.link_or_copy(out_paths[grp['copy_of']], out_path)
+            split_files.append({'filename': os.path.basename(out_path), 'path': out_path, 'label': grp['label']})
 
-            out_name = f"{label}.pdf"
-            out_path = os.path.join(split_dir, out_name)
-            merge_pdf_segments(pdf_path, out_path, segments)
-            split_files.append({'filename': out_name, 'path': out_path, 'label': label})
+        bytes_saved = sum_bytes_saved(optimize_results)
+        if bytes_saved is not None:
+            run.extra = dict(run.extra or {}, split_bytes_saved=bytes_saved)
+            run.save(update_fields=['extra'])
 
         yield send_progress('success', f'Split complete: {len(split_files)} files created', 50)
 
-        finish_step(split_step, status='SUCCESS', count_total=len(groups), count_done=len(split_files), count_failed=0)
+        finish_step(
+            split_step,
+            status='SUCCESS',
+            count_total=len(groups),
+            count_done=len(split_files),
+            count_failed=0,
+            extra={
+                'cache_hits': cache_hits,
+                'duplicate_groups': plan['duplicate_groups'],
+                'linearize_ms': sum_duration_ms(linearize_results),
+            },
+        )
 
         # Step 2: Upload split PDFs to Drive
         yield send_progress('info', 'Creating patient folder in Drive...', 55)
@@ -1323,7 +1640,7 @@ def progress_generator(session_id, patient_name_override, user=None):
             if upload_state_path.exists():
                 try:
                     with open(upload_state_path, 'r', encoding='utf-8') as f:
-                        up_state = json.load(f)
+                        up_state = _upload_live_state(job_id, json.load(f))
                 except Exception:
                     up_state = {}
 
@@ -1347,6 +1664,7 @@ def progress_generator(session_id, patient_name_override, user=None):
                         return
                     break
 
+            job_leases.heartbeat(session_id, 'SYNC')
             time.sleep(1.0)
 
         # Read uploaded file results for UI output (best-effort)
@@ -1384,7 +1702,9 @@ def progress_generator(session_id, patient_name_override, user=None):
         word_step = start_step(run, 'WORD_PROCESS', extra={'session_id': session_id})
 
         processor = WordHyperlinkProcessorSimple()
+        waited_before = throttle_wait_ms()
         pdf_links = processor.get_pdfs_from_drive_folder(drive_folder_id)
+        listing_throttle_ms = throttle_wait_ms() - waited_before
 
         yield send_progress('info', 'Processing Word document...', 85)
         yield send_progress('info', 'Inserting hyperlinks...', 87)
@@ -1393,11 +1713,13 @@ def progress_generator(session_id, patient_name_override, user=None):
         output_filename = metadata['word_filename'].replace('.docx', '_PROCESSED.docx')
         output_path = os.path.join(session_dir, output_filename)
 
-        result = processor.process_word_document(
-            input_docx_path=word_path,
-            pdf_links=pdf_links,
-            output_docx_path=output_path
-        )
+        with RssPeak() as rss:
+            result = processor.process_word_document_auto(
+                input_docx_path=word_path,
+                pdf_links=pdf_links,
+                output_docx_path=output_path,
+                streaming_threshold_bytes=_word_streaming_threshold_bytes(),
+            )
 
         yield send_progress('success', f'Links inserted: {result["linked_statements"]}/{result["total_statements"]}', 92)
 
@@ -1407,6 +1729,7 @@ def progress_generator(session_id, patient_name_override, user=None):
             count_total=int(result.get('total_statements') or 0),
             count_done=int(result.get('linked_statements') or 0),
             count_failed=int(result.get('unlinked_statements') or 0),
+            extra={'engine': result.get('engine'), 'peak_rss_delta_mb': rss.peak_mb, 'throttle_wait_ms': listing_throttle_ms},
         )
 
         # Move output to downloads location
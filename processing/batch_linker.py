@@ -0,0 +1,178 @@
+"""
+Batch helpers for linking many Word documents at once.
+
+Folder resolution and Drive listings are I/O bound and run in threads (one Drive
+client per thread, the googleapiclient transport is not thread-safe). Linking is
+CPU bound and runs in a process pool. Nothing in this module touches the ORM so
+that pool workers can import it without Django being configured.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .docx_streaming import RssPeak
+from .word_hyperlink_processor_simple import WordHyperlinkProcessorSimple
+
+
+def resolve_patient_folders(patient_names: Iterable[str], config, max_workers: int = 4) -> Dict[str, Dict]:
+    """Resolve each distinct patient name to its PDF folder ID exactly once.
+
+    Returns:
+        Dict mapping patient_name -> {'folder_id': str|None, 'error': str|None}
+    """
+    from .drive_utils import pooled_drive_service
+    from .smart_folder_detector_configurable import SmartFolderDetectorConfigurable
+
+    unique_names = sorted({n for n in patient_names if n})
+
+    def _resolve(name: str) -> Dict:
+        try:
+            with pooled_drive_service() as drive_service:
+                detector = SmartFolderDetectorConfigurable(config=config)
+                detector.drive_service = drive_service
+                return {'folder_id': detector.find_patient_folder(name), 'error': None}
+        except Exception as e:
+            return {'folder_id': None, 'error': str(e)}
+
+    return _run_threaded(_resolve, unique_names, max_workers)
+
+
+def fetch_folder_pdf_links(folder_ids: Iterable[str], max_workers: int = 4) -> Dict[str, Dict]:
+    """List each distinct Drive folder exactly once, concurrently.
+
+    Returns:
+        Dict mapping folder_id -> {'pdf_links': dict, 'error': str|None}
+    """
+    from .drive_utils import pooled_drive_service
+
+    unique_ids = sorted({f for f in folder_ids if f})
+
+    def _fetch(folder_id: str) -> Dict:
+        try:
+            with pooled_drive_service() as drive_service:
+                processor = WordHyperlinkProcessorSimple()
+                processor.drive_service = drive_service
+                return {'pdf_links': processor.get_pdfs_from_drive_folder(folder_id), 'error': None}
+        except Exception as e:
+            return {'pdf_links': {}, 'error': str(e)}
+
+    return _run_threaded(_fetch, unique_ids, max_workers)
+
+
+def _run_threaded(fn: Callable[[str], Dict], keys: List[str], max_workers: int) -> Dict[str, Dict]:
+    """Run fn per key in threads; each result also gets the Drive rate-limit wait it incurred."""
+    from .drive_rate_limit import throttle_wait_ms
+
+    results: Dict[str, Dict] = {}
+    if not keys:
+        return results
+
+    def _measured(key: str) -> Dict:
+        waited_before = throttle_wait_ms()
+        result = fn(key)
+        result['throttle_wait_ms'] = throttle_wait_ms() - waited_before
+        return result
+
+    workers = max(1, min(int(max_workers or 1), len(keys)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_measured, k): k for k in keys}
+        for fut in as_completed(futures):
+            results[futures[fut]] = fut.result()
+    return results
+
+
+def link_document_worker(
+    input_path: str,
+    pdf_links: Dict[str, str],
+    output_path: str,
+    streaming_threshold_bytes: int = 0,
+) -> Dict:
+    """Link a single document. Runs inside a pool worker process."""
+    t0 = time.time()
+    rss = RssPeak()
+    try:
+        with rss:
+            stats = WordHyperlinkProcessorSimple().process_word_document_auto(
+                input_docx_path=input_path,
+                pdf_links=pdf_links,
+                output_docx_path=output_path,
+                streaming_threshold_bytes=streaming_threshold_bytes,
+            )
+        return {
+            'status': 'SUCCESS',
+            'error': None,
+            'stats': stats,
+            'duration_s': round(time.time() - t0, 3),
+            'peak_rss_delta_mb': rss.peak_mb,
+        }
+    except Exception as e:
+        return {
+            'status': 'FAILED',
+            'error': str(e),
+            'stats': None,
+            'duration_s': round(time.time() - t0, 3),
+            'peak_rss_delta_mb': rss.peak_mb,
+        }
+
+
+def process_pool_allowed() -> bool:
+    """Celery prefork children are daemonic and may not start their own pools (the split workers run solo)."""
+    return not multiprocessing.current_process().daemon
+
+
+def link_documents(
+    items: List[Dict],
+    max_workers: int = 2,
+    on_result: Optional[Callable[[Dict, Dict], None]] = None,
+    streaming_threshold_bytes: int = 0,
+) -> List[Dict]:
+    """Link several documents, in a process pool when the current process allows it.
+
+    Args:
+        items: dicts with 'input_path', 'pdf_links', 'output_path' (other keys are passed through)
+        max_workers: process pool size
+        on_result: optional callback(item, result) invoked as each document finishes; when it
+            raises, the document is recorded (and reported again) as FAILED
+        streaming_threshold_bytes: documents at or above this size use the streaming engine
+
+    Returns:
+        List of results in the same order as items
+    """
+    results: List[Optional[Dict]] = [None] * len(items)
+    workers = max(1, min(int(max_workers or 1), len(items) or 1))
+
+    def _record(i: int, res: Dict) -> None:
+        results[i] = res
+        if on_result is None:
+            return
+        try:
+            on_result(items[i], res)
+        except Exception as e:
+            # e.g. saving the output failed: that document failed, the rest of the chunk goes on
+            results[i] = {'status': 'FAILED', 'error': f'Could not record result: {e}', 'stats': None, 'duration_s': res.get('duration_s')}
+            try:
+                on_result(items[i], results[i])
+            except Exception as e2:
+                print(f"[batch_linker] could not record failure of {items[i].get('input_path')}: {e2}")
+
+    if workers > 1 and process_pool_allowed():
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(
+                    link_document_worker, it['input_path'], it['pdf_links'], it['output_path'], streaming_threshold_bytes
+                ): i
+                for i, it in enumerate(items)
+            }
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    res = {'status': 'FAILED', 'error': str(e), 'stats': None, 'duration_s': None}
+                _record(i, res)
+    else:
+        for i, it in enumerate(items):
+            _record(i, link_document_worker(it['input_path'], it['pdf_links'], it['output_path'], streaming_threshold_bytes))
+
+    return [r for r in results if r is not None]
@@ -0,0 +1,260 @@
+"""
+Memory-bounded .docx processing.
+
+python-docx loads every package part (including embedded images) into memory.
+For very large documents we instead build a small "body" package containing only
+the main document part, its relationships and the styles part, let the regular
+processor work on that, and then stream every untouched zip member from the
+original file into the output.
+
+Internal relationships of the document part (images, headers, numbering, ...) are
+marked External in the body package so python-docx neither loads nor drops them,
+which also keeps their rIds reserved. They are switched back when the output is
+assembled.
+"""
+import os
+import posixpath
+import shutil
+import zipfile
+from typing import Dict, Optional
+
+from lxml import etree
+
+
+_PKG_RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_RT_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+_RT_STYLES = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles'
+
+_COPY_BUFFER = 1024 * 1024
+
+
+def _rels_name(partname: str) -> str:
+    directory, filename = posixpath.split(partname)
+    return posixpath.join(directory, '_rels', f'{filename}.rels')
+
+
+def _resolve_target(base_partname: str, target: str) -> str:
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_partname), target)).lstrip('/')
+
+
+def should_stream(docx_path: str, threshold_bytes: int) -> bool:
+    """True when the document is large enough to use the streaming engine."""
+    if not threshold_bytes or threshold_bytes <= 0:
+        return False
+    try:
+        return os.path.getsize(docx_path) >= threshold_bytes
+    except OSError:
+        return False
+
+
+def build_body_package(input_docx_path: str, body_docx_path: str) -> Dict:
+    """
+    Write a minimal package with just the main document part and styles.
+
+    Returns:
+        Context dict for assemble_output()
+
+    Raises:
+        ValueError: if the package layout is not supported by the streaming engine
+    """
+    with zipfile.ZipFile(input_docx_path, 'r') as zin:
+        names = set(zin.namelist())
+        if '[Content_Types].xml' not in names or '_rels/.rels' not in names:
+            raise ValueError('Not a Word package')
+
+        root_rels = etree.fromstring(zin.read('_rels/.rels'))
+        document_rel = None
+        for rel in root_rels.findall(f'{{{_PKG_RELS_NS}}}Relationship'):
+            if rel.get('Type') == _RT_OFFICE_DOCUMENT:
+                document_rel = rel
+                break
+        if document_rel is None:
+            raise ValueError('Main document part not found')
+
+        document_part = _resolve_target('', document_rel.get('Target'))
+        document_rels = _rels_name(document_part)
+        if document_part not in names or document_rels not in names:
+            raise ValueError('Main document part not found')
+
+        rels_xml = etree.fromstring(zin.read(document_rels))
+        styles_part = None
+        externalized = []
+        for rel in rels_xml.findall(f'{{{_PKG_RELS_NS}}}Relationship'):
+            if rel.get('TargetMode') == 'External':
+                continue
+            if rel.get('Type') == _RT_STYLES and styles_part is None:
+                styles_part = _resolve_target(document_part, rel.get('Target'))
+                continue
+            rel.set('TargetMode', 'External')
+            externalized.append(rel.get('Id'))
+        if styles_part is None or styles_part not in names:
+            raise ValueError('Styles part not found')
+
+        body_root_rels = etree.Element(f'{{{_PKG_RELS_NS}}}Relationships', nsmap={None: _PKG_RELS_NS})
+        body_root_rels.append(document_rel)
+
+        with zipfile.ZipFile(body_docx_path, 'w', compression=zipfile.ZIP_DEFLATED) as zbody:
+            zbody.writestr('[Content_Types].xml', zin.read('[Content_Types].xml'))
+            zbody.writestr('_rels/.rels', etree.tostring(body_root_rels, xml_declaration=True, encoding='UTF-8', standalone=True))
+            zbody.writestr(document_rels, etree.tostring(rels_xml, xml_declaration=True, encoding='UTF-8', standalone=True))
+            for name in (document_part, styles_part):
+                with zin.open(name) as src, zbody.open(name, 'w') as dst:
+                    shutil.copyfileobj(src, dst, _COPY_BUFFER)
+
+    return {
+        'document_part': document_part,
+        'document_rels': document_rels,
+        'styles_part': styles_part,
+        'externalized_rids': externalized,
+    }
+
+
+def assemble_output(input_docx_path: str, body_docx_path: str, output_docx_path: str, context: Dict) -> None:
+    """
+    Write the final package: processed parts from the body package, every other
+    member streamed unchanged from the original.
+    """
+    replaced = {context['document_part'], context['document_rels'], context['styles_part']}
+    externalized = set(context['externalized_rids'])
+    tmp_path = f'{output_docx_path}.tmp'
+
+    try:
+        with zipfile.ZipFile(body_docx_path, 'r') as zbody, \
+                zipfile.ZipFile(input_docx_path, 'r') as zin, \
+                zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zout:
+            rels_xml = etree.fromstring(zbody.read(context['document_rels']))
+            for rel in rels_xml.findall(f'{{{_PKG_RELS_NS}}}Relationship'):
+                if rel.get('Id') in externalized:
+                    rel.attrib.pop('TargetMode', None)
+            processed = {
+                context['document_rels']: etree.tostring(rels_xml, xml_declaration=True, encoding='UTF-8', standalone=True),
+            }
+
+            for info in zin.infolist():
+                out_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                out_info.compress_type = info.compress_type
+                out_info.external_attr = info.external_attr
+
+                if info.filename in processed:
+                    zout.writestr(out_info, processed[info.filename])
+                    continue
+
+                source = zbody if info.filename in replaced else zin
+                source_info = source.getinfo(info.filename)
+                with source.open(source_info) as src, \
+                        zout.open(out_info, 'w', force_zip64=source_info.file_size > zipfile.ZIP64_LIMIT) as dst:
+                    shutil.copyfileobj(src, dst, _COPY_BUFFER)
+
+        os.replace(tmp_path, output_docx_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def open_document_body(input_docx_path: str, threshold_bytes: int = 0):
+    """
+    python-docx Document for reading text only (e.g. patient name detection).
+
+    Above threshold_bytes only the body package is loaded; any layout the streaming
+    engine does not support falls back to loading the full document.
+    """
+    import tempfile
+    from docx import Document
+
+    if not should_stream(input_docx_path, threshold_bytes):
+        return Document(input_docx_path)
+
+    fd, body_path = tempfile.mkstemp(suffix='.docx')
+    os.close(fd)
+    try:
+        build_body_package(input_docx_path, body_path)
+        return Document(body_path)
+    except ValueError:
+        return Document(input_docx_path)
+    finally:
+        os.remove(body_path)
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Current resident set size of this process (None where unsupported)."""
+    if os.name == 'nt':
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class _Counters(ctypes.Structure):
+                _fields_ = [
+                    ('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t),
+                ]
+
+            counters = _Counters()
+            counters.cb = ctypes.sizeof(counters)
+            get_info = ctypes.windll.psapi.GetProcessMemoryInfo
+            get_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(_Counters), wintypes.DWORD]
+            if get_info(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+                return int(counters.WorkingSetSize)
+        except Exception:
+            pass
+        return None
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RssPeak:
+    """
+    Peak growth of the resident set size while the block runs, in MB.
+
+    ru_maxrss is the peak over the whole life of the process, which in long-running
+    web and Celery workers is the largest document that process ever handled. This
+    samples the current RSS from a thread instead and reports the peak above the
+    RSS at entry (peak_mb stays None where RSS cannot be read).
+
+        with RssPeak() as rss:
+            process()
+        rss.peak_mb
+    """
+
+    def __init__(self, interval_s: float = 0.05):
+        self.interval_s = interval_s
+        self.peak_mb: Optional[float] = None
+        self._baseline = None
+        self._peak = 0
+        self._stop = None
+        self._thread = None
+
+    def _sample(self) -> None:
+        rss = current_rss_bytes()
+        if rss is not None and rss > self._peak:
+            self._peak = rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self._sample()
+
+    def __enter__(self):
+        import threading
+
+        self._baseline = current_rss_bytes()
+        if self._baseline is not None:
+            self._peak = self._baseline
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='rss-peak', daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+            self.peak_mb = round(max(0, self._peak - self._baseline) / (1024 * 1024), 1)
+        return False
@@ -0,0 +1,226 @@
+"""
+Distributed token bucket for Google Drive API calls.
+
+Every Celery worker and web process shares one bucket per service account in
+Redis, refilled at DRIVE_API_RATE_PER_SEC up to DRIVE_API_BURST tokens. A call
+reserves a token atomically (Lua, Redis clock) and sleeps until its slot comes
+up, so all callers together stay just under the quota instead of bursting into
+403 userRateLimitExceeded / 429 and backing off in lockstep.
+
+The bucket sits below the Drive client (ThrottledHttp wraps the authorized
+http object), so DriveService, DrivePathResolver and the folder detectors are
+all covered without touching each call site. A rate-limit response drains the
+bucket for DRIVE_API_PENALTY_S so every process slows down together.
+
+Inside deferring() (the upload tasks), a token further away than
+DRIVE_API_MAX_WAIT_S raises DriveRateLimited instead of sleeping, and the task
+reschedules itself with that countdown rather than holding a worker. Everywhere
+else (views, folder resolution, the detectors with their broad excepts) the
+call waits for its slot: a throttled listing must not read as "folder not found".
+
+Without Redis each process falls back to a local bucket with the same settings.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class DriveRateLimited(Exception):
+    """The Drive quota has no token free within the allowed wait."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f'Drive API rate limit: next slot in {retry_after:.1f}s')
+        self.retry_after = retry_after
+
+
+# Returns the seconds to wait for the reserved token, or minus the seconds until
+# one would be free when that exceeds max_wait (nothing is reserved then).
+# A penalty removes that many seconds of quota instead of reserving.
+_TOKEN_BUCKET_LUA = """
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+local penalty = tonumber(ARGV[4])
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local wait = 0
+if penalty > 0 then
+    tokens = math.min(tokens, 0) - penalty * rate
+elseif tokens < 1 then
+    wait = (1 - tokens) / rate
+    if wait > max_wait then
+        return tostring(-wait)
+    end
+end
+if penalty <= 0 then
+    tokens = tokens - 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 60)
+return tostring(wait)
+"""
+
+
+class _LocalBucket:
+    """Same reservation logic as the Lua script, per process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: Dict[str, tuple] = {}
+
+    def call(self, key: str, rate: float, burst: float, max_wait: float, penalty: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            tokens, ts = self._state.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - ts) * rate)
+            wait = 0.0
+            if penalty > 0:
+                tokens = min(tokens, 0.0) - penalty * rate
+            else:
+                if tokens < 1:
+                    wait = (1 - tokens) / rate
+                    if wait > max_wait:
+                        return -wait
+                tokens -= 1
+            self._state[key] = (tokens, now)
+            return wait
+
+
+_local_bucket = _LocalBucket()
+_scripts: Dict = {}
+_thread_stats = threading.local()
+
+
+def _settings() -> Dict:
+    from django.conf import settings
+
+    return {
+        'rate': float(getattr(settings, 'DRIVE_API_RATE_PER_SEC', 10) or 0),
+        'burst': float(getattr(settings, 'DRIVE_API_BURST', 20) or 1),
+        'max_wait': float(getattr(settings, 'DRIVE_API_MAX_WAIT_S', 10) or 0),
+        'penalty': float(getattr(settings, 'DRIVE_API_PENALTY_S', 1.0) or 0),
+        'redis_url': getattr(settings, 'DRIVE_RATE_LIMIT_REDIS_URL', '') or getattr(settings, 'CELERY_BROKER_URL', ''),
+    }
+
+
+def _bucket_call(key: str, conf: Dict, penalty: float = 0.0) -> float:
+    from .redis_utils import get_redis, mark_unavailable
+
+    client = get_redis(conf['redis_url'])
+    if client is not None:
+        try:
+            script = _scripts.get(id(client))
+            if script is None:
+                script = _scripts[id(client)] = client.register_script(_TOKEN_BUCKET_LUA)
+            return float(script(keys=[key], args=[conf['rate'], conf['burst'], conf['max_wait'], penalty]))
+        except Exception as e:
+            print(f"[drive_rate_limit] Redis bucket failed, using a per-process bucket: {e}")
+            mark_unavailable(conf['redis_url'])
+    return _local_bucket.call(key, conf['rate'], conf['burst'], conf['max_wait'], penalty)
+
+
+def bucket_key(account: str) -> str:
+    return f'drive_rate:{account or "default"}'
+
+
+# Outside deferring() a token is always reserved, however far away
+_NO_MAX_WAIT_S = 10 ** 9
+
+
+@contextmanager
+def deferring():
+    """Let acquire() raise DriveRateLimited in this thread when the wait is too long."""
+    previous = getattr(_thread_stats, 'defer', False)
+    _thread_stats.defer = True
+    try:
+        yield
+    finally:
+        _thread_stats.defer = previous
+
+
+def acquire(key: str) -> float:
+    """Take one Drive API token, sleeping for its slot. Returns seconds waited."""
+    conf = _settings()
+    if conf['rate'] <= 0:
+        return 0.0
+
+    if not getattr(_thread_stats, 'defer', False):
+        conf['max_wait'] = _NO_MAX_WAIT_S
+    wait = _bucket_call(key, conf)
+    if wait < 0:
+        raise DriveRateLimited(-wait)
+    if wait > 0:
+        time.sleep(wait)
+        _thread_stats.wait_ms = throttle_wait_ms() + int(wait * 1000)
+    return wait
+
+
+def penalize(key: str) -> None:
+    """Drain the shared bucket after Drive answered with a rate-limit error."""
+    conf = _settings()
+    if conf['rate'] > 0 and conf['penalty'] > 0:
+        _bucket_call(key, conf, penalty=conf['penalty'])
+
+
+def throttle_wait_ms() -> int:
+    """Milliseconds this thread has spent waiting for Drive tokens (monotonic; diff around a step)."""
+    return getattr(_thread_stats, 'wait_ms', 0)
+
+
+def _is_rate_limit_response(status, content) -> bool:
+    if status == 429:
+        return True
+    if status == 403:
+        if isinstance(content, bytes):
+            content = content.decode('utf-8', 'replace')
+        # userRateLimitExceeded / rateLimitExceeded; other 403s are permission errors
+        return 'ateLimitExceeded' in (content or '')
+    return False
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for 429 and 403 rate-limit HttpErrors from Drive (and DriveRateLimited)."""
+    if isinstance(error, DriveRateLimited):
+        return True
+    return _is_rate_limit_response(getattr(getattr(error, 'resp', None), 'status', None), getattr(error, 'content', None))
+
+
+def retry_countdown(error: Exception, attempt: int) -> float:
+    """Seconds before retrying a failed Drive call: the bucket's own estimate, else jittered backoff."""
+    if isinstance(error, DriveRateLimited):
+        return error.retry_after + random.uniform(0, 1)
+    if is_rate_limit_error(error):
+        return min(60, 2 ** attempt) + random.uniform(0, 2 ** attempt)
+    return min(8, 2 ** attempt)
+
+
+class ThrottledHttp:
+    """Authorized http object that takes a bucket token before every Drive request."""
+
+    def __init__(self, http, key: str):
+        self._http = http
+        self._key = key
+
+    def request(self, *args, **kwargs):
+        acquire(self._key)
+        resp, content = self._http.request(*args, **kwargs)
+        if _is_rate_limit_response(getattr(resp, 'status', None), content):
+            penalize(self._key)
+        return resp, content
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+
+def throttled_http(http, account: Optional[str]) -> ThrottledHttp:
+    return ThrottledHttp(http, bucket_key(account or ''))
@@ -9,7 +9,11 @@ import httplib2
 from google_auth_httplib2 import AuthorizedHttp
 from django.conf import settings
 from typing import Tuple, Optional, Dict
+from contextlib import contextmanager
 import os
+import queue
+
+from .drive_rate_limit import throttled_http
 
 
 class DriveService:
@@ -49,6 +53,8 @@ class DriveService:
 
             http = httplib2.Http(proxy_info=None)
             authed_http = AuthorizedHttp(self.credentials, http=http)
+            # Every request takes a token from the service account's shared Drive quota bucket
+            authed_http = throttled_http(authed_http, getattr(self.credentials, 'service_account_email', None))
             self.service = build('drive', 'v3', http=authed_http, cache_discovery=False)
             
         except Exception as e:
@@ -322,6 +328,9 @@ class DriveService:
 
 # Singleton instance
 _drive_service = None
+# Idle clients for concurrent callers; each is used by one thread at a time
+# (the httplib2 transport is not thread-safe) and reused across tasks of a worker
+_service_pool = queue.LifoQueue()
 
 
 def get_active_drive_root_folder_id() -> Optional[str]:
@@ -341,3 +350,19 @@ def get_drive_service() -> DriveService:
         _drive_service = DriveService(credentials_path=credentials_path, root_folder_id=root_folder_id)
 
     return _drive_service
+
+
+@contextmanager
+def pooled_drive_service():
+    """Borrow a Drive client for the duration of the block (for thread pools)."""
+    try:
+        service = _service_pool.get_nowait()
+    except queue.Empty:
+        service = DriveService(
+            credentials_path=get_active_drive_credentials_path(),
+            root_folder_id=get_active_drive_root_folder_id(),
+        )
+    try:
+        yield service
+    finally:
+        _service_pool.put(service)
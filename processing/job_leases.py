@@ -0,0 +1,251 @@
+"""
+Lease-based accounting of running jobs.
+
+Every RUNNING ProcessingRun holds a lease in Redis:
+
+    job_leases      ZSET  "<run_mode>:<job_id>" -> lease expiry (unix seconds)
+    job_lease_users HASH  "<run_mode>:<job_id>" -> user id ('' when anonymous)
+
+The lease is taken when the run starts (get_or_create_run / admission), renewed
+by heartbeats from the tasks and steps doing the work, and dropped by
+finish_run(). Admission reads the live leases (ZRANGEBYSCORE over at most a
+handful of members) instead of COUNT queries on ProcessingRun.
+
+Fanning out renews the lease too (heartbeat(force=True)), and a job whose
+tasks are still waiting in the broker is renewed instead of reaped: in a
+backlog its chunks may wait longer than a TTL without any of them running.
+Waiting tasks are counted per job, so the reaper reads one counter per expired
+lease instead of scanning the broker:
+
+    job_pending_tasks:<job_id>  STRING  +1 per task sent, -1 when a worker starts it
+
+(before_task_publish / task_prerun, hooked up in pdf_automation/celery.py).
+
+A worker that dies mid-job stops heartbeating; once its lease expires,
+reap_expired_leases() finishes the run FAILED through finish_run() (so pipelines
+stop and the queue is pumped), and crashed jobs no longer hold a slot forever.
+Without Redis, callers fall back to the ProcessingRun table.
+"""
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+
+LEASES_KEY = 'job_leases'
+LEASE_USERS_KEY = 'job_lease_users'
+
+# Last renewal per member in this process; heartbeats in between are skipped
+_renewed: Dict[str, float] = {}
+_last_reap = {'at': 0.0}
+REAP_INTERVAL_S = 30
+
+# Tasks sent and not yet started, per job. Refreshed on every send; a count left
+# behind by a lost message stops protecting its job a day after the last send.
+PENDING_KEY_PREFIX = 'job_pending_tasks:'
+PENDING_TTL_S = 24 * 3600
+# Never below zero (a task sent before the counter existed, or redelivered)
+_DECR_PENDING = """
+local n = redis.call('DECR', KEYS[1])
+if n <= 0 then redis.call('DEL', KEYS[1]) end
+return n
+"""
+
+
+def _client():
+    from .redis_utils import get_redis
+
+    url = getattr(settings, 'JOB_LEASE_REDIS_URL', '') or getattr(settings, 'CELERY_BROKER_URL', '')
+    return get_redis(url)
+
+
+def _ttl_s() -> int:
+    return int(getattr(settings, 'JOB_LEASE_TTL_S', 900) or 900)
+
+
+def _member(run_mode: str, job_id: str) -> str:
+    return f'{run_mode}:{job_id}'
+
+
+def _failed(e: Exception) -> None:
+    from .redis_utils import mark_unavailable
+
+    print(f"[job_leases] Redis call failed: {e}")
+    mark_unavailable(getattr(settings, 'JOB_LEASE_REDIS_URL', '') or getattr(settings, 'CELERY_BROKER_URL', ''))
+
+
+def acquire_lease(run) -> None:
+    """Take (or refresh) the lease of a RUNNING run."""
+    client = _client()
+    if client is None or not run.job_id:
+        return
+    member = _member(run.run_mode, run.job_id)
+    try:
+        pipe = client.pipeline()
+        pipe.zadd(LEASES_KEY, {member: time.time() + _ttl_s()})
+        pipe.hset(LEASE_USERS_KEY, member, str(run.user_id or ''))
+        pipe.execute()
+        _renewed[member] = time.time()
+    except Exception as e:
+        _failed(e)
+
+
+def heartbeat(job_id: str, run_mode: str = 'ASYNC', force: bool = False) -> None:
+    """
+    Extend a running job's lease. Cheap to call often: renews at most every TTL/10
+    per process, unless force (after enqueueing a fan-out).
+    """
+    member = _member(run_mode, job_id)
+    if not job_id or (not force and time.time() - _renewed.get(member, 0) < _ttl_s() / 10):
+        return
+    client = _client()
+    if client is None:
+        return
+    try:
+        # XX: never resurrect a lease that was released or reaped
+        client.zadd(LEASES_KEY, {member: time.time() + _ttl_s()}, xx=True)
+        _renewed[member] = time.time()
+    except Exception as e:
+        _failed(e)
+
+
+def release_lease(run) -> None:
+    client = _client()
+    if client is None or not run.job_id:
+        return
+    member = _member(run.run_mode, run.job_id)
+    _renewed.pop(member, None)
+    try:
+        pipe = client.pipeline()
+        pipe.zrem(LEASES_KEY, member)
+        pipe.hdel(LEASE_USERS_KEY, member)
+        pipe.execute()
+    except Exception as e:
+        _failed(e)
+
+
+def running_counts() -> Optional[Dict]:
+    """
+    {'total': n, 'async': n, 'by_user': Counter(user_id -> n)} from live leases,
+    or None when Redis is unavailable (callers count ProcessingRun rows instead).
+    """
+    client = _client()
+    if client is None:
+        return None
+    try:
+        members = [m.decode() for m in client.zrangebyscore(LEASES_KEY, time.time(), '+inf')]
+        users = client.hmget(LEASE_USERS_KEY, members) if members else []
+    except Exception as e:
+        _failed(e)
+        return None
+
+    by_user = Counter(int(u) if u else None for u in users)
+    return {
+        'total': len(members),
+        'async': sum(1 for m in members if m.startswith('ASYNC:')),
+        'by_user': by_user,
+    }
+
+
+def _pending_key(job_id: str) -> str:
+    return f'{PENDING_KEY_PREFIX}{job_id}'
+
+
+def _task_job_id(task_name: str, args, kwargs) -> str:
+    """The job a processing task works for: its job_id/batch_id kwarg or first argument."""
+    if not (task_name or '').startswith('processing.tasks.'):
+        return ''
+    kwargs = kwargs or {}
+    job_id = kwargs.get('job_id') or kwargs.get('batch_id') or (args[0] if args else '')
+    return job_id if isinstance(job_id, str) else ''
+
+
+def task_published(task_name: str, args, kwargs) -> None:
+    """A task of a job was sent to the broker (before_task_publish; retries included)."""
+    job_id = _task_job_id(task_name, args, kwargs)
+    client = _client() if job_id else None
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline()
+        pipe.incr(_pending_key(job_id))
+        pipe.expire(_pending_key(job_id), PENDING_TTL_S)
+        pipe.execute()
+    except Exception as e:
+        _failed(e)
+
+
+def task_started(task_name: str, args, kwargs) -> None:
+    """A worker took a task of a job off the broker (task_prerun)."""
+    job_id = _task_job_id(task_name, args, kwargs)
+    client = _client() if job_id else None
+    if client is None:
+        return
+    try:
+        client.eval(_DECR_PENDING, 1, _pending_key(job_id))
+    except Exception as e:
+        _failed(e)
+
+
+def _pending_job_ids(client, job_ids: List[str]) -> set:
+    """The job_ids that still have tasks waiting in the broker (queued, reserved or scheduled)."""
+    if not job_ids:
+        return set()
+    counts = client.mget([_pending_key(job_id) for job_id in job_ids])
+    return {job_id for job_id, count in zip(job_ids, counts) if count and int(count) > 0}
+
+
+def reap_expired_leases(force: bool = False) -> List[str]:
+    """
+    Finish runs whose lease expired FAILED (their worker stopped heartbeating).
+    Jobs with tasks still waiting in the broker are renewed instead. Runs without
+    any lease (e.g. started while Redis was unreachable) are left alone: nothing
+    tells a crashed one from a healthy one. Returns the reaped members.
+    """
+    from pdfs.analytics_utils import finish_run, finish_step
+    from pdfs.models import ProcessingRun
+
+    now = time.time()
+    # Called on every queue pump; expiry only needs noticing within a TTL
+    if not force and now - _last_reap['at'] < REAP_INTERVAL_S:
+        return []
+    client = _client()
+    if client is None:
+        return []
+    _last_reap['at'] = now
+
+    reaped = []
+    try:
+        expired = [raw.decode() for raw in client.zrangebyscore(LEASES_KEY, '-inf', now)]
+        if not expired:
+            return []
+        # Still queued: its tasks will run (and heartbeat) once a worker gets to them
+        waiting = _pending_job_ids(client, [m.partition(':')[2] for m in expired])
+        for member in expired:
+            if member.partition(':')[2] in waiting:
+                client.zadd(LEASES_KEY, {member: now + _ttl_s()}, xx=True)
+            # ZREM is the claim: only one reaper handles each expired lease
+            elif client.zrem(LEASES_KEY, member):
+                client.hdel(LEASE_USERS_KEY, member)
+                reaped.append(member)
+    except Exception as e:
+        _failed(e)
+        return []
+
+    error = 'Job stopped reporting progress (worker lost); marked failed when its lease expired'
+    finished = []
+    for member in reaped:
+        run_mode, _, job_id = member.partition(':')
+        # Conditional claim against a concurrent reaper (or the job finishing meanwhile)
+        if not ProcessingRun.objects.filter(run_mode=run_mode, job_id=job_id, status='RUNNING').update(status='FAILED'):
+            continue
+        run = ProcessingRun.objects.get(run_mode=run_mode, job_id=job_id)
+        for step in run.steps.filter(status='RUNNING').exclude(step='PIPELINE'):
+            finish_step(step, status='FAILED', error_code='LEASE_EXPIRED', error_message=error)
+        # Stops the job's pipeline; the caller pumps the queue
+        finish_run(run, status='FAILED', error_code='LEASE_EXPIRED', error_message=error, dispatch=False)
+        finished.append(member)
+    if finished:
+        print(f"[job_leases] reaped {len(finished)} abandoned runs: {', '.join(sorted(finished))}")
+    return finished
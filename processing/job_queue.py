@@ -0,0 +1,184 @@
+"""
+Admission queue for async jobs.
+
+At most MAX_RUNNING_JOBS_TOTAL / MAX_RUNNING_JOBS_ASYNC jobs run at once. New
+jobs beyond that are not rejected but queued (JobQueueEntry) and admitted as
+slots free up, in this order:
+
+1. fair share: users with fewer running jobs first, so one user's backlog
+   cannot hold every worker
+2. size: smaller jobs (fewer outputs/documents) first; the size is divided by
+   (1 + waited / JOB_QUEUE_AGING_S) so big jobs are not starved
+3. arrival
+
+An admitted job's ProcessingRun is marked RUNNING (and takes its lease, see
+job_leases) before its task is sent, so it holds its slot until the stage calls
+finish_run() or its lease expires. The queue is pumped on submit, on every
+finish_run() and on status polls.
+"""
+from collections import Counter
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import job_leases
+
+
+def _task_for(kind: str):
+    from . import tasks
+
+    return {
+        'PREFLIGHT': tasks.preflight_split_job,
+        'SPLIT': tasks.split_pdf_job,
+        'UPLOAD': tasks.upload_split_job,
+        'BATCH': tasks.batch_process_documents_job,
+    }[kind]
+
+
+def _running() -> dict:
+    """Live job leases; the ProcessingRun table when Redis is unavailable."""
+    from pdfs.models import ProcessingRun
+
+    counts = job_leases.running_counts()
+    if counts is not None:
+        return counts
+    running = ProcessingRun.objects.filter(status='RUNNING')
+    return {
+        'total': running.count(),
+        'async': running.filter(run_mode='ASYNC').count(),
+        'by_user': Counter(running.values_list('user_id', flat=True)),
+    }
+
+
+def _free_slots(running: dict) -> int:
+    max_running_total = int(getattr(settings, 'MAX_RUNNING_JOBS_TOTAL', 4) or 4)
+    max_running_async = int(getattr(settings, 'MAX_RUNNING_JOBS_ASYNC', 3) or 3)
+    return min(max_running_total - running['total'], max_running_async - running['async'])
+
+
+def _priority(entry, running_by_user: Counter, now) -> tuple:
+    aging_s = float(getattr(settings, 'JOB_QUEUE_AGING_S', 300) or 300)
+    waited_s = max(0.0, (now - entry.created_at).total_seconds())
+    return (running_by_user[entry.user_id], entry.cost / (1 + waited_s / aging_s), entry.created_at)
+
+
+def _ordered(entries: List, running_by_user: Counter, now) -> List:
+    """Admission order of the queued entries, taking into account the slots each pick uses up."""
+    running_by_user = Counter(running_by_user)
+    remaining = list(entries)
+    ordered = []
+    while remaining:
+        best = min(remaining, key=lambda e: _priority(e, running_by_user, now))
+        remaining.remove(best)
+        ordered.append(best)
+        running_by_user[best.user_id] += 1
+    return ordered
+
+
+def _mark_running(entry) -> None:
+    """Claim the slot: the job's run counts as RUNNING from admission until its stage finishes."""
+    from pdfs.analytics_utils import get_or_create_run
+
+    run = get_or_create_run(job_id=entry.job_id, run_mode='ASYNC', user=entry.user)
+    if run.status != 'RUNNING':
+        run.status = 'RUNNING'
+        run.finished_at = None
+        run.save(update_fields=['status', 'finished_at'])
+        job_leases.acquire_lease(run)
+
+
+def dispatch_queued_jobs() -> List:
+    """Admit queued jobs into free slots and send their tasks. Returns the admitted entries."""
+    from pdfs.models import JobQueueEntry
+
+    # Crashed jobs give their slots back here
+    job_leases.reap_expired_leases()
+
+    now = timezone.now()
+    with transaction.atomic():
+        queued = list(JobQueueEntry.objects.select_for_update().filter(status='QUEUED'))
+        if not queued:
+            return []
+        running = _running()
+        free = _free_slots(running)
+        if free <= 0:
+            return []
+
+        admitted = []
+        for entry in _ordered(queued, running['by_user'], now)[:free]:
+            # Conditional claim: another process pumping the queue may have admitted it already
+            if JobQueueEntry.objects.filter(pk=entry.pk, status='QUEUED').update(status='ADMITTED', admitted_at=now):
+                _mark_running(entry)
+                admitted.append(entry)
+
+    for entry in admitted:
+        _send(entry)
+    return admitted
+
+
+def _send(entry) -> None:
+    try:
+        entry.task_id = _task_for(entry.kind).apply_async(args=entry.task_args).id
+        entry.save(update_fields=['task_id'])
+    except Exception as e:
+        from pdfs.analytics_utils import finish_run, get_or_create_run
+
+        print(f"[job_queue] could not send {entry.kind} {entry.job_id}: {e}")
+        entry.status = 'CANCELLED'
+        entry.error_message = str(e)
+        entry.save(update_fields=['status', 'error_message'])
+        finish_run(get_or_create_run(job_id=entry.job_id, run_mode='ASYNC'), status='FAILED', error_message=str(e))
+
+
+def submit(kind: str, job_id: str, args: list, user=None, cost: int = 1, holds_slot: bool = False) -> Dict:
+    """
+    Queue a job and admit it right away when a slot is free.
+
+    holds_slot: the job's run is still RUNNING from its previous stage (pipelines);
+    the next stage keeps that slot and is sent without queueing.
+
+    Returns:
+        {'queued': False, 'task_id': '...'} or
+        {'queued': True, 'status': 'QUEUED', 'queue_position': n, 'queue_length': n}
+    """
+    from pdfs.models import JobQueueEntry
+
+    if user is not None and not getattr(user, 'is_authenticated', False):
+        user = None
+
+    # A retry replaces the same job's earlier place in the queue
+    JobQueueEntry.objects.filter(job_id=job_id, kind=kind, status='QUEUED').update(status='CANCELLED')
+    entry = JobQueueEntry.objects.create(job_id=job_id, kind=kind, user=user, cost=max(1, int(cost or 1)), task_args=args)
+    if holds_slot:
+        entry.status = 'ADMITTED'
+        entry.admitted_at = timezone.now()
+        entry.save(update_fields=['status', 'admitted_at'])
+        _send(entry)
+    else:
+        dispatch_queued_jobs()
+
+    entry.refresh_from_db()
+    if entry.status == 'QUEUED':
+        return dict(queue_status(job_id, kind, dispatch=False) or {}, queued=True)
+    if entry.status == 'CANCELLED':
+        raise RuntimeError(entry.error_message or 'Job could not be started')
+    return {'queued': False, 'task_id': entry.task_id}
+
+
+def queue_status(job_id: str, kind: str, dispatch: bool = True) -> Optional[Dict]:
+    """
+    {'status': 'QUEUED', 'queue_position': n, 'queue_length': n} while the job waits, else None.
+    Also pumps the queue, so polling clients keep it moving if no job finished meanwhile.
+    """
+    from pdfs.models import JobQueueEntry
+
+    if dispatch:
+        dispatch_queued_jobs()
+
+    queued = list(JobQueueEntry.objects.filter(status='QUEUED'))
+    for position, entry in enumerate(_ordered(queued, _running()['by_user'], timezone.now()), 1):
+        if entry.job_id == job_id and entry.kind == kind:
+            return {'status': 'QUEUED', 'queue_position': position, 'queue_length': len(queued)}
+    return None
@@ -1,9 +1,7 @@
 """
 Extract page ranges from Word documents for PDF splitting
 """
-from docx import Document
 from typing import List
-import re
 
 
 def extract_page_ranges_from_word(docx_path: str) -> List[str]:
@@ -27,47 +25,9 @@ def extract_page_ranges_from_word(docx_path: str) -> List[str]:
         Returns:
             ['1-2', '4', '7-8']
     """
-    from .word_hyperlink_processor_simple import WordHyperlinkProcessorSimple
+    from .page_range_service import get_page_ranges
 
-    processor = WordHyperlinkProcessorSimple()
-    doc = Document(docx_path)
-
-    page_ranges = []
-    seen_ranges = set()  # Track duplicates
-
-    # Get all paragraphs (body + tables)
-    all_paragraphs = []
-    for p in doc.paragraphs:
-        all_paragraphs.append(p.text)
-
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for p in cell.paragraphs:
-                    all_paragraphs.append(p.text)
-
-    # Process each paragraph
-    for text in all_paragraphs:
-        if not text or not text.strip():
-            continue
-
-        # Check if it's a statement line
-        if not processor.is_statement_line(text):
-            continue
-
-        # Extract page range
-        result = processor.parse_statement_with_page_number(text)
-        if not result or not result.get('page_range'):
-            continue
-
-        page_range = result['page_range']
-
-        # Avoid duplicates (in case same range appears multiple times)
-        if page_range not in seen_ranges:
-            page_ranges.append(page_range)
-            seen_ranges.add(page_range)
-
-    return page_ranges
+    return get_page_ranges(docx_path)
 
 
 def format_for_split_input(page_ranges: List[str]) -> str:
@@ -99,59 +59,16 @@ def preview_page_ranges(docx_path: str) -> dict:
             ]
         }
     """
-    from .word_hyperlink_processor_simple import WordHyperlinkProcessorSimple
-
-    processor = WordHyperlinkProcessorSimple()
-    doc = Document(docx_path)
-
-    page_ranges = []
-    preview_items = []
-    seen_ranges = set()
-
-    # Get all paragraphs
-    all_paragraphs = []
-    for p in doc.paragraphs:
-        all_paragraphs.append(p.text)
-
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for p in cell.paragraphs:
-                    all_paragraphs.append(p.text)
-
-    # Process each paragraph
-    for text in all_paragraphs:
-        if not text or not text.strip():
-            continue
-
-        if not processor.is_statement_line(text):
-            continue
-
-        result = processor.parse_statement_with_page_number(text)
-        if not result or not result.get('page_range'):
-            continue
-
-        page_range = result['page_range']
-
-        if page_range not in seen_ranges:
-            page_ranges.append(page_range)
-            seen_ranges.add(page_range)
-
-            # Create preview with truncated description
-            description = result.get('header_text', '')
-            if len(description) > 60:
-                description = description[:60] + '...'
+    from .page_range_service import analyze_word_document
 
-            preview_items.append({
-                'range': page_range,
-                'description': description
-            })
+    analysis = analyze_word_document(docx_path)
+    page_ranges = list(analysis['page_ranges'])
 
     return {
         'page_ranges': page_ranges,
         'count': len(page_ranges),
         'formatted': format_for_split_input(page_ranges),
-        'preview': preview_items
+        'preview': list(analysis['preview'])
     }
 
 
@@ -0,0 +1,136 @@
+"""
+Page-range extraction service.
+
+Parsing a Word document for statements is pure in its content, so results are
+cached under the document's SHA-256 in the 'page_ranges' cache alias (Redis in
+production). Re-uploads of the same document and preview -> complete round-trips
+across web and Celery workers reuse the stored result. A cache outage never fails
+a request: the document is simply parsed again.
+"""
+from typing import Dict, List, Optional
+
+from .pdf_utils import compute_sha256
+
+
+# Bump when statement parsing changes so stale entries are ignored
+PARSER_VERSION = 1
+
+PAGE_RANGE_CACHE_ALIAS = 'page_ranges'
+
+
+def _cache():
+    from django.core.cache import caches
+    from django.core.cache.backends.base import InvalidCacheBackendError
+
+    try:
+        return caches[PAGE_RANGE_CACHE_ALIAS]
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _cache_key(sha256: str) -> str:
+    return f'page_ranges:v{PARSER_VERSION}:{sha256}'
+
+
+def _cache_timeout() -> int:
+    from django.conf import settings
+
+    return int(getattr(settings, 'PAGE_RANGE_CACHE_TTL', 7 * 24 * 3600) or 7 * 24 * 3600)
+
+
+def parse_word_document(docx_path: str) -> Dict:
+    """
+    Parse a Word document once (no cache).
+
+    Returns:
+        {
+            'page_ranges': ['1-2', '4', ...],            # ordered, de-duplicated
+            'preview': [{'range': '1-2', 'description': '06/19/25. From ...'}, ...],
+            'positions': [{'position': 12, 'page_range': '1-2'}, ...],  # every statement, paragraph order
+            'patient_name': 'Carl_Mayfield' or None,
+        }
+    """
+    from django.conf import settings
+    from .docx_streaming import open_document_body
+    from .word_hyperlink_processor_simple import WordHyperlinkProcessorSimple
+
+    processor = WordHyperlinkProcessorSimple()
+    # Text only: very large documents are read without their media parts
+    streaming_threshold = int(getattr(settings, 'WORD_STREAMING_THRESHOLD_MB', 20) or 0) * 1024 * 1024
+    doc = open_document_body(docx_path, streaming_threshold)
+
+    page_ranges = []
+    preview_items = []
+    positions = []
+    seen_ranges = set()
+
+    for pos, paragraph in enumerate(processor._iter_all_paragraphs(doc)):
+        text = paragraph.text
+        if not text or not text.strip():
+            continue
+
+        if not processor.is_statement_line(text):
+            continue
+
+        result = processor.parse_statement_with_page_number(text)
+        if not result or not result.get('page_range'):
+            continue
+
+        page_range = result['page_range']
+        positions.append({'position': pos, 'page_range': page_range})
+
+        if page_range not in seen_ranges:
+            page_ranges.append(page_range)
+            seen_ranges.add(page_range)
+
+            description = result.get('header_text', '')
+            if len(description) > 60:
+                description = description[:60] + '...'
+
+            preview_items.append({
+                'range': page_range,
+                'description': description
+            })
+
+    return {
+        'page_ranges': page_ranges,
+        'preview': preview_items,
+        'positions': positions,
+        'patient_name': processor.extract_patient_name_from_document(doc),
+    }
+
+
+def analyze_word_document(docx_path: str, sha256: Optional[str] = None) -> Dict:
+    """
+    Cached parse_word_document(), keyed by document SHA-256.
+
+    Args:
+        docx_path: Path to Word document
+        sha256: Hex digest if the caller already hashed the file while writing it
+
+    Returns:
+        parse_word_document() result plus 'sha256' and 'cached' (bool)
+    """
+    sha256 = sha256 or compute_sha256(docx_path)
+    key = _cache_key(sha256)
+
+    try:
+        cached = _cache().get(key)
+    except Exception as e:
+        print(f"[page_ranges] cache read failed: {e}")
+        cached = None
+
+    if cached is not None:
+        return dict(cached, sha256=sha256, cached=True)
+
+    result = parse_word_document(docx_path)
+    try:
+        _cache().set(key, result, _cache_timeout())
+    except Exception as e:
+        print(f"[page_ranges] cache write failed: {e}")
+
+    return dict(result, sha256=sha256, cached=False)
+
+
+def get_page_ranges(docx_path: str, sha256: Optional[str] = None) -> List[str]:
+    return list(analyze_word_document(docx_path, sha256=sha256)['page_ranges'])
@@ -0,0 +1,259 @@
+"""
+Shared-resource-aware post-pass for split outputs.
+
+Splitting copies every resource a page references into each output, and some
+backends (PyPDF2) end up with several identical copies
+of the same font or scanned image inside a single output. This pass, run with
+pikepdf on the finished file:
+
+1. points every page resource at one canonical copy of structurally identical
+   objects (identical stream bytes and dictionaries), so duplicates become
+   unreachable and are not written
+2. drops resources the pages of this subset never use
+3. optionally writes object streams and compresses uncompressed streams
+
+The original is only replaced when the result is smaller.
+
+Optionally (FolderStructureConfig.linearize_split_outputs) outputs are then
+linearized, so Drive preview can show the first page before the whole file is
+downloaded.
+"""
+import hashlib
+import os
+from typing import Dict, Optional
+
+
+_RESOURCE_CATEGORIES = ('/XObject', '/Font', '/ExtGState', '/ColorSpace', '/Pattern', '/Shading', '/Properties')
+# Keys that point back up the tree (or are recomputed on save) and must not take part in the fingerprint
+_SKIP_KEYS = {'/Parent', '/Length'}
+
+
+def _fingerprint(obj, memo: Dict, active: set) -> str:
+    """Structural hash of a PDF object (following indirect references)."""
+    import pikepdf
+
+    objgen = obj.objgen if isinstance(obj, pikepdf.Object) and obj.is_indirect else None
+    if objgen is not None:
+        if objgen in memo:
+            return memo[objgen]
+        if objgen in active:
+            # Reference cycle: fall back to identity for the back edge
+            return f'ref{objgen}'
+        active.add(objgen)
+
+    h = hashlib.sha256()
+    if isinstance(obj, pikepdf.Stream):
+        h.update(b'stream')
+        h.update(obj.read_raw_bytes())
+        items = obj.stream_dict.items()
+    elif isinstance(obj, pikepdf.Dictionary):
+        h.update(b'dict')
+        items = obj.items()
+    elif isinstance(obj, pikepdf.Array):
+        h.update(b'array')
+        items = enumerate(obj)
+    else:
+        items = None
+        h.update(repr(obj).encode('utf-8', 'replace'))
+
+    if items is not None:
+        for key, value in sorted(items, key=lambda kv: str(kv[0])):
+            if key in _SKIP_KEYS:
+                continue
+            h.update(str(key).encode('utf-8'))
+            h.update(_fingerprint(value, memo, active).encode('ascii'))
+
+    digest = h.hexdigest()
+    if objgen is not None:
+        active.discard(objgen)
+        memo[objgen] = digest
+    return digest
+
+
+def dedupe_page_resources(pdf) -> int:
+    """Repoint page resources at one canonical copy per identical object. Returns objects merged."""
+    import pikepdf
+
+    memo: Dict = {}
+    canonical: Dict[str, pikepdf.Object] = {}
+    merged = set()
+
+    for page in pdf.pages:
+        resources = page.obj.get('/Resources')
+        if not isinstance(resources, pikepdf.Dictionary):
+            continue
+        for category in _RESOURCE_CATEGORIES:
+            entries = resources.get(category)
+            if not isinstance(entries, pikepdf.Dictionary):
+                continue
+            for name in list(entries.keys()):
+                value = entries[name]
+                if not value.is_indirect:
+                    continue
+                digest = _fingerprint(value, memo, set())
+                keep = canonical.setdefault(digest, value)
+                if keep.objgen != value.objgen:
+                    entries[name] = keep
+                    merged.add(value.objgen)
+    return len(merged)
+
+
+def optimize_pdf_file(path: str, object_streams: bool = True) -> Dict:
+    """
+    Optimize one output PDF in place.
+
+    Returns:
+        {'bytes_before': n, 'bytes_after': n, 'bytes_saved': n, 'merged_objects': n,
+         'sha256': hex (only when the file was replaced)}
+        or {'error': '...'} when pikepdf is unavailable or the file could not be processed.
+    """
+    try:
+        import pikepdf
+    except ImportError:
+        return {'error': 'pikepdf not installed'}
+
+    from .pdf_utils import write_hashed
+
+    bytes_before = os.path.getsize(path)
+    tmp_path = f'{path}.opt'
+    try:
+        with pikepdf.open(path) as pdf:
+            merged = dedupe_page_resources(pdf)
+            pdf.remove_unreferenced_resources()
+            save_kwargs = {'compress_streams': True}
+            if object_streams:
+                save_kwargs['object_stream_mode'] = pikepdf.ObjectStreamMode.generate
+            digest = write_hashed(tmp_path, lambda stream: pdf.save(stream, **save_kwargs))
+
+        result = {
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_before,
+            'bytes_saved': 0,
+            'merged_objects': merged,
+        }
+        if digest['size_bytes'] < bytes_before:
+            os.replace(tmp_path, path)
+            result.update({
+                'bytes_after': digest['size_bytes'],
+                'bytes_saved': bytes_before - digest['size_bytes'],
+                'sha256': digest['sha256'],
+            })
+        return result
+    except Exception as e:
+        return {'error': str(e)}
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def linearize_pdf_file(path: str) -> Dict:
+    """
+    Rewrite one output as a linearized ("fast web view") PDF in place, so viewers
+    fetching it with Range requests can render the first page before the rest arrives.
+
+    Returns:
+        {'bytes_before': n, 'bytes_after': n, 'sha256': hex or None, 'tool': 'pikepdf'|'qpdf'}
+        or {'error': '...'}
+    """
+    import shutil
+    import subprocess
+
+    bytes_before = os.path.getsize(path)
+    tmp_path = f'{path}.lin'
+    try:
+        try:
+            import pikepdf
+        except ImportError:
+            pikepdf = None
+
+        if pikepdf is not None:
+            from .pdf_utils import write_hashed
+
+            with pikepdf.open(path) as pdf:
+                digest = write_hashed(tmp_path, lambda stream: pdf.save(stream, linearize=True))
+            tool = 'pikepdf'
+        elif shutil.which('qpdf'):
+            proc = subprocess.run(['qpdf', '--linearize', path, tmp_path], capture_output=True, text=True)
+            # Exit code 3 means success with warnings
+            if proc.returncode not in (0, 3):
+                raise RuntimeError((proc.stderr or proc.stdout or '').strip() or f'qpdf failed with return code {proc.returncode}')
+            digest = None
+            tool = 'qpdf'
+        else:
+            return {'error': 'Neither pikepdf nor qpdf is available'}
+
+        # Replaced after the source is closed (Windows cannot replace open files)
+        os.replace(tmp_path, path)
+        return {
+            'bytes_before': bytes_before,
+            'bytes_after': os.path.getsize(path),
+            'sha256': digest['sha256'] if digest else None,
+            'tool': tool,
+        }
+    except Exception as e:
+        return {'error': str(e)}
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def postprocess_output(path: str, optimize: bool = True, object_streams: bool = True, linearize: bool = False) -> Dict:
+    """
+    Post-split passes for one output, each with its duration_ms; importable by pool workers (no ORM).
+
+    Returns:
+        {'optimize': {...} or None, 'linearize': {...} or None,
+         'digest': {'sha256', 'size_bytes'} of the final file when a pass rewrote it (else None)}
+    """
+    import time
+
+    result = {'optimize': None, 'linearize': None, 'digest': None}
+    if optimize:
+        t0 = time.time()
+        result['optimize'] = optimize_pdf_file(path, object_streams=object_streams)
+        result['optimize']['duration_ms'] = int((time.time() - t0) * 1000)
+        if result['optimize'].get('sha256'):
+            result['digest'] = {'sha256': result['optimize']['sha256'], 'size_bytes': result['optimize']['bytes_after']}
+    if linearize:
+        t0 = time.time()
+        result['linearize'] = linearize_pdf_file(path)
+        result['linearize']['duration_ms'] = int((time.time() - t0) * 1000)
+        if 'error' not in result['linearize']:
+            # qpdf does not hash while writing; the caller reads the file back then
+            sha256 = result['linearize'].get('sha256')
+            result['digest'] = {'sha256': sha256, 'size_bytes': result['linearize']['bytes_after']} if sha256 else None
+    return result
+
+
+def optimize_enabled() -> bool:
+    from django.conf import settings
+
+    return bool(getattr(settings, 'SPLIT_OPTIMIZE_OUTPUTS', True))
+
+
+def linearize_enabled() -> bool:
+    """Per folder structure config; read once per job, never from pool workers."""
+    try:
+        from pdfs.models import FolderStructureConfig
+
+        config = FolderStructureConfig.get_active_config()
+        return bool(config and config.linearize_split_outputs)
+    except Exception as e:
+        print(f"[pdf_optimize] could not read linearize setting: {e}")
+        return False
+
+
+def object_streams_enabled() -> bool:
+    from django.conf import settings
+
+    return bool(getattr(settings, 'SPLIT_OBJECT_STREAMS', True))
+
+
+def sum_bytes_saved(results) -> Optional[int]:
+    saved = [int(r.get('bytes_saved') or 0) for r in results if r and 'bytes_saved' in r]
+    return sum(saved) if saved else None
+
+
+def sum_duration_ms(results) -> Optional[int]:
+    durations = [int(r.get('duration_ms') or 0) for r in results if r and 'duration_ms' in r]
+    return sum(durations) if durations else None
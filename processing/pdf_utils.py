@@ -2,28 +2,176 @@
 Utility functions for PDF processing
 """
 import hashlib
+import mmap
+import os
 import re
 from pathlib import Path
-from PyPDF2 import PdfReader, PdfWriter
-from typing import Tuple, List, Dict
-import pytesseract
-from PIL import Image
+from django.core.files import File
+from PyPDF2 import PdfReader
+from typing import Tuple, List, Dict, Optional
 import io
 
 
+HASH_BUFFER_SIZE = 1024 * 1024
+
+
 def compute_sha256(file_path: str) -> str:
     """Compute SHA-256 hash of a file"""
     sha256_hash = hashlib.sha256()
     with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
+        for byte_block in iter(lambda: f.read(HASH_BUFFER_SIZE), b""):
             sha256_hash.update(byte_block)
     return sha256_hash.hexdigest()
 
 
+class HashingWriter:
+    """
+    Write-only binary stream that computes SHA-256 and size of everything written,
+    so outputs never have to be read back just to be hashed.
+    Works as the target of PyPDF2 PdfWriter.write() and pikepdf Pdf.save().
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._hash.update(data)
+        self.size += memoryview(data).nbytes
+        return self._raw.write(data)
+
+    def tell(self) -> int:
+        return self._raw.tell()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # Writers only probe the position; moving backwards would invalidate the hash
+        position = self._raw.tell()
+        if (whence == 0 and offset == position) or (whence in (1, 2) and offset == 0):
+            return position
+        raise io.UnsupportedOperation('HashingWriter only supports sequential writes')
+
+    def flush(self) -> None:
+        self._raw.flush()
+
+    def writable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return False
+
+    def seekable(self) -> bool:
+        return False
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def digest(self) -> Dict:
+        return {'sha256': self.sha256, 'size_bytes': self.size}
+
+
+def write_hashed(output_path: str, write_fn) -> Dict:
+    """
+    Let write_fn(stream) write output_path through a HashingWriter and return its digest.
+
+    The file is written next to the target and moved into place, so an existing file
+    (which may be hard-linked from the split cache) is replaced, never truncated.
+    """
+    tmp_path = f'{output_path}.part'
+    try:
+        with open(tmp_path, 'wb') as f:
+            writer = HashingWriter(f)
+            write_fn(writer)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return writer.digest()
+
+
+class HashingFile(File):
+    """Django File whose chunks() hash the content as storage backends write it."""
+
+    def __init__(self, file, name=None):
+        super().__init__(file, name)
+        self._hash = hashlib.sha256()
+        self.bytes_hashed = 0
+
+    def chunks(self, chunk_size=None):
+        for chunk in super().chunks(chunk_size or HASH_BUFFER_SIZE):
+            self._hash.update(chunk)
+            self.bytes_hashed += len(chunk)
+            yield chunk
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+
+class MappedPDF:
+    """
+    Read-only mmap of a PDF, usable as a file-like stream (read/seek/tell).
+
+    Workers reading the same input share the OS page cache instead of each holding
+    their own copy (PyPDF2 reads the whole file into memory when given a path).
+    """
+
+    def __init__(self, file_path: str):
+        self._file = open(file_path, 'rb')
+        try:
+            self.stream = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty files cannot be mapped; let the PDF reader report the real error
+            self.stream = self._file
+
+    def close(self) -> None:
+        if self.stream is not self._file:
+            self.stream.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def open_pdf_reader(file_path: str) -> Tuple[PdfReader, MappedPDF]:
+    """PyPDF2 reader over a mmap of the file. Close the returned MappedPDF when done."""
+    mapped = MappedPDF(file_path)
+    try:
+        return PdfReader(mapped.stream), mapped
+    except Exception:
+        mapped.close()
+        raise
+
+
 def get_pdf_page_count(file_path: str) -> int:
-    """Get total number of pages in a PDF"""
-    reader = PdfReader(file_path)
-    return len(reader.pages)
+    """
+    Get total number of pages in a PDF.
+
+    Reads only the trailer, xref and /Root /Pages /Count; the page tree is not built.
+    """
+    try:
+        import pikepdf
+    except ImportError:
+        pikepdf = None
+
+    if pikepdf is not None:
+        try:
+            with pikepdf.open(file_path, access_mode=pikepdf.AccessMode.mmap) as pdf:
+                count = pdf.Root.Pages.get('/Count')
+                if isinstance(count, int) and count > 0:
+                    return int(count)
+                return len(pdf.pages)
+        except Exception:
+            pass
+
+    reader, mapped = open_pdf_reader(file_path)
+    with mapped:
+        return len(reader.pages)
 
 
 def extract_text_from_page(pdf_path: str, page_num: int) -> str:
@@ -173,7 +321,7 @@ def detect_section_boundaries(pdf_path: str) -> List[Dict]:
     return sections
 
 
-def split_pdf(input_path: str, output_path: str, start_page: int, end_page: int) -> Tuple[str, str]:
+def split_pdf(input_path: str, output_path: str, start_page: int, end_page: int, backend: Optional[str] = None) -> Tuple[str, str]:
     """
     Split PDF and save to output path
     Args:
@@ -181,44 +329,19 @@ def split_pdf(input_path: str, output_path: str, start_page: int, end_page: int)
         output_path: Path to save split PDF
         start_page: Starting page (1-indexed)
         end_page: Ending page (1-indexed, inclusive)
+        backend: Split backend name (see split_backends); None = configured default
     Returns:
         Tuple of (output_path, sha256_hash)
     """
-    reader = PdfReader(input_path)
-    writer = PdfWriter()
-    
-    # Convert to 0-indexed and add pages
-    for page_num in range(start_page - 1, end_page):
-        if page_num < len(reader.pages):
-            writer.add_page(reader.pages[page_num])
-    
-    # Ensure output directory exists
-    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    
-    # Write PDF
-    with open(output_path, 'wb') as output_file:
-        writer.write(output_file)
-    
-    # Compute hash
-    sha256 = compute_sha256(output_path)
-    
-    return output_path, sha256
-
+    return merge_pdf_segments(input_path, output_path, [(start_page, end_page)], backend=backend)
 
-def merge_pdf_segments(input_path: str, output_path: str, segments: List[Tuple[int, int]]) -> Tuple[str, str]:
-    reader = PdfReader(input_path)
-    writer = PdfWriter()
 
-    for start_page, end_page in segments:
-        for page_num in range(start_page - 1, end_page):
-            if page_num < len(reader.pages):
-                writer.add_page(reader.pages[page_num])
+def merge_pdf_segments(input_path: str, output_path: str, segments: List[Tuple[int, int]], backend: Optional[str] = None) -> Tuple[str, str]:
+    from .split_backends import get_split_backend
 
-    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, 'wb') as output_file:
-        writer.write(output_file)
+    digest = get_split_backend(backend).extract(input_path, output_path, segments)
 
-    sha256 = compute_sha256(output_path)
+    sha256 = digest['sha256'] if digest else compute_sha256(output_path)
     return output_path, sha256
 
 
@@ -0,0 +1,204 @@
+"""
+Preflight -> split -> upload -> link as one pipeline.
+
+STAGES declares the stages in order: the job queue kind each one runs as, the
+ProcessingStep its task records, and how its task arguments are built from the
+pipeline spec. Stages share the job_id, so artifacts pass through the files each
+stage already leaves under MEDIA_ROOT (preflight request/state, split manifest,
+upload manifest); nothing large travels in task messages.
+
+A stage is not over when its first task returns: split ends in finalize_split_job
+after the last chunk, upload in finalize_upload_job after the last file. finish_run()
+(and preflight on success) call stage_finished(), which records the transition and
+submits the next stage right away, so no browser poll sits between stages. A stage
+that still holds its job slot (preflight keeps the run RUNNING) hands it to the
+next stage; otherwise the next stage goes through the fair-share queue.
+
+The spec, the current stage and every transition are kept on the run's PIPELINE
+ProcessingStep (extra), which is what start(from_stage=...) resumes from.
+"""
+from typing import Dict, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import job_queue
+
+
+STAGES = [
+    {
+        'name': 'PREFLIGHT',
+        'kind': 'PREFLIGHT',
+        'step': 'PREFLIGHT',
+        'args': lambda job_id, spec: [job_id, spec['input_pdf_path'], spec['page_ranges'], spec.get('input_sha256') or ''],
+    },
+    {
+        'name': 'SPLIT',
+        'kind': 'SPLIT',
+        'step': 'SPLIT',
+        'args': lambda job_id, spec: [job_id],
+    },
+    {
+        'name': 'UPLOAD',
+        'kind': 'UPLOAD',
+        'step': 'UPLOAD',
+        'args': lambda job_id, spec: [job_id, spec.get('patient_name') or '', int(spec.get('batch_size') or 25)],
+    },
+    {
+        # Link the Word documents against the folder and files UPLOAD recorded in its
+        # manifest (upload_job_id), without resolving or listing the folder again
+        'name': 'LINK',
+        'kind': 'BATCH',
+        'step': 'WORD_PROCESS',
+        'args': lambda job_id, spec: [
+            job_id,
+            spec['document_ids'],
+            {str(d): spec['patient_name'] for d in spec['document_ids']} if spec.get('patient_name') else {},
+            job_id,
+        ],
+    },
+]
+_BY_NAME = {stage['name']: stage for stage in STAGES}
+_BY_STEP = {stage['step']: stage for stage in STAGES}
+
+
+def stage_names(spec: Dict) -> List[str]:
+    """Stages this spec runs (LINK only with Word documents to link)."""
+    return [s['name'] for s in STAGES if s['name'] != 'LINK' or spec.get('document_ids')]
+
+
+def _transition(stage: str, status: str) -> Dict:
+    return {'stage': stage, 'status': status, 'at': timezone.now().isoformat()}
+
+
+def _submit(stage_name: str, run, spec: Dict, holds_slot: bool) -> Dict:
+    stage = _BY_NAME[stage_name]
+    return job_queue.submit(
+        stage['kind'],
+        run.job_id,
+        stage['args'](run.job_id, spec),
+        user=run.user,
+        cost=int(spec.get('cost') or 1),
+        holds_slot=holds_slot,
+    )
+
+
+def latest(run):
+    from pdfs.models import ProcessingStep
+
+    return ProcessingStep.objects.filter(run=run, step='PIPELINE').order_by('-started_at').first()
+
+
+def start(job_id: str, spec: Dict, user=None, from_stage: Optional[str] = None) -> Dict:
+    """
+    Start (or resume) the pipeline of job_id. Without a spec the one of the job's
+    last pipeline is reused; without from_stage a resume starts at the first stage
+    that did not succeed.
+
+    Returns the job queue result of the first stage plus {'pipeline': summary}.
+    """
+    from pdfs.analytics_utils import finish_step, start_step
+    from pdfs.models import ProcessingRun
+
+    if user is not None and not getattr(user, 'is_authenticated', False):
+        user = None
+    # Created before the first stage is submitted so its PIPELINE step exists when
+    # that stage finishes; not via get_or_create_run, which would take a job slot
+    # (lease) before the queue admits the stage.
+    run, _ = ProcessingRun.objects.get_or_create(
+        job_id=job_id,
+        run_mode='ASYNC',
+        defaults={'user': user, 'patient_name': (spec or {}).get('patient_name') or ''},
+    )
+    previous = latest(run)
+    if previous is not None:
+        spec = spec or (previous.extra or {}).get('spec') or {}
+        if previous.status == 'RUNNING':
+            finish_step(previous, status='SKIPPED', error_message='Superseded by a resumed pipeline')
+    if not spec:
+        raise ValueError('No pipeline to resume for this job')
+
+    names = stage_names(spec)
+    if from_stage is None:
+        succeeded = {t['stage'] for t in ((previous.extra or {}).get('transitions') or []) if t['status'] == 'SUCCESS'} if previous else set()
+        from_stage = next((n for n in names if n not in succeeded), names[-1])
+    if from_stage not in names:
+        raise ValueError(f"Unknown pipeline stage '{from_stage}' (stages: {', '.join(names)})")
+
+    step = start_step(run, 'PIPELINE', extra={
+        'spec': spec,
+        'stages': names,
+        'current': from_stage,
+        'transitions': [_transition(from_stage, 'SUBMITTED')],
+    })
+    result = _submit(from_stage, run, spec, holds_slot=False)
+    return dict(result, pipeline=summary(step))
+
+
+def stage_finished(run, step_name: str, status: str) -> None:
+    """
+    Record that the stage recording ProcessingStep `step_name` finished and, on
+    SUCCESS, submit the next stage. Anything else stops the pipeline (resume it
+    with start(from_stage=...)).
+    """
+    from pdfs.analytics_utils import finish_step
+    from pdfs.models import ProcessingStep
+
+    stage = _BY_STEP.get(step_name)
+    if stage is None:
+        return
+
+    with transaction.atomic():
+        step = (
+            ProcessingStep.objects.select_for_update()
+            .filter(run=run, step='PIPELINE', status='RUNNING')
+            .order_by('-started_at')
+            .first()
+        )
+        # Not a pipeline job, or this stage already reported (e.g. a duplicate finalize)
+        if step is None or (step.extra or {}).get('current') != stage['name']:
+            return
+
+        extra = dict(step.extra)
+        names = extra['stages']
+        transitions = list(extra.get('transitions') or [])
+        transitions.append(_transition(stage['name'], status))
+        position = names.index(stage['name'])
+        next_stage = names[position + 1] if status == 'SUCCESS' and position + 1 < len(names) else None
+
+        if next_stage:
+            transitions.append(_transition(next_stage, 'SUBMITTED'))
+            step.extra = dict(extra, current=next_stage, transitions=transitions)
+            step.save(update_fields=['extra'])
+        else:
+            finish_step(
+                step,
+                status=status,
+                count_total=len(names),
+                count_done=position + 1 if status == 'SUCCESS' else position,
+                error_message='' if status == 'SUCCESS' else f"Pipeline stopped at {stage['name']} ({status})",
+                extra={'current': None, 'transitions': transitions},
+            )
+
+    if next_stage:
+        try:
+            # Preflight leaves the run RUNNING: the next stage inherits its slot
+            run.refresh_from_db(fields=['status'])
+            _submit(next_stage, run, extra['spec'], holds_slot=run.status == 'RUNNING')
+        except Exception as e:
+            print(f"[pipeline] could not submit {next_stage} for {run.job_id}: {e}")
+            step.refresh_from_db()
+            finish_step(step, status='FAILED', error_message=f'Could not start {next_stage}: {e}')
+
+
+def summary(step) -> Optional[Dict]:
+    if step is None:
+        return None
+    extra = step.extra or {}
+    return {
+        'status': step.status,
+        'stages': extra.get('stages') or [],
+        'current': extra.get('current'),
+        'transitions': extra.get('transitions') or [],
+        'error': step.error_message or None,
+    }
@@ -0,0 +1,40 @@
+"""
+Shared Redis connections for coordination state (rate limits, job leases).
+
+One client per URL and process, short socket timeouts. While a URL is
+unreachable callers get None for 30 seconds and use their local fallback
+instead of paying a connect timeout on every call.
+"""
+import time
+from typing import Dict
+
+
+RETRY_AFTER_S = 30
+
+_clients: Dict[str, Dict] = {}
+
+
+def get_redis(url: str):
+    """redis.Redis for url, or None while it is unreachable."""
+    if not url:
+        return None
+    entry = _clients.get(url)
+    if entry and (entry['client'] is not None or time.time() < entry['retry_at']):
+        return entry['client']
+
+    client = None
+    try:
+        import redis
+
+        client = redis.Redis.from_url(url, socket_connect_timeout=1, socket_timeout=1)
+        client.ping()
+    except Exception as e:
+        print(f"[redis] {url} unavailable: {e}")
+        client = None
+    _clients[url] = {'client': client, 'retry_at': time.time() + RETRY_AFTER_S}
+    return client
+
+
+def mark_unavailable(url: str) -> None:
+    """A call on url failed: use the fallback for a while instead of retrying every call."""
+    _clients[url] = {'client': None, 'retry_at': time.time() + RETRY_AFTER_S}
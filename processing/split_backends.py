@@ -0,0 +1,730 @@
+"""
+Pluggable PDF split backends.
+
+Every split entry point (views, unified flow, Celery chunk tasks, process_pdf_set)
+goes through this module instead of talking to qpdf/pikepdf/PyPDF2 directly.
+
+A backend opens the input once per session and extracts any number of outputs
+from it; segments are 1-based inclusive (start, end) tuples as produced by
+split_spec.parse_split_groups.
+
+    backend = get_split_backend('pikepdf')
+    with backend.open(input_pdf) as session:
+        session.extract(output_pdf, [(1, 2), (5, 5)])
+
+calibrate_split_backend() times the available backends on a sample of the real
+request so preflight can pick the fastest one for this particular input.
+
+Split worker processes keep recently used inputs open between chunk tasks
+(extract_many(job_id=...), see InputHandleCache), so the chunks of one job that
+land on the same process parse the input once.
+"""
+import functools
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+Segments = List[Tuple[int, int]]
+
+# Preference order when nothing else decides
+DEFAULT_BACKEND_ORDER = ('qpdf', 'pikepdf', 'pypdf2')
+
+
+class SplitSession:
+    """An opened input PDF. Use as a context manager."""
+
+    def __init__(self, input_pdf: str):
+        self.input_pdf = input_pdf
+
+    def extract(self, output_pdf: str, segments: Segments) -> Optional[Dict]:
+        """Write one output. Returns {'sha256', 'size_bytes'} when hashed during the write, else None."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class SplitBackend:
+    name = ''
+    # True when each extract() re-reads the input (no per-session open cost to amortize)
+    opens_per_output = False
+    # True when extract_many() writes several outputs per input parse on its own
+    batches_outputs = False
+
+    def is_available(self) -> bool:
+        return True
+
+    def version(self) -> str:
+        """Library/tool version; part of split cache keys so upgrades never reuse old outputs."""
+        return ''
+
+    def open(self, input_pdf: str) -> SplitSession:
+        raise NotImplementedError
+
+    def extract(self, input_pdf: str, output_pdf: str, segments: Segments) -> Optional[Dict]:
+        with self.open(input_pdf) as session:
+            return session.extract(output_pdf, segments)
+
+    def extract_many(
+        self,
+        input_pdf: str,
+        jobs: List[Tuple[str, Segments]],
+        on_result: Optional[Callable[[int, Optional[str], int, Optional[Dict]], None]] = None,
+        job_id: str = '',
+    ) -> List[Optional[str]]:
+        """
+        Extract several outputs from one input.
+
+        Args:
+            jobs: (output_pdf, segments) pairs
+            on_result: optional callback(job_index, error_or_None, duration_ms, digest_or_None) per output
+            job_id: borrow the input from this process's handle cache (and return it
+                there afterwards) instead of opening and closing it
+
+        Returns:
+            Error message (or None on success) per job, in order
+        """
+        errors: List[Optional[str]] = [None] * len(jobs)
+        try:
+            session = input_handles.checkout(self, input_pdf, job_id) if job_id else self.open(input_pdf)
+        except Exception as e:
+            for i in range(len(jobs)):
+                errors[i] = f"Could not open input PDF: {e}"
+                if on_result is not None:
+                    on_result(i, errors[i], 0, None)
+            return errors
+
+        try:
+            for i, (output_pdf, segments) in enumerate(jobs):
+                t0 = time.perf_counter()
+                digest = None
+                try:
+                    digest = session.extract(output_pdf, segments)
+                except Exception as e:
+                    errors[i] = str(e)
+                if on_result is not None:
+                    on_result(i, errors[i], int((time.perf_counter() - t0) * 1000), digest)
+        finally:
+            if job_id:
+                input_handles.checkin(session, job_id)
+            else:
+                session.close()
+        return errors
+
+
+class InputHandleCache:
+    """
+    Per-process LRU of opened inputs (SplitSessions), keyed by job, backend and
+    input file (path, mtime, size: a replaced file is never served from an old handle).
+
+    A session is checked out for the duration of one extract_many() and checked back
+    in afterwards, so two threads never share one (pikepdf objects are not thread-safe).
+    Beyond SPLIT_INPUT_HANDLES the least recently used handle is closed, as is any
+    handle idle for SPLIT_INPUT_HANDLE_IDLE_S.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: 'OrderedDict[tuple, Tuple[SplitSession, float]]' = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'open_ms': 0}
+
+    @staticmethod
+    def _limits() -> Tuple[int, float]:
+        try:
+            from django.conf import settings
+
+            return (
+                int(getattr(settings, 'SPLIT_INPUT_HANDLES', 4) or 0),
+                float(getattr(settings, 'SPLIT_INPUT_HANDLE_IDLE_S', 300) or 300),
+            )
+        except Exception:
+            return 4, 300.0
+
+    @staticmethod
+    def _key(backend: SplitBackend, input_pdf: str, job_id: str) -> tuple:
+        st = os.stat(input_pdf)
+        return (job_id, backend.name, os.path.abspath(input_pdf), st.st_mtime_ns, st.st_size)
+
+    def checkout(self, backend: SplitBackend, input_pdf: str, job_id: str) -> SplitSession:
+        key = self._key(backend, input_pdf, job_id)
+        _, idle_s = self._limits()
+        now = time.monotonic()
+        with self._lock:
+            # Idle handles, and older handles of this input (the file changed since)
+            expired = [
+                k for k, (_, used_at) in self._sessions.items()
+                if now - used_at > idle_s or (k[:3] == key[:3] and k != key)
+            ]
+            stale = [self._sessions.pop(k)[0] for k in expired]
+            cached = self._sessions.pop(key, None)
+            self.stats['hits' if cached else 'misses'] += 1
+            self.stats['evictions'] += len(stale)
+        self._close(stale)
+        if cached is not None:
+            return cached[0]
+
+        t0 = time.perf_counter()
+        session = backend.open(input_pdf)
+        session.cache_key = key
+        with self._lock:
+            self.stats['open_ms'] += int((time.perf_counter() - t0) * 1000)
+        return session
+
+    def checkin(self, session: SplitSession, job_id: str) -> None:
+        max_handles, _ = self._limits()
+        key = getattr(session, 'cache_key', None)
+        if max_handles <= 0 or key is None or key[0] != job_id:
+            session.close()
+            return
+        with self._lock:
+            previous = self._sessions.pop(key, None)
+            self._sessions[key] = (session, time.monotonic())
+            evicted = [previous[0]] if previous else []
+            while len(self._sessions) > max_handles:
+                evicted.append(self._sessions.popitem(last=False)[1][0])
+            self.stats['evictions'] += len(evicted)
+        self._close(evicted)
+
+    def close(self, job_id: Optional[str] = None) -> int:
+        """Close the cached handles of job_id (all when None). Returns how many were closed."""
+        with self._lock:
+            keys = [k for k in self._sessions if job_id is None or k[0] == job_id]
+            sessions = [self._sessions.pop(k)[0] for k in keys]
+        self._close(sessions)
+        return len(sessions)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @staticmethod
+    def _close(sessions: List[SplitSession]) -> None:
+        for session in sessions:
+            try:
+                session.close()
+            except Exception as e:
+                logger.warning("could not close cached input %s: %s", session.input_pdf, e)
+
+
+input_handles = InputHandleCache()
+
+
+def _page_args(segments: Segments) -> List[str]:
+    return [str(start) if start == end else f"{start}-{end}" for start, end in segments]
+
+
+class _QpdfSession(SplitSession):
+    def extract(self, output_pdf: str, segments: Segments) -> Optional[Dict]:
+        # qpdf uses 1-based page numbers; our segments are already 1-based.
+        # qpdf writes the file itself, so there is no digest to return. Written beside
+        # the target and moved into place so a hard-linked (cached) file is never truncated.
+        Path(output_pdf).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f'{output_pdf}.part'
+        try:
+            # One range argument: qpdf reads any further argument after --pages as a file name
+            _run_qpdf([self.input_pdf, '--pages', '.', ','.join(_page_args(segments)), '--', tmp_path])
+            os.replace(tmp_path, output_pdf)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _run_qpdf(args: List[str]) -> None:
+    proc = subprocess.run(['qpdf', *args], capture_output=True, text=True)
+    # Exit code 3 means success with warnings
+    if proc.returncode not in (0, 3):
+        err = (proc.stderr or proc.stdout or '').strip()
+        raise RuntimeError(err or f"qpdf failed with return code {proc.returncode}")
+
+
+@functools.lru_cache(maxsize=1)
+def _qpdf_version() -> str:
+    try:
+        proc = subprocess.run(['qpdf', '--version'], capture_output=True, text=True)
+        return (proc.stdout or '').strip().splitlines()[0]
+    except Exception:
+        return ''
+
+
+def _split_file_first_page(name: str) -> int:
+    """First page of a --split-pages output file ('out-07-09.pdf' -> 7)."""
+    match = re.search(r'-(\d+)(?:-\d+)?\.pdf$', name)
+    if match is None:
+        raise RuntimeError(f"Unexpected qpdf split output: {name}")
+    return int(match.group(1))
+
+
+def _move_into_place(src: str, output_pdf: str) -> None:
+    # Renamed over the target, never written into it: a hard-linked (cached) file is never truncated
+    try:
+        os.replace(src, output_pdf)
+    except OSError:
+        tmp_path = f'{output_pdf}.part'
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, output_pdf)
+
+
+class QpdfBackend(SplitBackend):
+    """
+    qpdf CLI in a subprocess; no Python-side parsing at all.
+
+    extract() runs qpdf once per output (`qpdf in.pdf --pages . 1-2,5 -- out.pdf`).
+    extract_many() batches: see there.
+    """
+
+    name = 'qpdf'
+    opens_per_output = True
+    batches_outputs = True
+
+    def is_available(self) -> bool:
+        return shutil.which('qpdf') is not None
+
+    def version(self) -> str:
+        # Marks the per-output layout: cached outputs of the earlier page-merge mode are not reused
+        return f"{_qpdf_version()} per-output"
+
+    def open(self, input_pdf: str) -> SplitSession:
+        return _QpdfSession(input_pdf)
+
+    def extract_many(
+        self,
+        input_pdf: str,
+        jobs: List[Tuple[str, Segments]],
+        on_result: Optional[Callable[[int, Optional[str], int, Optional[Dict]], None]] = None,
+        job_id: str = '',
+    ) -> List[Optional[str]]:
+        """
+        Batch mode: the outputs with the same page count are written by one qpdf run.
+        Their pages are selected back to back and cut into one file per output with
+        --split-pages=<page count>, so the input is parsed once per distinct output
+        length instead of once per output. Each file holds exactly one output's pages,
+        so fonts and images shared by those pages are still written once per output.
+
+        A failed batch run falls back to one qpdf call per output of that run.
+        qpdf keeps nothing open, so job_id is unused.
+        """
+        errors: List[Optional[str]] = [None] * len(jobs)
+        by_length: Dict[int, List[int]] = {}
+        for i, (_, segments) in enumerate(jobs):
+            by_length.setdefault(sum(end - start + 1 for start, end in segments), []).append(i)
+
+        session = _QpdfSession(input_pdf)
+        for pages, indexes in by_length.items():
+            if len(indexes) > 1 and pages > 0:
+                t0 = time.perf_counter()
+                try:
+                    batch_errors = _qpdf_split_batch(input_pdf, [jobs[i] for i in indexes], pages)
+                except Exception as e:
+                    logger.warning("qpdf batch of %d outputs failed, falling back to per-output calls: %s", len(indexes), e)
+                else:
+                    ms_each = int((time.perf_counter() - t0) * 1000 / len(indexes))
+                    for i, error in zip(indexes, batch_errors):
+                        errors[i] = error
+                        if on_result is not None:
+                            on_result(i, error, ms_each, None)
+                    continue
+
+            for i in indexes:
+                output_pdf, segments = jobs[i]
+                t0 = time.perf_counter()
+                try:
+                    session.extract(output_pdf, segments)
+                except Exception as e:
+                    errors[i] = str(e)
+                if on_result is not None:
+                    on_result(i, errors[i], int((time.perf_counter() - t0) * 1000), None)
+        return errors
+
+
+def _qpdf_split_batch(input_pdf: str, jobs: List[Tuple[str, Segments]], pages: int) -> List[Optional[str]]:
+    """
+    One qpdf run for outputs of `pages` pages each. Raises when the run itself fails;
+    returns the error (or None) per output for moving the files into place.
+    """
+    out_dir = Path(jobs[0][0]).parent
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # Beside the outputs, so the files are renamed into place rather than copied
+    with tempfile.TemporaryDirectory(prefix='qpdf_batch_', dir=str(out_dir)) as tmp_dir:
+        ranges = ','.join(_page_args([segment for _, segments in jobs for segment in segments]))
+        # Arguments go through an @file: thousands of page ranges overflow command lines on Windows
+        args_path = os.path.join(tmp_dir, 'args.txt')
+        with open(args_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join([
+                input_pdf, '--pages', '.', ranges, '--',
+                f'--split-pages={pages}', os.path.join(tmp_dir, 'out.pdf'),
+            ]))
+        _run_qpdf([f'@{args_path}'])
+
+        written = sorted(
+            (name for name in os.listdir(tmp_dir) if name.startswith('out-')),
+            key=_split_file_first_page,
+        )
+        if len(written) != len(jobs):
+            raise RuntimeError(f"qpdf wrote {len(written)} files, expected {len(jobs)}")
+
+        errors: List[Optional[str]] = []
+        for (output_pdf, _), name in zip(jobs, written):
+            try:
+                Path(output_pdf).parent.mkdir(parents=True, exist_ok=True)
+                _move_into_place(os.path.join(tmp_dir, name), output_pdf)
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e))
+        return errors
+
+
+class _PikepdfSession(SplitSession):
+    def __init__(self, input_pdf: str):
+        import pikepdf
+
+        super().__init__(input_pdf)
+        self._pikepdf = pikepdf
+        # mmap: concurrent chunk workers on one input share the OS page cache
+        self._src = pikepdf.open(input_pdf, access_mode=pikepdf.AccessMode.mmap)
+
+    def extract(self, output_pdf: str, segments: Segments) -> Optional[Dict]:
+        from .pdf_utils import write_hashed
+
+        total_pages = len(self._src.pages)
+        dst = self._pikepdf.new()
+        try:
+            for start, end in segments:
+                dst.pages.extend(self._src.pages[start - 1:min(end, total_pages)])
+            Path(output_pdf).parent.mkdir(parents=True, exist_ok=True)
+            return write_hashed(output_pdf, dst.save)
+        finally:
+            dst.close()
+
+    def close(self) -> None:
+        self._src.close()
+
+
+class PikepdfBackend(SplitBackend):
+    """pikepdf (libqpdf) in-process; the input is parsed once per session."""
+
+    name = 'pikepdf'
+
+    def is_available(self) -> bool:
+        try:
+            import pikepdf  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def version(self) -> str:
+        import pikepdf
+
+        return f"pikepdf {pikepdf.__version__} libqpdf {pikepdf.__libqpdf_version__}"
+
+    def open(self, input_pdf: str) -> SplitSession:
+        return _PikepdfSession(input_pdf)
+
+
+class _PyPDF2Session(SplitSession):
+    def __init__(self, input_pdf: str):
+        from .pdf_utils import open_pdf_reader
+
+        super().__init__(input_pdf)
+        self._reader, self._mapped = open_pdf_reader(input_pdf)
+
+    def extract(self, output_pdf: str, segments: Segments) -> Optional[Dict]:
+        from PyPDF2 import PdfWriter
+        from .pdf_utils import write_hashed
+
+        writer = PdfWriter()
+        total_pages = len(self._reader.pages)
+        for start_page, end_page in segments:
+            for page_num in range(start_page - 1, end_page):
+                if page_num < total_pages:
+                    writer.add_page(self._reader.pages[page_num])
+
+        Path(output_pdf).parent.mkdir(parents=True, exist_ok=True)
+        return write_hashed(output_pdf, writer.write)
+
+    def close(self) -> None:
+        self._mapped.close()
+
+
+class PyPDF2Backend(SplitBackend):
+    """Pure-Python fallback; always available."""
+
+    name = 'pypdf2'
+
+    def version(self) -> str:
+        import PyPDF2
+
+        return f"PyPDF2 {PyPDF2.__version__}"
+
+    def open(self, input_pdf: str) -> SplitSession:
+        return _PyPDF2Session(input_pdf)
+
+
+SPLIT_BACKENDS: Dict[str, SplitBackend] = {
+    backend.name: backend
+    for backend in (QpdfBackend(), PikepdfBackend(), PyPDF2Backend())
+}
+
+
+def available_backends() -> List[str]:
+    return [name for name in DEFAULT_BACKEND_ORDER if SPLIT_BACKENDS[name].is_available()]
+
+
+def _configured_backend_name() -> str:
+    try:
+        from django.conf import settings
+
+        return (getattr(settings, 'SPLIT_BACKEND', 'auto') or 'auto').strip().lower()
+    except Exception:
+        return 'auto'
+
+
+def get_split_backend(name: Optional[str] = None) -> SplitBackend:
+    """
+    Resolve a backend by name, falling back to the first available one.
+
+    name=None uses settings.SPLIT_BACKEND ('auto' = preference order).
+    """
+    name = (name or _configured_backend_name() or 'auto').strip().lower()
+    backend = SPLIT_BACKENDS.get(name)
+    if backend is not None and backend.is_available():
+        return backend
+    for fallback in available_backends():
+        return SPLIT_BACKENDS[fallback]
+    return SPLIT_BACKENDS['pypdf2']
+
+
+def preload_backends() -> Dict[str, int]:
+    """
+    Import the libraries of every available backend (and the output writers they
+    share) now, so the first split task of a worker process does not pay for it.
+    Returns the milliseconds spent per backend ('writers': the shared modules).
+    """
+    t0 = time.perf_counter()
+    from . import pdf_optimize, pdf_utils  # noqa: F401
+
+    timings = {'writers': int((time.perf_counter() - t0) * 1000)}
+    for name in available_backends():
+        t0 = time.perf_counter()
+        try:
+            SPLIT_BACKENDS[name].version()
+            if name == 'pypdf2':
+                from PyPDF2 import PdfWriter  # noqa: F401
+        except Exception as e:
+            logger.warning("could not preload backend %s: %s", name, e)
+        timings[name] = int((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+def _calibration_sample(groups: List[Dict], samples: int) -> List[Segments]:
+    if not groups:
+        return []
+    if len(groups) <= samples:
+        picked = groups
+    else:
+        # Spread over the request: first, last and evenly in between
+        step = (len(groups) - 1) / float(samples - 1) if samples > 1 else 0
+        picked = [groups[int(round(i * step))] for i in range(samples)]
+    return [grp['segments'] for grp in picked]
+
+
+def _batch_runs(groups: List[Dict], chunk_size: int) -> int:
+    """qpdf runs of a batching backend: one per distinct output length in each chunk."""
+    size = max(1, int(chunk_size or 1))
+    runs = 0
+    for start in range(0, len(groups), size):
+        runs += len({
+            sum(end - first + 1 for first, end in grp['segments'])
+            for grp in groups[start:start + size]
+        })
+    return max(1, runs)
+
+
+def calibrate_split_backend(
+    input_pdf: str,
+    groups: List[Dict],
+    chunk_size: int = 10,
+    samples: int = 3,
+) -> Dict:
+    """
+    Time each available backend on a sample of the requested outputs and pick the
+    one with the lowest estimated total cost for the whole request.
+
+    In-process backends pay the open (parse) cost once per chunk task; a qpdf call
+    parses the input on every run, and its batch mode makes one run per distinct
+    output length in a chunk, which the estimate accounts for.
+
+    Returns:
+        {
+            'backend': 'pikepdf',
+            'forced': False,
+            'estimates_ms': {'pikepdf': 812.0, 'pypdf2': 5230.5},
+            'timings': {'pikepdf': {'open_ms': .., 'per_output_ms': ..}, ...},
+            'input': {'size_bytes': .., 'page_count': .., 'object_count': ..},
+            'errors': {'qpdf': '...'},
+        }
+    """
+    configured = _configured_backend_name()
+    result = {
+        'backend': None,
+        'forced': False,
+        'estimates_ms': {},
+        'timings': {},
+        'input': {'size_bytes': os.path.getsize(input_pdf)},
+        'errors': {},
+    }
+
+    try:
+        import pikepdf
+
+        with pikepdf.open(input_pdf, access_mode=pikepdf.AccessMode.mmap) as pdf:
+            result['input']['page_count'] = int(pdf.Root.Pages.Count)
+            result['input']['object_count'] = len(pdf.objects)
+    except Exception:
+        pass
+
+    if configured != 'auto' and configured in SPLIT_BACKENDS and SPLIT_BACKENDS[configured].is_available():
+        result.update({'backend': configured, 'forced': True})
+        return result
+
+    candidates = available_backends()
+    sample = _calibration_sample(groups, max(1, int(samples or 1)))
+    if len(candidates) <= 1 or not sample:
+        result['backend'] = get_split_backend().name
+        return result
+
+    outputs = max(1, len(groups))
+    chunks = max(1, -(-outputs // max(1, int(chunk_size or 1))))
+
+    with tempfile.TemporaryDirectory(prefix='split_calibration_') as tmp_dir:
+        for name in candidates:
+            backend = SPLIT_BACKENDS[name]
+            try:
+                t0 = time.perf_counter()
+                with backend.open(input_pdf) as session:
+                    t1 = time.perf_counter()
+                    for i, segments in enumerate(sample):
+                        session.extract(os.path.join(tmp_dir, f'{name}_{i}.pdf'), segments)
+                    t2 = time.perf_counter()
+            except Exception as e:
+                result['errors'][name] = str(e)
+                continue
+
+            open_ms = (t1 - t0) * 1000.0
+            per_output_ms = (t2 - t1) * 1000.0 / len(sample)
+            opens = 0 if backend.opens_per_output else chunks
+            calls = _batch_runs(groups, chunk_size) if backend.batches_outputs else outputs
+            result['timings'][name] = {'open_ms': round(open_ms, 1), 'per_output_ms': round(per_output_ms, 1)}
+            result['estimates_ms'][name] = round(open_ms * opens + per_output_ms * calls, 1)
+
+    if result['estimates_ms']:
+        result['backend'] = min(result['estimates_ms'], key=result['estimates_ms'].get)
+    else:
+        result['backend'] = get_split_backend('pypdf2').name
+    return result
+
+
+# Per-process state of extract_parallel() pool workers
+_worker_session: Optional[SplitSession] = None
+_worker_post_process: Optional[Callable[[str], Dict]] = None
+
+
+def _init_parallel_worker(backend_name: str, input_pdf: str, post_process: Optional[Callable[[str], Dict]]) -> None:
+    global _worker_session, _worker_post_process
+    _worker_session = get_split_backend(backend_name).open(input_pdf)
+    _worker_post_process = post_process
+
+
+def _extract_in_worker(output_pdf: str, segments: Segments) -> Tuple[Optional[str], int, Optional[Dict], Optional[Dict]]:
+    t0 = time.perf_counter()
+    try:
+        digest = _worker_session.extract(output_pdf, segments)
+        post = _worker_post_process(output_pdf) if _worker_post_process is not None else None
+        return None, int((time.perf_counter() - t0) * 1000), digest, post
+    except Exception as e:
+        return str(e), int((time.perf_counter() - t0) * 1000), None, None
+
+
+def extract_parallel(
+    backend: SplitBackend,
+    input_pdf: str,
+    jobs: List[Tuple[str, Segments]],
+    procs: int,
+    on_result: Optional[Callable[[int, Optional[str], int, Optional[Dict], Optional[Dict]], None]] = None,
+    post_process: Optional[Callable[[str], Dict]] = None,
+) -> List[Optional[str]]:
+    """
+    extract_many() across a small process pool.
+
+    Every process opens the input once (pikepdf/PyPDF2 map it, so the pages are
+    shared through the OS page cache) and pulls the next output from the pool's
+    queue as soon as it is free, so one expensive output does not hold up the rest.
+    post_process(output_pdf) (e.g. the optimize pass; must be picklable) runs in the
+    same worker and its result is passed to on_result(i, error, duration_ms, digest, post).
+
+    Must not be called from a daemonic process (Celery prefork children).
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    errors: List[Optional[str]] = [None] * len(jobs)
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(int(procs or 1), len(jobs) or 1)),
+        initializer=_init_parallel_worker,
+        initargs=(backend.name, input_pdf, post_process),
+    ) as pool:
+        futures = {pool.submit(_extract_in_worker, output_pdf, segments): i for i, (output_pdf, segments) in enumerate(jobs)}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            try:
+                error, duration_ms, digest, post = fut.result()
+            except Exception as e:
+                error, duration_ms, digest, post = str(e) or type(e).__name__, 0, None, None
+            errors[i] = error
+            if on_result is not None:
+                on_result(i, error, duration_ms, digest, post)
+    return errors
+
+
+def page_offsets(input_pdf: str) -> Optional[List[float]]:
+    """
+    Byte offset of every page object in the input (index = page - 1), from the xref table.
+
+    Pages stored inside an object stream use the offset of that stream. Used to extract
+    outputs in file order; None when pikepdf is unavailable or the xref cannot be read.
+    """
+    try:
+        import pikepdf
+    except ImportError:
+        return None
+
+    try:
+        with pikepdf.open(input_pdf, access_mode=pikepdf.AccessMode.mmap) as pdf:
+            xref = pdf.get_xref_table()
+            offsets = []
+            for page in pdf.pages:
+                entry = xref.get(page.objgen)
+                if entry is not None and entry.type == 2:
+                    stream = xref.get((entry.obj_stream_number, 0))
+                    offsets.append((stream.offset if stream is not None else 0) + entry.obj_stream_index * 1e-6)
+                else:
+                    offsets.append(float(entry.offset) if entry is not None else 0.0)
+            return offsets
+    except Exception as e:
+        logger.warning("could not read page offsets: %s", e)
+        return None
@@ -0,0 +1,151 @@
+"""
+Split output cache shared across jobs.
+
+Staff often re-run the same PDF with the same (or overlapping) range lists. An
+output is fully determined by the input bytes, its segments, the backend build
+and the post-pass settings, so finished outputs are stored once under
+
+    MEDIA_ROOT/processing/split_cache/<key[:2]>/<key>.pdf   (+ <key>.json with its digest)
+
+and later jobs hard-link them into their own folder instead of splitting again
+(copy when linking is not possible). Split outputs are always replaced with a new
+file, never rewritten in place, so a link never changes a cached blob.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Bump when the output layout changes so old entries are ignored
+CACHE_FORMAT = 1
+
+
+def cache_enabled() -> bool:
+    from django.conf import settings
+
+    return bool(getattr(settings, 'SPLIT_CACHE_ENABLED', True))
+
+
+def _cache_root() -> Path:
+    from django.conf import settings
+
+    return Path(settings.MEDIA_ROOT) / 'processing' / 'split_cache'
+
+
+def cache_key(
+    input_sha256: str,
+    segments: List[Tuple[int, int]],
+    backend,
+    optimize: bool,
+    object_streams: bool,
+    linearize: bool = False,
+) -> str:
+    import hashlib
+
+    parts = [
+        f'v{CACHE_FORMAT}',
+        input_sha256,
+        ','.join(f'{start}-{end}' for start, end in segments),
+        backend.name,
+        backend.version(),
+        f'opt={int(bool(optimize))}:objstm={int(bool(object_streams))}:lin={int(bool(linearize))}',
+    ]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _paths(key: str) -> Tuple[Path, Path]:
+    directory = _cache_root() / key[:2]
+    return directory / f'{key}.pdf', directory / f'{key}.json'
+
+
+def lookup(key: str) -> Optional[Dict]:
+    """Cached entry {'path', 'sha256', 'size_bytes'} or None (missing or damaged)."""
+    blob_path, meta_path = _paths(key)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if os.path.getsize(blob_path) != meta.get('size_bytes'):
+            return None
+    except (OSError, ValueError):
+        return None
+    return {'path': str(blob_path), 'sha256': meta.get('sha256'), 'size_bytes': meta.get('size_bytes')}
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """Hard-link src to dst (copy across filesystems), replacing dst rather than writing into it."""
+    tmp_path = f'{dst}.link'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+def materialize(entry: Dict, output_path: str) -> bool:
+    """Place a cached output at output_path. False when the entry vanished meanwhile."""
+    try:
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        link_or_copy(entry['path'], output_path)
+        # Keeps recently used entries out of prune_split_cache()
+        os.utime(entry['path'])
+        return True
+    except OSError as e:
+        logger.warning("could not use cached output: %s", e)
+        return False
+
+
+def store(key: str, output_path: str, digest: Optional[Dict] = None) -> None:
+    """Add a finished output to the cache. Failures are logged and ignored."""
+    blob_path, meta_path = _paths(key)
+    try:
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        if digest is None:
+            from .pdf_utils import compute_sha256
+
+            digest = {'sha256': compute_sha256(output_path), 'size_bytes': os.path.getsize(output_path)}
+        link_or_copy(output_path, str(blob_path))
+
+        tmp_meta = f'{meta_path}.tmp'
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump({'sha256': digest['sha256'], 'size_bytes': digest['size_bytes'], 'stored_at': time.time()}, f)
+        os.replace(tmp_meta, meta_path)
+    except OSError as e:
+        logger.warning("could not store output: %s", e)
+
+
+def prune_split_cache(max_age_days: Optional[int] = None) -> Dict:
+    """Remove entries not used for max_age_days (settings.SPLIT_CACHE_MAX_AGE_DAYS by default)."""
+    from django.conf import settings
+
+    if max_age_days is None:
+        max_age_days = int(getattr(settings, 'SPLIT_CACHE_MAX_AGE_DAYS', 14) or 14)
+    cutoff = time.time() - max_age_days * 24 * 3600
+
+    removed = 0
+    bytes_freed = 0
+    root = _cache_root()
+    if not root.exists():
+        return {'removed': 0, 'bytes_freed': 0}
+
+    for blob_path in root.glob('*/*.pdf'):
+        try:
+            st = blob_path.stat()
+            if st.st_mtime >= cutoff:
+                continue
+            blob_path.with_suffix('.json').unlink(missing_ok=True)
+            blob_path.unlink()
+            removed += 1
+            # Space is only freed once no job folder links the same file any more
+            if st.st_nlink <= 1:
+                bytes_freed += st.st_size
+        except OSError:
+            continue
+    return {'removed': removed, 'bytes_freed': bytes_freed}
@@ -0,0 +1,219 @@
+"""
+Cost-balanced chunking for the split fan-out.
+
+A fixed number of outputs per chunk ignores how much work each output is: one
+chunk of 25 thousand-page groups can take 50x longer than its neighbours. Here
+every output gets an estimated cost from its page count and the bytes its pages
+occupy in the input (from xref offsets), and outputs are packed into chunks with
+longest-processing-time-first so every chunk carries about the same work. The
+chunk count follows the number of live `split` worker slots.
+
+The model is linear:
+
+    chunk_ms = per_chunk_ms + per_output_ms * outputs + per_page_ms * pages + per_mb_ms * mb
+
+Chunk tasks report their real duration with these features; finalize_split_job
+stores them on the SPLIT ProcessingStep and load_cost_model() refits the
+coefficients from recent history.
+"""
+import bisect
+import heapq
+import time
+from typing import Dict, List, Optional
+
+
+DEFAULT_COST_MODEL = {
+    'per_chunk_ms': 300.0,
+    'per_output_ms': 15.0,
+    'per_page_ms': 2.0,
+    'per_mb_ms': 40.0,
+}
+_FEATURES = ('per_chunk_ms', 'per_output_ms', 'per_page_ms', 'per_mb_ms')
+
+# Fewer chunk samples than this only rescale the default model
+MIN_FIT_SAMPLES = 12
+HISTORY_STEPS = 50
+
+_model_cache: Dict = {}
+_slots_cache: Dict = {}
+
+
+def page_sizes(page_offsets: Optional[List[float]], file_size: int) -> Optional[List[float]]:
+    """Approximate bytes per page: distance from each page object to the next object offset."""
+    if not page_offsets:
+        return None
+    ordered = sorted(page_offsets)
+    sizes = []
+    for offset in page_offsets:
+        i = bisect.bisect_right(ordered, offset)
+        end = ordered[i] if i < len(ordered) else file_size
+        sizes.append(max(0.0, end - offset))
+    return sizes
+
+
+def output_features(segments, sizes_prefix: Optional[List[float]]) -> Dict:
+    """{'pages': n, 'mb': x} for one output; sizes_prefix[i] = bytes of pages 1..i."""
+    pages = sum(end - start + 1 for start, end in segments)
+    mb = 0.0
+    if sizes_prefix:
+        last = len(sizes_prefix) - 1
+        for start, end in segments:
+            mb += sizes_prefix[min(end, last)] - sizes_prefix[min(start - 1, last)]
+        mb /= 1024 * 1024
+    return {'pages': pages, 'mb': round(mb, 3)}
+
+
+def prefix_sums(sizes: Optional[List[float]]) -> Optional[List[float]]:
+    if not sizes:
+        return None
+    prefix = [0.0]
+    for size in sizes:
+        prefix.append(prefix[-1] + size)
+    return prefix
+
+
+def estimate_output_ms(features: Dict, model: Dict) -> float:
+    return model['per_output_ms'] + model['per_page_ms'] * features['pages'] + model['per_mb_ms'] * features['mb']
+
+
+def _solve(matrix: List[List[float]], vector: List[float]) -> Optional[List[float]]:
+    """Gaussian elimination with partial pivoting; None when singular."""
+    n = len(vector)
+    a = [row[:] + [vector[i]] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        if abs(a[pivot][col]) < 1e-9:
+            return None
+        a[col], a[pivot] = a[pivot], a[col]
+        for r in range(n):
+            if r != col:
+                factor = a[r][col] / a[col][col]
+                for c in range(col, n + 1):
+                    a[r][c] -= factor * a[col][c]
+    return [a[i][n] / a[i][i] for i in range(n)]
+
+
+def fit_cost_model(samples: List[Dict]) -> Dict:
+    """
+    Least-squares fit of the chunk model to measured chunks.
+
+    samples: [{'outputs': n, 'pages': n, 'mb': x, 'duration_ms': n}, ...]
+    Falls back to the default model rescaled to the measurements when there are too few
+    samples or the fit is not physically meaningful (negative coefficients).
+    """
+    samples = [s for s in samples if s.get('outputs') and s.get('duration_ms') is not None]
+    if not samples:
+        return dict(DEFAULT_COST_MODEL, source='default', samples=0)
+
+    rows = [[1.0, float(s['outputs']), float(s['pages']), float(s.get('mb') or 0.0)] for s in samples]
+    ys = [float(s['duration_ms']) for s in samples]
+
+    if len(samples) >= MIN_FIT_SAMPLES:
+        ata = [[sum(r[i] * r[j] for r in rows) for j in range(4)] for i in range(4)]
+        aty = [sum(r[i] * y for r, y in zip(rows, ys)) for i in range(4)]
+        coeffs = _solve(ata, aty)
+        if coeffs and all(c >= 0 for c in coeffs):
+            model = {name: round(c, 4) for name, c in zip(_FEATURES, coeffs)}
+            return dict(model, source='fit', samples=len(samples))
+
+    predicted = sum(sum(DEFAULT_COST_MODEL[name] * x for name, x in zip(_FEATURES, r)) for r in rows)
+    scale = sum(ys) / predicted if predicted > 0 else 1.0
+    model = {name: round(DEFAULT_COST_MODEL[name] * scale, 4) for name in _FEATURES}
+    return dict(model, source='scaled', samples=len(samples))
+
+
+def load_cost_model(max_age_seconds: int = 600) -> Dict:
+    """Cost model refitted from recent SPLIT steps (cached per process)."""
+    cached = _model_cache.get('model')
+    if cached and time.time() - _model_cache.get('at', 0) < max_age_seconds:
+        return cached
+
+    samples = []
+    try:
+        from pdfs.models import ProcessingStep
+
+        steps = (
+            ProcessingStep.objects
+            .filter(step='SPLIT', status__in=['SUCCESS', 'PARTIAL_SUCCESS'])
+            .order_by('-started_at')
+            .values_list('extra', flat=True)[:HISTORY_STEPS]
+        )
+        for extra in steps:
+            samples.extend((extra or {}).get('chunks') or [])
+    except Exception as e:
+        print(f"[split_chunking] could not load chunk history: {e}")
+
+    model = fit_cost_model(samples)
+    _model_cache.update({'model': model, 'at': time.time()})
+    return model
+
+
+def split_worker_slots() -> int:
+    """Concurrent task slots of live workers consuming the 'split' queue (cached for a minute)."""
+    from django.conf import settings
+
+    if time.time() - _slots_cache.get('at', 0) < 60 and _slots_cache.get('slots'):
+        return _slots_cache['slots']
+
+    fallback = int(getattr(settings, 'SPLIT_WORKER_SLOTS_FALLBACK', 2) or 2)
+    slots = 0
+    try:
+        from pdf_automation.celery import app
+
+        inspect = app.control.inspect(timeout=float(getattr(settings, 'SPLIT_INSPECT_TIMEOUT', 1.0) or 1.0))
+        queues = inspect.active_queues() or {}
+        stats = inspect.stats() or {}
+        for worker, worker_queues in queues.items():
+            if not any(q.get('name') == 'split' for q in worker_queues or []):
+                continue
+            pool = (stats.get(worker) or {}).get('pool') or {}
+            slots += int(pool.get('max-concurrency') or 1)
+    except Exception as e:
+        print(f"[split_chunking] worker inspect failed: {e}")
+
+    slots = slots or fallback
+    _slots_cache.update({'slots': slots, 'at': time.time()})
+    return slots
+
+
+def plan_chunks(outputs: List[Dict], model: Dict, slots: int) -> List[List[Dict]]:
+    """
+    Pack outputs (each with 'estimate': {'pages', 'mb'}) into cost-balanced chunks.
+
+    Chunk count: a few chunks per worker slot so a slow chunk can be absorbed, but
+    never so many that the per-chunk overhead dominates. Outputs keep their incoming
+    (input locality) order inside each chunk.
+    """
+    from django.conf import settings
+
+    if not outputs:
+        return []
+
+    costs = [estimate_output_ms(out['estimate'], model) for out in outputs]
+    total = sum(costs)
+    per_slot = int(getattr(settings, 'SPLIT_CHUNKS_PER_SLOT', 2) or 2)
+    # Below this a chunk is mostly task overhead
+    min_chunk_ms = max(1.0, model['per_chunk_ms'] * 4)
+
+    n_chunks = max(1, slots * per_slot)
+    n_chunks = min(n_chunks, max(1, int(total // min_chunk_ms)), len(outputs))
+
+    # Longest processing time first onto the least loaded chunk
+    heap = [(0.0, i) for i in range(n_chunks)]
+    members: List[List[int]] = [[] for _ in range(n_chunks)]
+    for pos in sorted(range(len(outputs)), key=lambda p: costs[p], reverse=True):
+        load, i = heapq.heappop(heap)
+        members[i].append(pos)
+        heapq.heappush(heap, (load + costs[pos], i))
+
+    return [[outputs[pos] for pos in sorted(chunk)] for chunk in members if chunk]
+
+
+def chunk_sample(outputs: List[Dict], duration_ms: int) -> Dict:
+    """Measured chunk in the shape fit_cost_model() expects."""
+    return {
+        'outputs': len(outputs),
+        'pages': sum(out['estimate']['pages'] for out in outputs),
+        'mb': round(sum(out['estimate']['mb'] for out in outputs), 3),
+        'duration_ms': duration_ms,
+    }
@@ -1,5 +1,5 @@
 import re
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 
 
 def normalize_split_spec(s: str) -> str:
@@ -50,3 +50,115 @@ def parse_split_groups(ranges_text: str) -> List[Dict[str, object]]:
         groups.append({'label': label, 'segments': segments})
 
     return groups
+
+
+def merge_adjacent_segments(segments: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Join segments that continue each other (1-3, 4-6 -> 1-6). Output page order is unchanged."""
+    merged: List[Tuple[int, int]] = []
+    for start, end in segments:
+        if merged and start == merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _overlapping_groups(groups: List[Dict[str, object]]) -> int:
+    """
+    Number of groups sharing at least one page with another group.
+
+    One sweep over the sorted intervals: a group overlaps another exactly when one of
+    its intervals lies in a connected run of overlapping intervals holding more than one group.
+    """
+    overlapping = set()
+    run_end = 0
+    run_groups = set()
+    for start, end, idx in sorted((start, end, grp['index']) for grp in groups for start, end in grp['segments']):
+        if start > run_end:
+            if len(run_groups) > 1:
+                overlapping |= run_groups
+            run_groups = set()
+        run_groups.add(idx)
+        run_end = max(run_end, end)
+    if len(run_groups) > 1:
+        overlapping |= run_groups
+    return len(overlapping)
+
+
+def _distinct_pages(groups: List[Dict[str, object]]) -> int:
+    total = 0
+    current = None
+    for start, end in sorted(seg for grp in groups for seg in grp['segments']):
+        if current is None or start > current[1] + 1:
+            if current is not None:
+                total += current[1] - current[0] + 1
+            current = [start, end]
+        else:
+            current[1] = max(current[1], end)
+    if current is not None:
+        total += current[1] - current[0] + 1
+    return total
+
+
+def compile_split_plan(groups: List[Dict[str, object]], page_offsets: Optional[List[float]] = None) -> Dict[str, object]:
+    """
+    Plan the extraction for parsed split groups.
+
+    Args:
+        groups: parse_split_groups() result
+        page_offsets: optional byte offset of every page object in the input (index = page - 1),
+            used to read the input front to back; page number order is used without it
+
+    Returns:
+        {
+            'groups': [{'index': 1, 'label': '1-4', 'segments': [(1, 4)], 'pages': 4,
+                        'max_page': 4, 'copy_of': None}, ...],   # request order
+            'order': [3, 1, ...],             # indexes to extract, best input locality first
+            'total_extracted_pages': n,       # pages written across all outputs
+            'distinct_pages': n,              # pages of the input actually read
+            'max_page': n,
+            'duplicate_groups': n,            # groups produced by copying an identical group
+            'overlapping_groups': n,          # groups sharing pages with another group
+        }
+    """
+    planned = []
+    first_by_key: Dict[Tuple[Tuple[int, int], ...], int] = {}
+    for idx, grp in enumerate(groups, 1):
+        segments = merge_adjacent_segments(grp['segments'])
+        key = tuple(segments)
+        copy_of = first_by_key.setdefault(key, idx)
+        planned.append({
+            'index': idx,
+            'label': grp['label'],
+            'segments': segments,
+            'pages': sum(end - start + 1 for start, end in segments),
+            'max_page': max(end for _, end in segments),
+            'copy_of': copy_of if copy_of != idx else None,
+        })
+
+    def _locality_key(grp):
+        first_page = grp['segments'][0][0]
+        if page_offsets and first_page <= len(page_offsets):
+            return (page_offsets[first_page - 1], grp['index'])
+        return (first_page, grp['index'])
+
+    unique = [grp for grp in planned if grp['copy_of'] is None]
+    return {
+        'groups': planned,
+        'order': [grp['index'] for grp in sorted(unique, key=_locality_key)],
+        'total_extracted_pages': sum(grp['pages'] for grp in planned),
+        'distinct_pages': _distinct_pages(unique),
+        'max_page': max((grp['max_page'] for grp in planned), default=0),
+        'duplicate_groups': len(planned) - len(unique),
+        'overlapping_groups': _overlapping_groups(unique),
+    }
+
+
+def first_segment_beyond(plan: Dict[str, object], total_pages: int) -> Optional[Tuple[int, int]]:
+    """First segment (request order) ending after total_pages, or None."""
+    if plan['max_page'] <= total_pages:
+        return None
+    for grp in plan['groups']:
+        if grp['max_page'] > total_pages:
+            return next((start, end) for start, end in grp['segments'] if end > total_pages)
+    return None
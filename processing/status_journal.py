@@ -0,0 +1,132 @@
+"""
+Append-only journal of per-output split statuses.
+
+One output_status/<index>.json per output meant a mkstemp + write + rename for
+every output, and a directory listing plus one open/read per output for every
+status poll and for finalize. Here each status is one JSON line appended to a
+segment of the job's journal:
+
+    <job_dir>/output_status/<pid>-<thread>.jsonl   one segment per writer
+    <job_dir>/output_status/compacted.jsonl        latest record per output
+
+Every writer (chunk task process or thread) appends to its own segment, so lines
+never interleave and no locking is needed (also on Windows, where appends from
+several processes are not atomic). Reading the statuses is a sequential read of
+compacted.jsonl and the few live segments; the latest record per index wins.
+
+compact() folds everything into compacted.jsonl and removes the segments. It
+must only run while no writer is active: finalize (after the last chunk
+reported) and the resume check of split_pdf_job (before the fan-out).
+
+Nothing here touches the ORM, so pool workers can import it.
+"""
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+COMPACTED_NAME = 'compacted.jsonl'
+
+
+class StatusJournal:
+    """Appends status records to this writer's segment of a job journal."""
+
+    def __init__(self, status_dir):
+        self.status_dir = Path(status_dir)
+        self._files: Dict[int, object] = {}
+        self._lock = threading.Lock()
+
+    def _file(self):
+        ident = threading.get_ident()
+        f = self._files.get(ident)
+        if f is None:
+            self.status_dir.mkdir(parents=True, exist_ok=True)
+            f = open(self.status_dir / f'{os.getpid()}-{ident}.jsonl', 'a', encoding='utf-8')
+            with self._lock:
+                self._files[ident] = f
+        return f
+
+    def append(self, record: Dict) -> None:
+        f = self._file()
+        # One write per line; flushed so status polls see it right away
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        f.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            files, self._files = list(self._files.values()), {}
+        for f in files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _segments(status_dir: Path) -> list:
+    return sorted(p for p in status_dir.glob('*.jsonl') if p.name != COMPACTED_NAME)
+
+
+def _read_lines(path: Path, records: Dict[int, Dict]) -> None:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn last line of a crashed (or still writing) writer
+                    continue
+                index = record.get('index')
+                if index is None:
+                    continue
+                prev = records.get(index)
+                if prev is None or (record.get('finished_at') or '') >= (prev.get('finished_at') or ''):
+                    records[index] = record
+    except OSError:
+        pass
+
+
+def read_statuses(status_dir) -> Dict[int, Dict]:
+    """Latest status record per output index."""
+    status_dir = Path(status_dir)
+    records: Dict[int, Dict] = {}
+    if not status_dir.is_dir():
+        return records
+    _read_lines(status_dir / COMPACTED_NAME, records)
+    for segment in _segments(status_dir):
+        _read_lines(segment, records)
+    return records
+
+
+def compact(status_dir, keep: Optional[Callable[[Dict], bool]] = None) -> Dict[int, Dict]:
+    """
+    Rewrite the journal as one record per output (those `keep` accepts) and drop
+    the segments. Only call while no writer is active. Returns the kept records.
+    """
+    status_dir = Path(status_dir)
+    segments = _segments(status_dir) if status_dir.is_dir() else []
+    records = read_statuses(status_dir)
+    if keep is not None:
+        records = {index: record for index, record in records.items() if keep(record)}
+    if not records and not segments and not (status_dir / COMPACTED_NAME).exists():
+        return records
+
+    status_dir.mkdir(parents=True, exist_ok=True)
+    tmp_fd, tmp_path = tempfile.mkstemp(prefix='compacted_', suffix='.tmp', dir=str(status_dir))
+    try:
+        with os.fdopen(tmp_fd, 'w', encoding='utf-8') as f:
+            for index in sorted(records):
+                f.write(json.dumps(records[index], ensure_ascii=False) + '\n')
+        os.replace(tmp_path, str(status_dir / COMPACTED_NAME))
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+    for segment in segments:
+        segment.unlink(missing_ok=True)
+    return records
@@ -1,23 +1,42 @@
 """Celery tasks for async PDF processing"""
-from celery import shared_task, group, chord
+from celery import shared_task, group
 from django.conf import settings
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import os
 import json
-import tempfile
 import shutil
-import subprocess
+import tempfile
+import uuid
 
 from pdfs.models import PDFSet, DriveFolderCache
 from pdfs.analytics_utils import get_or_create_run, start_step, finish_step, finish_run
 from .pdf_utils import split_pdf, create_folder_structure
-from .drive_utils import get_drive_service
-from .pdf_utils import get_pdf_page_count
+from .drive_utils import get_drive_service, pooled_drive_service
+from .drive_rate_limit import deferring, is_rate_limit_error, retry_countdown, throttle_wait_ms
+from .pdf_utils import compute_sha256, get_pdf_page_count
 from .pdf_utils import merge_pdf_segments
-from .split_spec import parse_split_groups
-from pdfs.models import FolderStructureConfig
+from .split_spec import compile_split_plan, first_segment_beyond, parse_split_groups
+from .split_backends import calibrate_split_backend, extract_parallel, get_split_backend, page_offsets
+from . import job_leases, pipeline, split_cache
+from .status_journal import StatusJournal, compact, read_statuses
+from .split_chunking import (
+    chunk_sample, estimate_output_ms, load_cost_model, output_features, page_sizes, plan_chunks, prefix_sums,
+    split_worker_slots,
+)
+from .pdf_optimize import (
+    linearize_enabled,
+    object_streams_enabled,
+    optimize_enabled,
+    postprocess_output,
+    sum_bytes_saved,
+    sum_duration_ms,
+)
+from pdfs.models import FolderStructureConfig, ProcessingHistory, ProcessingRun, ProcessingStep
 from .drive_path_resolver import DrivePathResolver
+from .batch_linker import resolve_patient_folders, fetch_folder_pdf_links, link_documents, process_pool_allowed
 import time
 
 
@@ -51,6 +70,60 @@ def _write_json_atomic(path: Path, payload: dict) -> None:
             pass
 
 
+def _expect_chunks(job_dir: Path, count: int) -> dict:
+    """
+    Start counting the chunk tasks of one fan-out attempt (instead of a chord, which
+    needs every chunk result in the result backend). Returns the completion ticket
+    each chunk task gets, with its own 'chunk' number added.
+    """
+    shutil.rmtree(job_dir / 'chunks', ignore_errors=True)
+    return {'token': uuid.uuid4().hex, 'count': count}
+
+
+def _chunk_weight(stem: str) -> int:
+    _, _, weight = stem.partition('.')
+    return int(weight or 1)
+
+
+def _chunk_finished(job_dir: Path, completion: dict, summary: dict, weight: int = 1) -> bool:
+    """
+    Record one finished chunk, worth `weight` of the count (uploads count files, and
+    a chunk reports all the files it finished at once). True for exactly one caller:
+    the chunk that completes the count.
+    """
+    chunks_dir = job_dir / 'chunks' / completion['token']
+    chunk = completion['chunk']
+    # A string chunk key names itself; the weight is in the name, so counting reads no file
+    key = chunk if isinstance(chunk, str) else f"{int(chunk):06d}"
+    _write_json_atomic(chunks_dir / (f"{key}.json" if weight == 1 else f"{key}.{int(weight)}.json"), summary)
+    # Temp files of concurrent writers carry an underscore
+    finished = sum(_chunk_weight(p.stem) for p in chunks_dir.iterdir() if p.suffix == '.json' and '_' not in p.stem)
+    if finished < int(completion['count']):
+        return False
+    try:
+        # Two chunks can both see the full count; only one creates the marker
+        os.close(os.open(str(chunks_dir / 'complete'), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def _chunk_summaries(job_dir: Path, token: str) -> list:
+    """Summaries the chunk tasks of one attempt reported (what a chord would have passed on)."""
+    chunks_dir = job_dir / 'chunks' / token
+    summaries = []
+    if token and chunks_dir.exists():
+        for p in sorted(chunks_dir.iterdir()):
+            if p.suffix != '.json' or '_' in p.stem:
+                continue
+            try:
+                with open(p, 'r', encoding='utf-8') as f:
+                    summaries.append(json.load(f))
+            except Exception:
+                continue
+    return summaries
+
+
 def _upload_state_paths(job_id: str) -> tuple[Path, Path, Path]:
     upload_dir = Path(settings.MEDIA_ROOT) / 'processing' / 'uploads' / job_id
     files_dir = upload_dir / 'files'
@@ -58,24 +131,11 @@ def _upload_state_paths(job_id: str) -> tuple[Path, Path, Path]:
     return upload_dir, files_dir, state_path
 
 
-def _qpdf_available() -> bool:
-    return shutil.which('qpdf') is not None
-
-
-def _qpdf_extract_segments(input_pdf: str, output_pdf: str, segments: list[tuple[int, int]]) -> None:
-    # qpdf uses 1-based page numbers; our segments are already 1-based.
-    page_args: list[str] = []
-    for start, end in segments:
-        if start == end:
-            page_args.append(str(start))
-        else:
-            page_args.append(f"{start}-{end}")
-
-    cmd = ['qpdf', input_pdf, '--pages', '.', *page_args, '--', output_pdf]
-    proc = subprocess.run(cmd, capture_output=True, text=True)
-    if proc.returncode != 0:
-        err = (proc.stderr or proc.stdout or '').strip()
-        raise RuntimeError(err or f"qpdf failed with return code {proc.returncode}")
+def _batch_state_paths(batch_id: str) -> tuple[Path, Path, Path]:
+    batch_dir = Path(settings.MEDIA_ROOT) / 'processing' / 'batches' / batch_id
+    docs_dir = batch_dir / 'documents'
+    state_path = batch_dir / 'state.json'
+    return batch_dir, docs_dir, state_path
 
 
 def _safe_output_filename(label: str) -> str:
@@ -270,9 +330,11 @@ def process_multiple_pdf_sets(pdfset_ids: list):
 
 
 @shared_task(bind=True, max_retries=0)
-def preflight_split_job(self, job_id: str, input_pdf_path: str, page_ranges_text: str):
+def preflight_split_job(self, job_id: str, input_pdf_path: str, page_ranges_text: str, input_sha256: str = ''):
     """Preflight checks for large PDF split jobs.
 
+    input_sha256 is the digest computed while the upload was written (hashed here otherwise).
+
     Writes job state to: MEDIA_ROOT/processing/preflight/<job_id>/state.json
     """
     job_dir = Path(settings.MEDIA_ROOT) / 'processing' / 'preflight' / job_id
@@ -303,58 +365,89 @@ def preflight_split_job(self, job_id: str, input_pdf_path: str, page_ranges_text
             raise ValueError('Input PDF not found for preflight')
 
         size_bytes = os.path.getsize(input_pdf_path)
-        state.update({'progress': 10, 'file_size_bytes': size_bytes})
+        state.update({
+            'progress': 10,
+            'file_size_bytes': size_bytes,
+            'input_sha256': input_sha256 or compute_sha256(input_pdf_path),
+        })
         _write_job_state(job_dir, state)
 
         if size_bytes > limits['max_bytes']:
             raise ValueError('PDF file is too large. Maximum allowed size is 1GB.')
 
         total_pages = get_pdf_page_count(input_pdf_path)
+        groups = parse_split_groups(page_ranges_text)
         run.page_count_total = total_pages
-        run.outputs_requested = len(parse_split_groups(page_ranges_text))
+        run.outputs_requested = len(groups)
         run.split_chunk_size = int(getattr(settings, 'SPLIT_TASK_CHUNK_SIZE', 10) or 10)
-        run.split_backend = 'qpdf' if _qpdf_available() else 'pypdf2'
-        run.save(update_fields=['page_count_total', 'outputs_requested', 'split_chunk_size', 'split_backend'])
+        run.save(update_fields=['page_count_total', 'outputs_requested', 'split_chunk_size'])
         state.update({'progress': 30, 'page_count': total_pages})
         _write_job_state(job_dir, state)
 
         if total_pages > limits['max_pages']:
             raise ValueError(f"PDF has too many pages ({total_pages}). Maximum allowed is {limits['max_pages']}.")
 
-        groups = parse_split_groups(page_ranges_text)
         state.update({'progress': 60, 'outputs_requested': len(groups)})
         _write_job_state(job_dir, state)
 
         if len(groups) > limits['max_outputs']:
             raise ValueError(f"Too many split outputs requested ({len(groups)}). Maximum allowed is {limits['max_outputs']}.")
 
-        total_extracted_pages = 0
-        for grp in groups:
-            for start, end in grp['segments']:
-                if end > total_pages:
-                    raise ValueError(f"Segment {start}-{end} exceeds total pages ({total_pages})")
-                total_extracted_pages += (end - start + 1)
-                if total_extracted_pages > limits['max_total_extracted_pages']:
-                    raise ValueError(
-                        f"Too many total pages requested across splits. Maximum allowed is {limits['max_total_extracted_pages']}."
-                    )
+        # Per-group totals come from the plan; validation is a few comparisons.
+        plan = compile_split_plan(groups)
+        beyond = first_segment_beyond(plan, total_pages)
+        if beyond:
+            raise ValueError(f"Segment {beyond[0]}-{beyond[1]} exceeds total pages ({total_pages})")
+        total_extracted_pages = plan['total_extracted_pages']
+        if total_extracted_pages > limits['max_total_extracted_pages']:
+            raise ValueError(
+                f"Too many total pages requested across splits. Maximum allowed is {limits['max_total_extracted_pages']}."
+            )
+
+        plan_summary = {
+            'distinct_pages': plan['distinct_pages'],
+            'duplicate_groups': plan['duplicate_groups'],
+            'overlapping_groups': plan['overlapping_groups'],
+        }
+        state.update({'progress': 80, 'total_extracted_pages': total_extracted_pages, 'plan': plan_summary})
+        _write_job_state(job_dir, state)
+
+        # Pick the fastest split backend for this input by timing a sample of the real request.
+        try:
+            calibration = calibrate_split_backend(
+                input_pdf_path,
+                [grp for grp in plan['groups'] if grp['copy_of'] is None],
+                chunk_size=run.split_chunk_size,
+                samples=int(getattr(settings, 'SPLIT_CALIBRATION_SAMPLES', 3) or 3),
+            )
+        except Exception as e:
+            calibration = {'backend': get_split_backend().name, 'errors': {'calibration': str(e)}}
 
         state.update({
             'progress': 100,
             'status': 'SUCCESS',
-            'total_extracted_pages': total_extracted_pages,
+            'split_backend': calibration['backend'],
+            'calibration': calibration,
         })
         _write_job_state(job_dir, state)
         run.total_extracted_pages = total_extracted_pages
-        run.save(update_fields=['total_extracted_pages'])
+        run.split_backend = calibration['backend']
+        run.save(update_fields=['total_extracted_pages', 'split_backend'])
         finish_step(
             step_rec,
             status='SUCCESS',
             count_total=len(groups),
             count_done=len(groups),
             count_failed=0,
-            extra={'total_pages': total_pages, 'file_size_bytes': size_bytes},
+            extra={
+                'total_pages': total_pages,
+                'file_size_bytes': size_bytes,
+                'calibration': calibration,
+                'plan': plan_summary,
+            },
         )
+        # The run stays RUNNING until the split finishes; a pipeline goes on from here
+        pipeline.stage_finished(run, 'PREFLIGHT', 'SUCCESS')
         return state
 
     except Exception as exc:
@@ -374,11 +467,14 @@ def split_pdf_job(self, job_id: str):
     """Orchestrate parallel split of a PDF using an existing preflight job.
 
     This task writes a manifest and fans out one Celery task per output.
-    Per-output status is written to:
-      MEDIA_ROOT/processing/splits/<job_id>/output_status/<index>.json
+    Per-output status is appended to the job's status journal (see status_journal):
+      MEDIA_ROOT/processing/splits/<job_id>/output_status/*.jsonl
 
     Final aggregated status is written to:
       MEDIA_ROOT/processing/splits/<job_id>/state.json
+
+    Resumable: outputs a previous attempt finished (SUCCESS status for the same
+    output key, file hash still matching) are kept and not scheduled again.
     """
     preflight_dir = Path(settings.MEDIA_ROOT) / 'processing' / 'preflight' / job_id
     split_dir = Path(settings.MEDIA_ROOT) / 'processing' / 'splits' / job_id
@@ -402,7 +498,7 @@ def split_pdf_job(self, job_id: str):
             'done': 0,
             'failed': 0,
         },
-        'backend': 'qpdf' if _qpdf_available() else 'pypdf2',
+        'backend': '',
     }
     _write_job_state(split_dir, state)
 
@@ -416,6 +512,10 @@ def split_pdf_job(self, job_id: str):
         if preflight_state.get('status') != 'SUCCESS':
             raise ValueError(f"Preflight not successful: {preflight_state.get('error') or preflight_state.get('status')}")
 
+        # Backend chosen by preflight calibration; re-resolved in case it is unavailable on this worker.
+        backend_name = get_split_backend(preflight_state.get('split_backend') or None).name
+        state['backend'] = backend_name
+
         input_pdf_path = preflight_dir / 'input.pdf'
         if not input_pdf_path.exists():
             fallback_path = (preflight_state.get('input_pdf_path') or '').strip()
@@ -440,56 +540,142 @@ def split_pdf_job(self, job_id: str):
             raise ValueError('Missing page_ranges in request.json')
 
         groups = parse_split_groups(page_ranges_text)
-        total_pages = get_pdf_page_count(str(input_pdf_path))
+        # Reuse the preflight page count unless the input changed since then.
+        total_pages = preflight_state.get('page_count')
+        if not total_pages or preflight_state.get('file_size_bytes') != os.path.getsize(input_pdf_path):
+            total_pages = get_pdf_page_count(str(input_pdf_path))
         run.page_count_total = total_pages
 
+        input_sha256 = preflight_state.get('input_sha256') or ''
+        if not input_sha256 or preflight_state.get('file_size_bytes') != os.path.getsize(input_pdf_path):
+            input_sha256 = compute_sha256(str(input_pdf_path))
+
+        # Identical groups are extracted once and copied in finalize; the rest are
+        # extracted in input file order so each chunk reads the input front to back.
+        offsets = page_offsets(str(input_pdf_path))
+        plan = compile_split_plan(groups, offsets)
+        sizes_prefix = prefix_sums(page_sizes(offsets, os.path.getsize(input_pdf_path)))
+
+        # Per folder structure config; chunk tasks get it as an argument
+        linearize = linearize_enabled()
+        key_args = (get_split_backend(backend_name), optimize_enabled(), object_streams_enabled(), linearize)
+
         outputs = []
-        for idx, grp in enumerate(groups, 1):
+        for grp in plan['groups']:
+            idx = grp['index']
             label = grp['label']
-            segments = grp['segments']
             out_name = _safe_output_filename(label)
             out_path = split_dir / out_name
-            status_path = output_status_dir / f"{idx:06d}.json"
 
             outputs.append({
                 'index': idx,
                 'page_range': label,
                 'filename': out_name,
-                'segments': segments,
-                'status_path': str(status_path),
+                'segments': grp['segments'],
+                'copy_of': grp['copy_of'],
+                'estimate': output_features(grp['segments'], sizes_prefix),
+                # Identifies the exact bytes this output should have (also its split cache key)
+                'output_key': split_cache.cache_key(input_sha256, grp['segments'], *key_args),
                 'output_path': str(out_path),
             })
+        resumed = _drop_stale_statuses(output_status_dir, outputs)
+        to_extract = [outputs[idx - 1] for idx in plan['order'] if idx not in resumed]
 
         # Chunking reduces Celery/Redis overhead when outputs are large (e.g., 200+).
         chunk_size = int(getattr(settings, 'SPLIT_TASK_CHUNK_SIZE', 10) or 10)
         if chunk_size < 1:
             chunk_size = 10
 
+        # Adaptive: chunks of equal estimated work, as many as the live split workers can absorb.
+        if getattr(settings, 'SPLIT_ADAPTIVE_CHUNKS', True):
+            cost_model = load_cost_model()
+            slots = split_worker_slots()
+            chunks = plan_chunks(to_extract, cost_model, slots)
+            chunking = {
+                'mode': 'adaptive',
+                'worker_slots': slots,
+                'model': cost_model,
+                'estimated_ms': [
+                    round(cost_model['per_chunk_ms'] + sum(estimate_output_ms(out['estimate'], cost_model) for out in chunk))
+                    for chunk in chunks
+                ],
+            }
+        else:
+            chunks = [to_extract[start:start + chunk_size] for start in range(0, len(to_extract), chunk_size)]
+            chunking = {'mode': 'fixed'}
+        chunking['chunks'] = len(chunks)
+        if chunks:
+            chunk_size = max(len(chunk) for chunk in chunks)
+
         manifest = {
             'job_id': job_id,
             'created_at': datetime.utcnow().isoformat(),
             'total_pages': total_pages,
             'total_outputs': len(outputs),
-            'backend': 'qpdf' if _qpdf_available() else 'pypdf2',
+            'backend': backend_name,
+            'linearize': linearize,
             'chunk_size': chunk_size,
+            'chunking': chunking,
+            'plan': {
+                'total_extracted_pages': plan['total_extracted_pages'],
+                'distinct_pages': plan['distinct_pages'],
+                'duplicate_groups': plan['duplicate_groups'],
+                'overlapping_groups': plan['overlapping_groups'],
+            },
             'outputs': outputs,
         }
         _write_json_atomic(manifest_path, manifest)
 
         state['counts']['total'] = len(outputs)
+        state['counts']['resumed'] = len(resumed)
         state['total_pages'] = total_pages
         _write_job_state(split_dir, state)
 
-        # Fan out chunk tasks. Each chunk writes per-output status JSON files.
+        # Nothing left from an earlier attempt, or an unchanged re-run whose outputs
+        # are all in the split cache: finish right here instead of scheduling chunk tasks.
+        if not to_extract or _all_cached(to_extract):
+            if to_extract:
+                split_pdf_chunk_job.run(
+                    job_id=job_id,
+                    outputs_chunk=to_extract,
+                    input_pdf=str(input_pdf_path),
+                    total_pages=total_pages,
+                    backend=backend_name,
+                    input_sha256=input_sha256,
+                    linearize=linearize,
+                )
+            run.outputs_requested = len(outputs)
+            run.split_chunk_size = chunk_size
+            run.split_backend = backend_name
+            run.save(update_fields=['page_count_total', 'outputs_requested', 'split_chunk_size', 'split_backend'])
+            finish_step(
+                step_rec,
+                status='SUCCESS',
+                count_total=len(outputs),
+                extra={
+                    'fanout_chunks': 0,
+                    'cache_hits': len(to_extract),
+                    'resumed': len(resumed),
+                    'duplicate_groups': plan['duplicate_groups'],
+                },
+            )
+            return finalize_split_job.run(job_id=job_id)
+
+        # Fan out chunk tasks. Each chunk writes per-output status JSON files; the
+        # last one to finish schedules finalize_split_job.
+        completion = _expect_chunks(split_dir, len(chunks))
         header = []
-        for start in range(0, len(outputs), chunk_size):
-            chunk = outputs[start:start + chunk_size]
+        for chunk_no, chunk in enumerate(chunks, 1):
             header.append(
                 split_pdf_chunk_job.s(
                     job_id=job_id,
                     outputs_chunk=chunk,
                     input_pdf=str(input_pdf_path),
                     total_pages=total_pages,
+                    backend=backend_name,
+                    input_sha256=input_sha256,
+                    linearize=linearize,
+                    completion=dict(completion, chunk=chunk_no),
                 )
             )
 
@@ -499,10 +685,21 @@ def split_pdf_job(self, job_id: str):
         run.save(update_fields=['page_count_total', 'outputs_requested', 'split_chunk_size', 'split_backend'])
 
         # This step measures orchestration (manifest + fanout scheduling). Actual completion is in finalize.
-        finish_step(step_rec, status='SUCCESS', count_total=len(outputs), extra={'fanout_chunks': len(header)})
+        finish_step(
+            step_rec,
+            status='SUCCESS',
+            count_total=len(outputs),
+            extra={
+                'fanout_chunks': len(header),
+                'chunking': {k: v for k, v in chunking.items() if k != 'model'},
+                'resumed': len(resumed),
+                'duplicate_groups': plan['duplicate_groups'],
+            },
+        )
 
-        callback = finalize_split_job.s(job_id=job_id)
-        chord(group(header))(callback)
+        group(header).apply_async()
+        # The chunks may wait in a backlogged queue before the first one heartbeats
+        job_leases.heartbeat(job_id, force=True)
         return state
 
     except Exception as exc:
@@ -513,14 +710,283 @@ def split_pdf_job(self, job_id: str):
         return state
 
 
+def _drop_stale_statuses(output_status_dir: Path, outputs: list) -> set:
+    """
+    Indexes of outputs a previous attempt already produced: SUCCESS status for the
+    same output_key and the file on disk still hashing to the recorded sha256.
+
+    Every other status (failed, stale, or left over from a different range list)
+    is compacted out of the journal so finalize only aggregates this attempt's results.
+    Duplicate outputs are not checked; finalize links them again anyway.
+    """
+    by_index = {out['index']: out for out in outputs}
+    done = set()
+
+    def _keep(prev: dict) -> bool:
+        out = by_index.get(prev.get('index'))
+        if out is None:
+            return False
+        if out.get('copy_of'):
+            return True
+        try:
+            if (
+                prev.get('status') == 'SUCCESS'
+                and prev.get('output_key') == out['output_key']
+                and os.path.getsize(out['output_path']) == prev.get('size_bytes')
+                and compute_sha256(out['output_path']) == prev.get('sha256')
+            ):
+                done.add(out['index'])
+                return True
+        except OSError:
+            pass
+        return False
+
+    compact(output_status_dir, keep=_keep)
+    return done
+
+
+def _all_cached(outputs: list) -> bool:
+    """True when every output is already in the split cache."""
+    if not outputs or not split_cache.cache_enabled():
+        return False
+    return all(split_cache.lookup(out['output_key']) for out in outputs)
+
+
+def _split_worker_procs(split_backend, n_outputs: int) -> int:
+    """
+    Processes one chunk task may use: SPLIT_WORKER_PROCS, but never more than this
+    job's share of the CPUs while other jobs run (bounded by MAX_RUNNING_JOBS_TOTAL).
+    """
+    configured = int(getattr(settings, 'SPLIT_WORKER_PROCS', 1) or 1)
+    min_outputs = int(getattr(settings, 'SPLIT_PARALLEL_MIN_OUTPUTS', 4) or 4)
+    # qpdf batches a chunk into one subprocess run per output length; a pool would split those runs up
+    if configured <= 1 or n_outputs < min_outputs or split_backend.batches_outputs or not process_pool_allowed():
+        return 1
+
+    max_running = int(getattr(settings, 'MAX_RUNNING_JOBS_TOTAL', 4) or 4)
+    leases = job_leases.running_counts()
+    running = leases['total'] if leases is not None else ProcessingRun.objects.filter(status='RUNNING').count()
+    budget = max(1, (os.cpu_count() or 1) // max(1, min(running, max_running)))
+    return max(1, min(configured, budget, n_outputs))
+
+
 @shared_task(bind=True, max_retries=0)
-def finalize_split_job(job_id: str, results: list | None = None):
-    """Aggregate output statuses and write final split state.json."""
+def split_pdf_chunk_job(
+    self,
+    job_id: str,
+    outputs_chunk: list,
+    input_pdf: str,
+    total_pages: int | None = None,
+    backend: str = '',
+    input_sha256: str = '',
+    linearize: bool = False,
+    completion: dict | None = None,
+):
+    """Extract a chunk of outputs in one backend call and write per-output status files.
+
+    Outputs found in the split cache are linked in instead of extracted; new outputs are added to it.
+    With linearize, outputs are rewritten for fast web view after the optimize pass.
+    With a completion ticket, the last chunk of the fan-out schedules finalize_split_job.
+    """
+    status_dir = Path(settings.MEDIA_ROOT) / 'processing' / 'splits' / job_id / 'output_status'
+    with StatusJournal(status_dir) as journal:
+        result = _split_chunk(
+            journal, job_id, outputs_chunk, input_pdf, total_pages, backend, input_sha256, linearize
+        )
+    return _split_chunk_done(job_id, completion, result)
+
+
+def _split_chunk(
+    journal: StatusJournal,
+    job_id: str,
+    outputs_chunk: list,
+    input_pdf: str,
+    total_pages: int | None,
+    backend: str,
+    input_sha256: str,
+    linearize: bool,
+) -> dict:
+    split_backend = get_split_backend(backend or None)
+    counts = {'done': 0, 'failed': 0, 'cache_hits': 0}
+    optimize = optimize_enabled()
+    object_streams = object_streams_enabled()
+    use_cache = bool(input_sha256) and split_cache.cache_enabled()
+
+    def _cache_key(out: dict) -> str:
+        if out.get('output_key'):
+            return out['output_key']
+        return split_cache.cache_key(
+            input_sha256, [tuple(seg) for seg in out['segments']], split_backend, optimize, object_streams, linearize
+        )
+
+    def _write_status(
+        out: dict,
+        error: str | None,
+        duration_ms: int,
+        digest: dict | None = None,
+        cache_hit: bool = False,
+        post: dict | None = None,
+    ) -> None:
+        counts['failed' if error else 'done'] += 1
+        status = {
+            'index': out['index'],
+            'page_range': out['page_range'],
+            'filename': out['filename'],
+            'output_path': out['output_path'],
+            'backend': split_backend.name,
+            'status': 'FAILED' if error else 'SUCCESS',
+            'error': error,
+            'duration_ms': duration_ms,
+            'finished_at': datetime.utcnow().isoformat(),
+        }
+        if out.get('output_key'):
+            status['output_key'] = out['output_key']
+        job_leases.heartbeat(job_id)
+        if cache_hit:
+            counts['cache_hits'] += 1
+            status['cache_hit'] = True
+        elif not error and (optimize or linearize):
+            # Already run in the pool worker when extracting in parallel
+            post = post or postprocess_output(
+                out['output_path'], optimize=optimize, object_streams=object_streams, linearize=linearize
+            )
+            for name in ('optimize', 'linearize'):
+                if post.get(name) is not None:
+                    status[name] = post[name]
+            if post.get('digest'):
+                digest = post['digest']
+            elif post.get('linearize') and 'error' not in post['linearize']:
+                # Rewritten by qpdf, which does not hash while writing
+                digest = None
+        if not error:
+            # Hashed while the backend wrote the file; only qpdf outputs are read back
+            if digest is None:
+                digest = {'sha256': compute_sha256(out['output_path']), 'size_bytes': os.path.getsize(out['output_path'])}
+            status.update(digest)
+            if use_cache and not cache_hit:
+                split_cache.store(_cache_key(out), out['output_path'], digest)
+        journal.append(status)
+
+    pending = []
+    for out in outputs_chunk:
+        bad = [
+            f"Segment {start}-{end} exceeds total pages ({total_pages})"
+            for start, end in out['segments']
+            if total_pages and end > total_pages
+        ]
+        if bad:
+            _write_status(out, bad[0], 0)
+            continue
+
+        if use_cache:
+            t0 = time.time()
+            entry = split_cache.lookup(_cache_key(out))
+            if entry and split_cache.materialize(entry, out['output_path']):
+                digest = {'sha256': entry['sha256'], 'size_bytes': entry['size_bytes']}
+                _write_status(out, None, int((time.time() - t0) * 1000), digest, cache_hit=True)
+                continue
+        pending.append(out)
+
+    if not pending:
+        return {'job_id': job_id, **counts}
+
+    t0 = time.time()
+    jobs = [(out['output_path'], [tuple(seg) for seg in out['segments']]) for out in pending]
+    procs = _split_worker_procs(split_backend, len(pending))
+    if procs > 1:
+        extract_parallel(
+            split_backend,
+            input_pdf,
+            jobs,
+            procs,
+            on_result=lambda i, error, duration_ms, digest, post: _write_status(
+                pending[i], error, duration_ms, digest, post=post
+            ),
+            post_process=functools.partial(
+                postprocess_output, optimize=optimize, object_streams=object_streams, linearize=linearize
+            ) if (optimize or linearize) else None,
+        )
+    else:
+        split_backend.extract_many(
+            input_pdf,
+            jobs,
+            on_result=lambda i, error, duration_ms, digest: _write_status(pending[i], error, duration_ms, digest),
+            # Later chunks of this job on this worker process reuse the parsed input
+            job_id=job_id,
+        )
+
+    result = {'job_id': job_id, 'procs': procs, **counts}
+    # Measured work for the chunk cost model (only outputs that were actually extracted).
+    # Wall time x processes approximates the work a single process would have needed.
+    if all('estimate' in out for out in pending):
+        result['sample'] = chunk_sample(pending, int((time.time() - t0) * 1000) * procs)
+    return result
+
+
+def _split_chunk_done(job_id: str, completion: dict | None, result: dict) -> dict:
+    if completion:
+        split_dir = Path(settings.MEDIA_ROOT) / 'processing' / 'splits' / job_id
+        if _chunk_finished(split_dir, completion, result):
+            finalize_split_job.apply_async(kwargs={'job_id': job_id, 'completion': completion['token']})
+            job_leases.heartbeat(job_id, force=True)
+    return result
+
+
+def _copy_duplicate_outputs(outputs: list, statuses: dict, journal: StatusJournal) -> None:
+    """Produce outputs the split plan marked as identical to another output by copying it."""
+    by_index = {out['index']: out for out in outputs}
+    for out in outputs:
+        source = by_index.get(out.get('copy_of'))
+        if source is None:
+            continue
+
+        status = {
+            'index': out['index'],
+            'page_range': out['page_range'],
+            'filename': out['filename'],
+            'output_path': out['output_path'],
+            'copied_from': source['index'],
+            'status': 'FAILED',
+            'error': None,
+            'duration_ms': 0,
+        }
+        source_status = statuses.get(source['index']) or {}
+
+        t0 = time.time()
+        if source_status.get('status') != 'SUCCESS':
+            status['error'] = f"Source output {source['filename']} was not produced"
+        else:
+            try:
+                if os.path.abspath(source['output_path']) != os.path.abspath(out['output_path']):
+                    split_cache.link_or_copy(source['output_path'], out['output_path'])
+                status.update({
+                    'status': 'SUCCESS',
+                    'backend': source_status.get('backend'),
+                    'sha256': source_status.get('sha256'),
+                    'size_bytes': source_status.get('size_bytes'),
+                })
+            except Exception as e:
+                status['error'] = str(e)
+        status['duration_ms'] = int((time.time() - t0) * 1000)
+        status['finished_at'] = datetime.utcnow().isoformat()
+        journal.append(status)
+        statuses[out['index']] = status
+
+
+@shared_task(bind=True, max_retries=0)
+def finalize_split_job(self, results: list | None = None, job_id: str = '', completion: str = ''):
+    """Aggregate output statuses and write final split state.json.
+
+    Chunk summaries come from the completion counter (`completion` token); `results`
+    is still accepted from chords queued before the counter existed.
+    """
     split_dir = Path(settings.MEDIA_ROOT) / 'processing' / 'splits' / job_id
+    results = results or _chunk_summaries(split_dir, completion)
     output_status_dir = split_dir / 'output_status'
     manifest_path = split_dir / 'manifest.json'
 
     total = 0
+    manifest = {}
     try:
         if manifest_path.exists():
             with open(manifest_path, 'r', encoding='utf-8') as f:
@@ -529,24 +995,15 @@ def finalize_split_job(job_id: str, results: list | None = None):
     except Exception:
         total = 0
 
-    done = 0
-    failed = 0
-    outputs = []
-
-    # Prefer reading status files (authoritative), not the chord results list.
-    if output_status_dir.exists():
-        status_files = sorted([p for p in output_status_dir.iterdir() if p.is_file() and p.suffix.lower() == '.json'])
-        for p in status_files:
-            try:
-                with open(p, 'r', encoding='utf-8') as f:
-                    it = json.load(f)
-                outputs.append(it)
-                if it.get('status') == 'SUCCESS':
-                    done += 1
-                elif it.get('status') == 'FAILED':
-                    failed += 1
-            except Exception:
-                continue
+    # Prefer the status journal (authoritative), not the chunk summaries. Every chunk
+    # has reported, so no writer is active and the journal can be compacted.
+    statuses = read_statuses(output_status_dir)
+    with StatusJournal(output_status_dir) as journal:
+        _copy_duplicate_outputs(manifest.get('outputs') or [], statuses, journal)
+    outputs = list(compact(output_status_dir).values())
+    outputs.sort(key=lambda it: it['index'])
+    done = sum(1 for it in outputs if it.get('status') == 'SUCCESS')
+    failed = sum(1 for it in outputs if it.get('status') == 'FAILED')
 
     if total == 0:
         total = max(len(outputs), len(results or []))
@@ -568,14 +1025,42 @@ def finalize_split_job(job_id: str, results: list | None = None):
     _write_job_state(split_dir, final_state)
     run = get_or_create_run(job_id=job_id, run_mode='ASYNC')
     status = final_state.get('status') or 'FAILED'
+    extra = {'split_counts': final_state.get('counts') or {}}
+    bytes_saved = sum_bytes_saved([it.get('optimize') for it in outputs])
+    if bytes_saved is not None:
+        extra['split_bytes_saved'] = bytes_saved
+    linearize_ms = sum_duration_ms([it.get('linearize') for it in outputs])
+    if linearize_ms is not None:
+        extra['split_linearize_ms'] = linearize_ms
+    _record_chunk_samples(run, results)
     finish_run(
         run,
         status=status,
-        extra={
-            'split_counts': final_state.get('counts') or {},
-        },
+        extra=extra,
     )
-    return final_state
+    # The per-output list stays in state.json; the task result only carries the summary
+    return {k: v for k, v in final_state.items() if k != 'outputs'}
+
+
+def _record_chunk_samples(run, results: list | None) -> None:
+    """Store measured chunk durations on the SPLIT step; the chunk cost model is refitted from them."""
+    samples = [r['sample'] for r in (results or []) if isinstance(r, dict) and r.get('sample')]
+    if not samples:
+        return
+
+    step = ProcessingStep.objects.filter(run=run, step='SPLIT').order_by('-started_at').first()
+    if step is None:
+        return
+
+    durations = [s['duration_ms'] for s in samples]
+    mean = sum(durations) / len(durations)
+    step.extra = dict(
+        step.extra or {},
+        chunks=samples,
+        chunk_max_ms=max(durations),
+        chunk_imbalance=round(max(durations) / mean, 2) if mean > 0 else None,
+    )
+    step.save(update_fields=['extra'])
 
 
 @shared_task(bind=True, max_retries=3)
@@ -617,7 +1102,9 @@ def upload_split_job(self, job_id: str, patient_name: str, batch_size: int = 25)
 
     relative_path = config.get_path_for_patient(patient_name or '')
     resolver = DrivePathResolver(root_folder_id=config.root_folder_id)
+    waited_before = throttle_wait_ms()
     drive_folder_id = resolver.resolve_path(relative_path, create_if_missing=True)
+    resolve_throttle_ms = throttle_wait_ms() - waited_before
     if not drive_folder_id:
         state = {'job_id': job_id, 'status': 'FAILED', 'progress': 100, 'error': 'Failed to create/find patient folder in Drive'}
         _write_json_atomic(state_path, state)
@@ -659,7 +1146,7 @@ def upload_split_job(self, job_id: str, patient_name: str, batch_size: int = 25)
     _write_json_atomic(state_path, state)
 
     try:
-        header = []
+        pending = []
         for idx, p in enumerate(pdf_files, 1):
             status_file = files_dir / f"{idx:06d}.json"
             if status_file.exists():
@@ -671,97 +1158,263 @@ def upload_split_job(self, job_id: str, patient_name: str, batch_size: int = 25)
                 except Exception:
                     pass
 
-            header.append(
-                upload_split_file_job.s(
-                    job_id=job_id,
-                    index=idx,
-                    local_path=str(p),
-                    filename=p.name,
-                    drive_folder_id=drive_folder_id,
-                )
-            )
+            pending.append({
+                'index': idx,
+                'local_path': str(p),
+                'filename': p.name,
+                'size_bytes': p.stat().st_size,
+            })
 
+        chunks = _plan_upload_chunks(pending, max_files=batch_size)
+        # Counted in files: each chunk reports the files it finished at once, a failed file
+        # reports later from its own retry task. Whoever completes the count schedules
+        # finalize_upload_job, so nothing polls
+        completion = dict(_expect_chunks(upload_dir, len(pending)), patient_name=patient_name)
+        header = [
+            upload_split_chunk_job.s(job_id=job_id, files=chunk, drive_folder_id=drive_folder_id, completion=completion)
+            for chunk in chunks
+        ]
         if header:
-            group(header).apply_async(queue='upload')
+            group(header).apply_async()
+            job_leases.heartbeat(job_id, force=True)
+        else:
+            finalize_upload_job.apply_async(kwargs={'job_id': job_id, 'patient_name': patient_name})
 
-        finalize_upload_job.apply_async(
-            kwargs={'job_id': job_id, 'patient_name': patient_name},
-            countdown=2,
-            queue='upload',
+        finish_step(
+            step_rec,
+            status='SUCCESS',
+            count_total=len(pdf_files),
+            extra={
+                'fanout_files': len(pending),
+                'fanout_chunks': len(chunks),
+                'resolve_throttle_wait_ms': resolve_throttle_ms,
+            },
         )
-
-        finish_step(step_rec, status='SUCCESS', count_total=len(pdf_files), extra={'fanout_files': len(header)})
         return state
 
     except Exception as exc:
         raise self.retry(exc=exc, countdown=60 * (2 ** self.request.retries))
 
 
-@shared_task(bind=True, max_retries=3)
-def upload_split_file_job(
-    self,
-    job_id: str,
+def _plan_upload_chunks(files: list, max_files: int = 25) -> list:
+    """
+    Group pending uploads into chunk tasks: consecutive files until the chunk holds
+    UPLOAD_CHUNK_TARGET_MB or max_files, so many small outputs share a message while
+    a large one gets a task of its own.
+    """
+    target_bytes = int(getattr(settings, 'UPLOAD_CHUNK_TARGET_MB', 64) or 64) * 1024 * 1024
+    max_files = max(1, int(max_files or 1))
+
+    chunks, chunk, chunk_bytes = [], [], 0
+    for item in files:
+        if chunk and (len(chunk) >= max_files or chunk_bytes + item['size_bytes'] > target_bytes):
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+        chunk.append(item)
+        chunk_bytes += item['size_bytes']
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _upload_split_file(
+    drive,
+    files_dir: Path,
     index: int,
     local_path: str,
     filename: str,
     drive_folder_id: str,
-):
-    upload_dir, files_dir, _ = _upload_state_paths(job_id)
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    files_dir.mkdir(parents=True, exist_ok=True)
+    attempt: int = 1,
+    throttle_ms: int = 0,
+) -> tuple[dict, Exception | None]:
+    """
+    One upload attempt. Writes the file's status when it is final (SUCCESS, or FAILED
+    because the local file is gone) and returns (payload, None); on a Drive error
+    nothing is written and (payload without status, error) is returned for the caller
+    to retry or fail.
+    """
     status_path = files_dir / f"{int(index):06d}.json"
+    payload = {
+        'index': index,
+        'filename': filename,
+        'local_path': local_path,
+    }
 
     if not local_path or not os.path.exists(local_path):
-        payload = {
-            'index': index,
-            'filename': filename,
-            'local_path': local_path,
-            'status': 'FAILED',
-            'error': 'Local file not found',
-            'attempts': 0,
-        }
+        payload.update({'status': 'FAILED', 'error': 'Local file not found', 'attempts': 0})
         _write_json_atomic(status_path, payload)
-        return payload
+        return payload, None
 
-    drive = get_drive_service()
+    waited_before = throttle_wait_ms()
+    try:
+        file_id, web_view = drive.upload_file(local_path, drive_folder_id, file_name=filename)
+    except Exception as e:
+        payload.update({'attempts': attempt, 'throttle_wait_ms': throttle_ms + throttle_wait_ms() - waited_before})
+        return payload, e
+
+    payload.update({
+        'status': 'SUCCESS',
+        'error': None,
+        'file_id': file_id,
+        'webViewLink': web_view,
+        'attempts': attempt,
+        'throttle_wait_ms': throttle_ms + throttle_wait_ms() - waited_before,
+        'finished_at': datetime.utcnow().isoformat(),
+    })
+    _write_json_atomic(status_path, payload)
+    return payload, None
+
+
+def _upload_files_done(job_id: str, completion: dict | None, key: str, files: int) -> None:
+    """
+    `files` files have their final status (key: who reports them, once); the report
+    that completes the fan-out's count schedules finalize_upload_job.
+    """
+    if not completion or files <= 0:
+        return
+    upload_dir, _, _ = _upload_state_paths(job_id)
+    if _chunk_finished(upload_dir, dict(completion, chunk=key), {'files': files}, weight=files):
+        finalize_upload_job.apply_async(
+            kwargs={'job_id': job_id, 'patient_name': completion.get('patient_name') or '', 'completion': completion['token']}
+        )
+        job_leases.heartbeat(job_id, force=True)
+
+
+@shared_task(bind=True, max_retries=0)
+def upload_split_chunk_job(self, job_id: str, files: list, drive_folder_id: str, completion: dict | None = None):
+    """
+    Upload several split outputs from one task message, a few at a time, each thread
+    on a pooled Drive client. Files that fail are handed to upload_split_file_job,
+    which owns retries and the final FAILED status.
+    """
+    upload_dir, files_dir, _ = _upload_state_paths(job_id)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    files_dir.mkdir(parents=True, exist_ok=True)
+    job_leases.heartbeat(job_id)
 
-    last_err = None
-    for attempt in range(1, 4):
+    def _upload(item: dict) -> tuple[dict, Exception | None]:
+        # Every file ends up done or handed on, also when no Drive client could be had
+        # (pool exhausted, auth error): otherwise the completion count is never reached
         try:
-            file_id, web_view = drive.upload_file(local_path, drive_folder_id, file_name=filename)
-            payload = {
+            with deferring(), pooled_drive_service() as drive:
+                result = _upload_split_file(
+                    drive, files_dir, item['index'], item['local_path'], item['filename'], drive_folder_id
+                )
+            job_leases.heartbeat(job_id)
+            return result
+        except Exception as e:
+            payload = {'index': item['index'], 'filename': item['filename'], 'local_path': item['local_path']}
+            return dict(payload, attempts=1, throttle_wait_ms=0), e
+
+    threads = max(1, min(len(files), int(getattr(settings, 'UPLOAD_CHUNK_THREADS', 4) or 4)))
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(_upload, files))
+
+    uploaded = 0
+    retried = 0
+    for item, (payload, error) in zip(files, results):
+        if error is None:
+            uploaded += payload.get('status') == 'SUCCESS'
+            continue
+        # A rate-limit wait does not use up an attempt (same rule as the single-file task)
+        deferred = is_rate_limit_error(error)
+        countdown = retry_countdown(error, 1)
+        try:
+            upload_split_file_job.apply_async(
+                kwargs={
+                    'job_id': job_id,
+                    'index': item['index'],
+                    'local_path': item['local_path'],
+                    'filename': item['filename'],
+                    'drive_folder_id': drive_folder_id,
+                    'attempt': 1 if deferred else 2,
+                    'throttle_ms': payload['throttle_wait_ms'] + (int(countdown * 1000) if deferred else 0),
+                    'completion': completion,
+                },
+                countdown=countdown,
+            )
+            retried += 1
+        except Exception as e:
+            payload.update({
+                'status': 'FAILED',
+                'error': f"{error} (retry could not be scheduled: {e})",
+                'finished_at': datetime.utcnow().isoformat(),
+            })
+            _write_json_atomic(files_dir / f"{int(item['index']):06d}.json", payload)
+    # One report for the whole chunk; files handed on report from their own task
+    if files:
+        _upload_files_done(job_id, completion, f"c{int(files[0]['index']):06d}", len(files) - retried)
+    return {'job_id': job_id, 'files': len(files), 'uploaded': uploaded, 'retried': retried}
+
+
+# Failed Drive uploads are retried (as countdowns) this many times in total;
+# waits for a free rate-limit token are not counted, up to UPLOAD_MAX_DEFERRALS.
+UPLOAD_MAX_ATTEMPTS = 3
+UPLOAD_MAX_DEFERRALS = 30
+
+
+@shared_task(bind=True, max_retries=None)
+def upload_split_file_job(
+    self,
+    job_id: str,
+    index: int,
+    local_path: str,
+    filename: str,
+    drive_folder_id: str,
+    attempt: int = 1,
+    throttle_ms: int = 0,
+    completion: dict | None = None,
+):
+    """Upload one split output. Failures and rate-limit waits are rescheduled, never slept on."""
+    upload_dir, files_dir, _ = _upload_state_paths(job_id)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    files_dir.mkdir(parents=True, exist_ok=True)
+    job_leases.heartbeat(job_id)
+    with deferring():
+        payload, error = _upload_split_file(
+            get_drive_service(), files_dir, index, local_path, filename, drive_folder_id, attempt, throttle_ms
+        )
+    if error is None:
+        _upload_files_done(job_id, completion, f"f{int(index):06d}", 1)
+        return {'index': index, 'status': payload['status']}
+    throttle_ms = payload['throttle_wait_ms']
+
+    # Quota exhausted (no token within the allowed wait, or Drive said so): come back
+    # later without using up an attempt
+    deferred = is_rate_limit_error(error)
+    next_attempt = attempt if deferred else attempt + 1
+    if next_attempt <= UPLOAD_MAX_ATTEMPTS and self.request.retries < UPLOAD_MAX_DEFERRALS + UPLOAD_MAX_ATTEMPTS:
+        countdown = retry_countdown(error, attempt)
+        if deferred:
+            throttle_ms += int(countdown * 1000)
+        raise self.retry(
+            countdown=countdown,
+            kwargs={
+                'job_id': job_id,
                 'index': index,
-                'filename': filename,
                 'local_path': local_path,
-                'status': 'SUCCESS',
-                'error': None,
-                'file_id': file_id,
-                'webViewLink': web_view,
-                'attempts': attempt,
-                'finished_at': datetime.utcnow().isoformat(),
-            }
-            _write_json_atomic(status_path, payload)
-            return payload
-        except Exception as e:
-            last_err = str(e)
-            if attempt < 3:
-                time.sleep(min(8, 2 ** attempt))
+                'filename': filename,
+                'drive_folder_id': drive_folder_id,
+                'attempt': next_attempt,
+                'throttle_ms': throttle_ms,
+                'completion': completion,
+            },
+        )
 
-    payload = {
-        'index': index,
-        'filename': filename,
-        'local_path': local_path,
-        'status': 'FAILED',
-        'error': last_err,
-        'attempts': 3,
-        'finished_at': datetime.utcnow().isoformat(),
-    }
-    _write_json_atomic(status_path, payload)
-    return payload
+    payload.update({'status': 'FAILED', 'error': str(error), 'finished_at': datetime.utcnow().isoformat()})
+    _write_json_atomic(files_dir / f"{int(index):06d}.json", payload)
+    _upload_files_done(job_id, completion, f"f{int(index):06d}", 1)
+    return {'index': index, 'status': payload['status']}
 
 
 @shared_task(bind=True, max_retries=0)
-def finalize_upload_job(self, job_id: str, patient_name: str = ''):
+def finalize_upload_job(self, job_id: str, patient_name: str = '', completion: str = ''):
+    """Aggregate the per-file statuses and finish the UPLOAD step and run.
+
+    Scheduled by the chunk or retry task that completes the fan-out's file count (`completion` token).
+    Without a token (messages queued before the counter existed) it polls until
+    every file has a status.
+    """
     upload_dir, files_dir, state_path = _upload_state_paths(job_id)
     upload_dir.mkdir(parents=True, exist_ok=True)
     files_dir.mkdir(parents=True, exist_ok=True)
@@ -780,6 +1433,7 @@ def finalize_upload_job(self, job_id: str, patient_name: str = ''):
 
     done = 0
     failed = 0
+    throttle_ms = 0
     outputs: list[dict] = []
     for file_item in files:
         sp = file_item.get('status_path')
@@ -791,6 +1445,7 @@ def finalize_upload_job(self, job_id: str, patient_name: str = ''):
             with open(sp, 'r', encoding='utf-8') as sf:
                 rec = json.load(sf)
             outputs.append(rec)
+            throttle_ms += int(rec.get('throttle_wait_ms') or 0)
             if rec.get('status') == 'SUCCESS':
                 done += 1
             elif rec.get('status') == 'FAILED':
@@ -799,6 +1454,9 @@ def finalize_upload_job(self, job_id: str, patient_name: str = ''):
             continue
 
     total = len(files)
+    if completion:
+        # Every file reported a final status; one without a status file never will
+        failed = total - done
     progress = int((done + failed) / max(1, total) * 100)
     running = (done + failed) < total
 
@@ -817,13 +1475,404 @@ def finalize_upload_job(self, job_id: str, patient_name: str = ''):
     _write_json_atomic(state_path, state)
 
     if running:
-        finalize_upload_job.apply_async(kwargs={'job_id': job_id, 'patient_name': patient_name}, countdown=2, queue='upload')
+        job_leases.heartbeat(job_id)
+        finalize_upload_job.apply_async(kwargs={'job_id': job_id, 'patient_name': patient_name}, countdown=2)
         return state
 
     run = get_or_create_run(job_id=job_id, run_mode='ASYNC', patient_name=patient_name or '')
     step_qs = run.steps.filter(step='UPLOAD').order_by('-started_at')
     step_rec = step_qs.first()
     if step_rec:
-        finish_step(step_rec, status=state['status'], count_total=total, count_done=done, count_failed=failed)
+        # Time uploads spent waiting for Drive rate-limit tokens (including rescheduled retries)
+        throttle_ms += int((step_rec.extra or {}).get('resolve_throttle_wait_ms') or 0)
+        finish_step(
+            step_rec,
+            status=state['status'],
+            count_total=total,
+            count_done=done,
+            count_failed=failed,
+            extra={'throttle_wait_ms': throttle_ms},
+        )
     finish_run(run, status=state['status'], extra={'upload_counts': state.get('counts') or {}})
     return state
+
+
+def _fail_batch_document(history, entry: dict, user_friendly_error: str, error_message: str = '') -> None:
+    if history is not None:
+        history.status = 'FAILED'
+        history.error_message = error_message
+        history.user_friendly_error = user_friendly_error
+        history.save()
+    entry.update({
+        'status': 'FAILED',
+        'error': user_friendly_error,
+        'details': error_message,
+        'finished_at': datetime.utcnow().isoformat(),
+    })
+    _write_json_atomic(Path(entry['status_path']), entry)
+
+
+def _uploaded_pdf_links(upload_job_id: str) -> dict:
+    """
+    Drive folder and {page_spec: webViewLink} of the outputs an upload job recorded
+    (its manifest and per-file statuses), so linking needs no Drive lookups.
+    """
+    from .word_hyperlink_processor_simple import _is_page_spec, _normalize_page_spec
+
+    upload_dir, _, _ = _upload_state_paths(upload_job_id)
+    with open(upload_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    pdf_links = {}
+    for item in manifest.get('files') or []:
+        try:
+            with open(item['status_path'], 'r', encoding='utf-8') as f:
+                rec = json.load(f)
+        except (OSError, ValueError, KeyError):
+            continue
+        filename = rec.get('filename') or ''
+        if rec.get('status') != 'SUCCESS' or not rec.get('webViewLink') or not filename.lower().endswith('.pdf'):
+            continue
+        key = _normalize_page_spec(filename[:-4])
+        if _is_page_spec(key):
+            pdf_links[key] = rec['webViewLink']
+    return {
+        'folder_id': manifest.get('drive_folder_id'),
+        'patient_name': manifest.get('patient_name') or '',
+        'pdf_links': pdf_links,
+    }
+
+
+@shared_task(bind=True, max_retries=0)
+def batch_process_documents_job(
+    self, batch_id: str, document_ids: list, patient_names: dict | None = None, upload_job_id: str = ''
+):
+    """Link many uploaded Word documents (ProcessingHistory records) in one job.
+
+    Patient folders are resolved once per distinct patient and each Drive folder is
+    listed once, concurrently. With upload_job_id (the pipeline's LINK stage) every
+    document is linked against the folder and files that upload job recorded instead.
+    Linking fans out as a group of chunk tasks that each use a process pool.
+    Per-document status is written to:
+      MEDIA_ROOT/processing/batches/<batch_id>/documents/<index>.json
+    """
+    batch_dir, docs_dir, state_path = _batch_state_paths(batch_id)
+    docs_dir.mkdir(parents=True, exist_ok=True)
+    patient_names = patient_names or {}
+
+    run = get_or_create_run(job_id=batch_id, run_mode='ASYNC')
+    run.outputs_requested = len(document_ids)
+    run.save(update_fields=['outputs_requested'])
+    step_rec = start_step(run, 'WORD_PROCESS', extra={'batch_size': len(document_ids)})
+
+    state = {
+        'job_id': batch_id,
+        'status': 'RUNNING',
+        'stage': 'RESOLVE',
+        'progress': 0,
+        'error': None,
+        'counts': {
+            'total': len(document_ids),
+            'done': 0,
+            'failed': 0,
+        },
+    }
+    _write_json_atomic(state_path, state)
+
+    try:
+        from docx import Document
+        from .smart_folder_detector_configurable import SmartFolderDetectorConfigurable
+
+        config = FolderStructureConfig.get_active_config()
+        detector = SmartFolderDetectorConfigurable(config=config)
+        histories = {h.id: h for h in ProcessingHistory.objects.filter(id__in=[int(d) for d in document_ids])}
+        uploaded = _uploaded_pdf_links(upload_job_id) if upload_job_id else None
+
+        documents = []
+        for idx, doc_id in enumerate(document_ids, 1):
+            entry = {
+                'index': idx,
+                'document_id': int(doc_id),
+                'status': 'PENDING',
+                'status_path': str(docs_dir / f"{idx:06d}.json"),
+            }
+            history = histories.get(int(doc_id))
+            if history is None:
+                _fail_batch_document(None, entry, 'Document not found')
+                continue
+
+            history.status = 'PROCESSING'
+            history.save(update_fields=['status'])
+            entry['input_filename'] = history.input_filename
+
+            patient_name = (patient_names.get(str(doc_id)) or '').strip()
+            if patient_name:
+                patient_name = patient_name.title().replace(' ', '_')
+            elif uploaded is not None:
+                # The folder is known; the name is only informational
+                patient_name = uploaded['patient_name'] or 'Unknown'
+            else:
+                try:
+                    input_path = history.input_file.path
+                    patient_name = (
+                        detector.extract_patient_name_from_document(Document(input_path))
+                        or detector.extract_patient_name_from_filename(input_path)
+                        or ''
+                    )
+                except Exception as e:
+                    _fail_batch_document(history, entry, 'Could not read the Word document.', str(e))
+                    continue
+
+            if not patient_name:
+                _fail_batch_document(history, entry, 'Could not find the patient name in the document.')
+                continue
+
+            entry['patient_name'] = patient_name
+            documents.append((history, entry))
+
+        lookup_workers = int(getattr(settings, 'BATCH_DRIVE_LOOKUP_THREADS', 4) or 4)
+        t_lookup = time.time()
+        if uploaded is not None:
+            folder = {'folder_id': uploaded['folder_id'], 'error': None if uploaded['folder_id'] else 'Upload manifest has no Drive folder'}
+            folders = {e['patient_name']: folder for _, e in documents}
+            listings = {uploaded['folder_id']: {'pdf_links': uploaded['pdf_links'], 'error': None}} if uploaded['folder_id'] else {}
+        else:
+            folders = resolve_patient_folders([e['patient_name'] for _, e in documents], config, max_workers=lookup_workers)
+            listings = fetch_folder_pdf_links(
+                [(folders.get(e['patient_name']) or {}).get('folder_id') for _, e in documents],
+                max_workers=lookup_workers,
+            )
+        lookup_ms = int((time.time() - t_lookup) * 1000)
+
+        state.update({'stage': 'LINK', 'progress': 10})
+        _write_json_atomic(state_path, state)
+
+        folder_links: dict[str, dict] = {}
+        linkable = []
+        for history, entry in documents:
+            folder = folders.get(entry['patient_name']) or {}
+            folder_id = folder.get('folder_id')
+            if not folder_id:
+                _fail_batch_document(
+                    history,
+                    entry,
+                    "Patient folder not found in Google Drive. Please make sure a folder exists with the patient's name.",
+                    folder.get('error') or '',
+                )
+                continue
+
+            listing = listings.get(folder_id) or {}
+            if listing.get('error'):
+                _fail_batch_document(
+                    history,
+                    entry,
+                    'Could not access PDFs from Google Drive. Please check folder permissions.',
+                    listing['error'],
+                )
+                continue
+            if not listing.get('pdf_links'):
+                _fail_batch_document(
+                    history,
+                    entry,
+                    'No PDF files found in the patient folder. Please upload split PDFs to the folder.',
+                )
+                continue
+
+            folder_links[folder_id] = listing['pdf_links']
+            output_filename = history.input_filename.replace('.docx', '_PROCESSED.docx')
+            entry.update({
+                'folder_id': folder_id,
+                'input_path': history.input_file.path,
+                'output_filename': output_filename,
+                'output_path': str(batch_dir / 'outputs' / f"{entry['index']:06d}_{output_filename}"),
+            })
+            _write_json_atomic(Path(entry['status_path']), entry)
+            linkable.append(entry)
+
+        manifest = {
+            'job_id': batch_id,
+            'created_at': datetime.utcnow().isoformat(),
+            'folder_links': folder_links,
+            'documents': linkable,
+        }
+        _write_json_atomic(batch_dir / 'manifest.json', manifest)
+
+        step_rec.extra = dict(
+            step_rec.extra or {},
+            drive_lookup_ms=lookup_ms,
+            throttle_wait_ms=sum(r.get('throttle_wait_ms') or 0 for r in [*folders.values(), *listings.values()]),
+            distinct_patients=len(folders),
+            distinct_folders=len(listings),
+        )
+        step_rec.save(update_fields=['extra'])
+
+        chunk_size = int(getattr(settings, 'BATCH_LINK_CHUNK_SIZE', 10) or 10)
+        starts = range(0, len(linkable), chunk_size)
+        completion = _expect_chunks(batch_dir, len(starts))
+        header = [
+            batch_link_documents_chunk_job.s(
+                batch_id=batch_id,
+                indices=[e['index'] for e in linkable[start:start + chunk_size]],
+                completion=dict(completion, chunk=chunk_no),
+            )
+            for chunk_no, start in enumerate(starts, 1)
+        ]
+
+        if header:
+            group(header).apply_async()
+            job_leases.heartbeat(batch_id, force=True)
+        else:
+            finalize_batch_documents_job.delay(batch_id=batch_id)
+        return state
+
+    except Exception as exc:
+        state.update({'status': 'FAILED', 'progress': 100, 'error': str(exc)})
+        _write_json_atomic(state_path, state)
+        finish_step(step_rec, status='FAILED', error_message=str(exc))
+        finish_run(run, status='FAILED', error_message=str(exc))
+        return state
+
+
+@shared_task(bind=True, max_retries=0)
+def batch_link_documents_chunk_job(self, batch_id: str, indices: list, completion: dict | None = None):
+    """Link a chunk of batch documents in a process pool and record each result.
+
+    With a completion ticket, the last chunk of the batch schedules finalize_batch_documents_job.
+    """
+    batch_dir, _, _ = _batch_state_paths(batch_id)
+    with open(batch_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    wanted = {int(i) for i in indices}
+    folder_links = manifest.get('folder_links') or {}
+    items = []
+    for entry in manifest.get('documents') or []:
+        if int(entry['index']) not in wanted:
+            continue
+        Path(entry['output_path']).parent.mkdir(parents=True, exist_ok=True)
+        items.append(dict(entry, pdf_links=folder_links.get(entry['folder_id']) or {}))
+
+    def _on_result(item: dict, res: dict) -> None:
+        job_leases.heartbeat(batch_id)
+        entry = {k: v for k, v in item.items() if k != 'pdf_links'}
+        history = ProcessingHistory.objects.filter(id=item['document_id']).first()
+        if res.get('status') != 'SUCCESS':
+            _fail_batch_document(history, entry, f"Document processing failed: {res.get('error')}", res.get('error') or '')
+            return
+
+        stats = res.get('stats') or {}
+        if history is not None:
+            from django.core.files import File
+
+            with open(item['output_path'], 'rb') as f:
+                history.output_file.save(item['output_filename'], File(f), save=False)
+            history.status = 'SUCCESS'
+            history.folder_id = item['folder_id']
+            history.patient_name = item['patient_name']
+            history.output_filename = item['output_filename']
+            history.processing_time_seconds = res.get('duration_s')
+            history.total_statements = stats.get('total_statements', 0)
+            history.linked_statements = stats.get('linked_statements', 0)
+            history.unlinked_statements = stats.get('unlinked_statements', 0)
+            history.processed_at = datetime.now()
+            history.save()
+            try:
+                os.unlink(item['output_path'])
+            except Exception:
+                pass
+
+        entry.update({
+            'status': 'SUCCESS',
+            'error': None,
+            'total_statements': stats.get('total_statements', 0),
+            'linked_statements': stats.get('linked_statements', 0),
+            'unlinked_statements': stats.get('unlinked_statements', 0),
+            'duration_s': res.get('duration_s'),
+            'engine': stats.get('engine'),
+            'peak_rss_delta_mb': res.get('peak_rss_delta_mb'),
+            'finished_at': datetime.utcnow().isoformat(),
+        })
+        _write_json_atomic(Path(entry['status_path']), entry)
+
+    max_workers = int(getattr(settings, 'BATCH_LINK_WORKER_PROCS', 2) or 2)
+    streaming_threshold = int(getattr(settings, 'WORD_STREAMING_THRESHOLD_MB', 20) or 0) * 1024 * 1024
+    results = link_documents(
+        items,
+        max_workers=max_workers,
+        on_result=_on_result,
+        streaming_threshold_bytes=streaming_threshold,
+    )
+    summary = {
+        'batch_id': batch_id,
+        'done': sum(1 for r in results if r.get('status') == 'SUCCESS'),
+        'failed': sum(1 for r in results if r.get('status') != 'SUCCESS'),
+    }
+    if completion and _chunk_finished(batch_dir, completion, summary):
+        finalize_batch_documents_job.apply_async(kwargs={'batch_id': batch_id})
+        job_leases.heartbeat(batch_id, force=True)
+    return summary
+
+
+@shared_task(bind=True, max_retries=0)
+def finalize_batch_documents_job(self, results: list | None = None, batch_id: str = ''):
+    """Aggregate per-document statuses into the batch state.json and ProcessingRun."""
+    batch_dir, docs_dir, state_path = _batch_state_paths(batch_id)
+
+    documents = []
+    if docs_dir.exists():
+        for p in sorted(docs_dir.iterdir()):
+            if not (p.is_file() and p.suffix.lower() == '.json'):
+                continue
+            try:
+                with open(p, 'r', encoding='utf-8') as f:
+                    documents.append(json.load(f))
+            except Exception:
+                continue
+
+    done = sum(1 for d in documents if d.get('status') == 'SUCCESS')
+    failed = sum(1 for d in documents if d.get('status') == 'FAILED')
+    linked = sum(int(d.get('linked_statements') or 0) for d in documents)
+    total_statements = sum(int(d.get('total_statements') or 0) for d in documents)
+    peak_rss = max((d.get('peak_rss_delta_mb') or 0 for d in documents), default=0) or None
+
+    if failed == 0 and done > 0:
+        status = 'SUCCESS'
+    elif done > 0:
+        status = 'PARTIAL_SUCCESS'
+    else:
+        status = 'FAILED'
+
+    final_state = {
+        'job_id': batch_id,
+        'status': status,
+        'stage': 'LINK',
+        'progress': 100,
+        'error': None if done > 0 else 'No documents were processed successfully',
+        'counts': {
+            'total': len(documents),
+            'done': done,
+            'failed': failed,
+        },
+        'documents': documents,
+        'finished_at': datetime.utcnow().isoformat(),
+    }
+    _write_json_atomic(state_path, final_state)
+
+    run = get_or_create_run(job_id=batch_id, run_mode='ASYNC')
+    step_rec = run.steps.filter(step='WORD_PROCESS').order_by('-started_at').first()
+    if step_rec:
+        finish_step(
+            step_rec,
+            status=status,
+            count_total=len(documents),
+            count_done=done,
+            count_failed=failed,
+            extra={'linked_statements': linked, 'total_statements': total_statements, 'peak_rss_delta_mb': peak_rss},
+        )
+    finish_run(
+        run,
+        status=status,
+        error_message=final_state['error'] or '',
+        extra={'batch_counts': final_state['counts']},
+    )
+    return {k: v for k, v in final_state.items() if k != 'documents'}
@@ -1,3 +1,736 @@
-from django.test import TestCase
+import json
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import drive_rate_limit, job_leases
+from .job_queue import _ordered
+from .split_backends import QpdfBackend
+from .split_spec import compile_split_plan, first_segment_beyond, parse_split_groups
+from .status_journal import COMPACTED_NAME, StatusJournal, compact, read_statuses
+
+
+class CompileSplitPlanTests(SimpleTestCase):
+    def plan(self, ranges_text, page_offsets=None):
+        return compile_split_plan(parse_split_groups(ranges_text), page_offsets)
+
+    def test_identical_groups_are_copied_from_the_first(self):
+        # '1-2, 3' merges to 1-3, so it is the same output as the first group
+        plan = self.plan('1-3; 5; 1-3; 1-2, 3')
+
+        self.assertEqual([g['copy_of'] for g in plan['groups']], [None, None, 1, 1])
+        self.assertEqual(plan['duplicate_groups'], 2)
+        self.assertEqual(plan['order'], [1, 2])
+        self.assertEqual(plan['total_extracted_pages'], 10)
+        self.assertEqual(plan['distinct_pages'], 4)
+
+    def test_overlapping_groups_count_every_group_sharing_a_page(self):
+        plan = self.plan('1-5; 3-4; 6-7; 10, 12; 11-12')
+
+        # 1-5/3-4 and 12/11-12 overlap; 6-7 only touches 1-5; 10 is in a group that overlaps via 12
+        self.assertEqual(plan['overlapping_groups'], 4)
+        self.assertEqual(plan['duplicate_groups'], 0)
+        self.assertEqual(plan['distinct_pages'], 10)
+
+    def test_adjacent_groups_do_not_overlap(self):
+        plan = self.plan('1-2; 3-4; 5')
+
+        self.assertEqual(plan['overlapping_groups'], 0)
+        self.assertEqual(plan['distinct_pages'], 5)
+
+    def test_duplicates_are_not_counted_as_overlapping(self):
+        plan = self.plan('1-3; 1-3')
+
+        self.assertEqual(plan['duplicate_groups'], 1)
+        self.assertEqual(plan['overlapping_groups'], 0)
+
+    def test_order_follows_page_offsets(self):
+        offsets = [300.0, 200.0, 100.0]
+
+        self.assertEqual(self.plan('1; 2; 3')['order'], [1, 2, 3])
+        self.assertEqual(self.plan('1; 2; 3', offsets)['order'], [3, 2, 1])
+
+    def test_first_segment_beyond(self):
+        plan = self.plan('1-2; 4, 8-9; 20')
+
+        self.assertIsNone(first_segment_beyond(plan, 20))
+        self.assertEqual(first_segment_beyond(plan, 8), (8, 9))
+        self.assertEqual(plan['max_page'], 20)
+
+
+@override_settings(JOB_QUEUE_AGING_S=300)
+class QueueOrderTests(SimpleTestCase):
+    now = datetime(2026, 1, 1, 12, 0, 0)
+
+    def entry(self, name, user_id, cost=1, waited_s=0):
+        return SimpleNamespace(name=name, user_id=user_id, cost=cost, created_at=self.now - timedelta(seconds=waited_s))
+
+    def order(self, entries, running_by_user=None):
+        return [e.name for e in _ordered(entries, Counter(running_by_user or {}), self.now)]
+
+    def test_users_with_fewer_running_jobs_go_first(self):
+        entries = [self.entry('a', 1, waited_s=60), self.entry('b', 2)]
+
+        self.assertEqual(self.order(entries, {1: 2}), ['b', 'a'])
+
+    def test_admitted_picks_count_towards_fair_share(self):
+        entries = [
+            self.entry('a1', 1, waited_s=30),
+            self.entry('a2', 1, waited_s=20),
+            self.entry('a3', 1, waited_s=10),
+            self.entry('b1', 2),
+        ]
+
+        self.assertEqual(self.order(entries), ['a1', 'b1', 'a2', 'a3'])
+
+    def test_smaller_jobs_first_then_arrival(self):
+        entries = [self.entry('big', 1, cost=50), self.entry('small', 1, cost=2), self.entry('small_late', 1, cost=2)]
+        entries[2].created_at = self.now + timedelta(microseconds=1)
+
+        self.assertEqual(self.order(entries), ['small', 'small_late', 'big'])
+
+    def test_waiting_shrinks_a_big_job(self):
+        # 10 / (1 + 2700/300) = 1 beats a fresh job of size 2
+        entries = [self.entry('small', 1, cost=2), self.entry('big', 1, cost=10, waited_s=2700)]
+
+        self.assertEqual(self.order(entries), ['big', 'small'])
+
+    def test_fair_share_outranks_aging(self):
+        entries = [self.entry('old', 1, cost=1, waited_s=3600), self.entry('new', 2, cost=100)]
+
+        self.assertEqual(self.order(entries, {1: 1}), ['new', 'old'])
+
+
+class StatusJournalTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.status_dir = Path(tmp.name) / 'output_status'
+
+    def write_segment(self, name, records, tail=''):
+        self.status_dir.mkdir(parents=True, exist_ok=True)
+        lines = ''.join(json.dumps(r) + '\n' for r in records)
+        (self.status_dir / name).write_text(lines + tail, encoding='utf-8')
+
+    def test_latest_record_per_index_wins_across_segments(self):
+        self.write_segment('1-1.jsonl', [
+            {'index': 1, 'status': 'FAILED', 'finished_at': '2026-01-01T10:00:00'},
+            {'index': 2, 'status': 'SUCCESS', 'finished_at': '2026-01-01T10:00:05'},
+        ])
+        self.write_segment('2-1.jsonl', [
+            {'index': 1, 'status': 'SUCCESS', 'finished_at': '2026-01-01T10:01:00'},
+            {'index': 2, 'status': 'FAILED', 'finished_at': '2026-01-01T09:59:00'},
+        ])
+
+        statuses = read_statuses(self.status_dir)
+
+        self.assertEqual({i: r['status'] for i, r in statuses.items()}, {1: 'SUCCESS', 2: 'SUCCESS'})
+
+    def test_torn_last_line_is_ignored(self):
+        self.write_segment('1-1.jsonl', [{'index': 1, 'status': 'SUCCESS', 'finished_at': 'a'}], tail='{"index": 2, "sta')
+
+        self.assertEqual(list(read_statuses(self.status_dir)), [1])
+
+    def test_missing_dir_reads_empty(self):
+        self.assertEqual(read_statuses(self.status_dir), {})
+        self.assertEqual(compact(self.status_dir), {})
+        self.assertFalse(self.status_dir.exists())
+
+    def test_compact_folds_segments_into_one_file(self):
+        with StatusJournal(self.status_dir) as journal:
+            journal.append({'index': 2, 'status': 'FAILED', 'finished_at': 'a'})
+            journal.append({'index': 1, 'status': 'SUCCESS', 'finished_at': 'a'})
+            journal.append({'index': 2, 'status': 'SUCCESS', 'finished_at': 'b'})
+        self.write_segment('9-9.jsonl', [], tail='{"index": 3')
+
+        records = compact(self.status_dir)
+
+        self.assertEqual([p.name for p in self.status_dir.iterdir()], [COMPACTED_NAME])
+        lines = (self.status_dir / COMPACTED_NAME).read_text(encoding='utf-8').splitlines()
+        self.assertEqual([json.loads(line)['index'] for line in lines], [1, 2])
+        self.assertEqual(records, read_statuses(self.status_dir))
+        self.assertEqual(records[2]['status'], 'SUCCESS')
+
+    def test_compact_keeps_only_accepted_records(self):
+        self.write_segment('1-1.jsonl', [
+            {'index': 1, 'status': 'SUCCESS', 'finished_at': 'a'},
+            {'index': 2, 'status': 'FAILED', 'finished_at': 'a'},
+        ])
+
+        records = compact(self.status_dir, keep=lambda r: r['status'] == 'SUCCESS')
+
+        self.assertEqual(list(records), [1])
+        self.assertEqual(list(read_statuses(self.status_dir)), [1])
+
+    def test_segments_written_after_compaction_override_it(self):
+        self.write_segment('1-1.jsonl', [{'index': 1, 'status': 'FAILED', 'finished_at': 'a'}])
+        compact(self.status_dir)
+        self.write_segment('2-1.jsonl', [
+            {'index': 1, 'status': 'SUCCESS', 'finished_at': 'b'},
+            {'index': 2, 'status': 'SUCCESS', 'finished_at': 'b'},
+        ])
+
+        statuses = read_statuses(self.status_dir)
+
+        self.assertEqual({i: r['status'] for i, r in statuses.items()}, {1: 'SUCCESS', 2: 'SUCCESS'})
+
+
+def _fake_qpdf(calls, fail_batches=False):
+    """Stands in for _run_qpdf: writes each output's page list as its content."""
+    def run(args):
+        if args[0].startswith('@'):
+            with open(args[0][1:], encoding='utf-8') as f:
+                args = f.read().split('\n')
+        calls.append(args)
+        pages = []
+        for part in args[3].split(','):
+            first, _, last = part.partition('-')
+            pages.extend(range(int(first), int(last or first) + 1))
+        if not args[5].startswith('--split-pages='):
+            Path(args[5]).write_text(str(pages), encoding='utf-8')
+            return
+        if fail_batches:
+            raise RuntimeError('qpdf: broken xref')
+        size = int(args[5].split('=')[1])
+        stem = args[6][:-len('.pdf')]
+        for n in range(0, len(pages), size):
+            Path(f'{stem}-{n + 1:02d}-{n + size:02d}.pdf').write_text(str(pages[n:n + size]), encoding='utf-8')
+    return run
+
+
+class QpdfBatchTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.out_dir = Path(tmp.name)
+        self.jobs = [
+            (str(self.out_dir / 'a.pdf'), [(1, 2)]),
+            (str(self.out_dir / 'b.pdf'), [(5, 5)]),
+            (str(self.out_dir / 'c.pdf'), [(7, 7), (9, 9)]),
+            (str(self.out_dir / 'd.pdf'), [(3, 3)]),
+        ]
+
+    def extract(self, fail_batches=False):
+        calls, results = [], []
+        with mock.patch('processing.split_backends._run_qpdf', _fake_qpdf(calls, fail_batches)):
+            errors = QpdfBackend().extract_many('in.pdf', self.jobs, on_result=lambda i, e, ms, d: results.append(i))
+        return calls, errors, sorted(results)
+
+    def contents(self):
+        return [Path(path).read_text(encoding='utf-8') for path, _ in self.jobs]
+
+    def test_outputs_of_one_length_share_a_run(self):
+        calls, errors, results = self.extract()
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(errors, [None] * 4)
+        self.assertEqual(results, [0, 1, 2, 3])
+        self.assertEqual(self.contents(), ['[1, 2]', '[5]', '[7, 9]', '[3]'])
+        self.assertEqual(sorted(p.name for p in self.out_dir.iterdir()), ['a.pdf', 'b.pdf', 'c.pdf', 'd.pdf'])
+
+    def test_failed_batch_falls_back_to_one_run_per_output(self):
+        calls, errors, results = self.extract(fail_batches=True)
+
+        self.assertEqual(len(calls), 6)
+        self.assertEqual(errors, [None] * 4)
+        self.assertEqual(results, [0, 1, 2, 3])
+        self.assertEqual(self.contents(), ['[1, 2]', '[5]', '[7, 9]', '[3]'])
+
+
+class _FakeRedis:
+    """The handful of Redis calls job_leases makes, in memory."""
+
+    def __init__(self):
+        self.zsets, self.hashes, self.values = {}, {}, {}
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        return []
+
+    def zadd(self, key, mapping, xx=False):
+        zset = self.zsets.setdefault(key, {})
+        for member, score in mapping.items():
+            if not xx or member in zset:
+                zset[member] = score
+
+    def zrangebyscore(self, key, low, high):
+        low, high = float(low), float(high)
+        return [m.encode() for m, score in self.zsets.get(key, {}).items() if low <= score <= high]
+
+    def zrem(self, key, member):
+        return self.zsets.get(key, {}).pop(member, None) is not None
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    def hdel(self, key, field):
+        self.hashes.get(key, {}).pop(field, None)
+
+    def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+
+    def expire(self, key, seconds):
+        pass
+
+    def eval(self, script, numkeys, key):
+        # job_leases._DECR_PENDING
+        n = int(self.values.get(key, 0)) - 1
+        if n <= 0:
+            self.values.pop(key, None)
+        else:
+            self.values[key] = n
+        return n
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+
+@override_settings(JOB_LEASE_TTL_S=60)
+class ReapExpiredLeasesTests(TestCase):
+    def setUp(self):
+        self.redis = _FakeRedis()
+        patcher = mock.patch('processing.job_leases._client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def running_run(self, job_id, lease_expires_in=None):
+        from pdfs.models import ProcessingRun
+
+        run = ProcessingRun.objects.create(job_id=job_id, run_mode='ASYNC', status='RUNNING')
+        if lease_expires_in is not None:
+            job_leases.acquire_lease(run)
+            self.redis.zsets[job_leases.LEASES_KEY][f'ASYNC:{job_id}'] = time.time() + lease_expires_in
+        return run
+
+    def status(self, run):
+        run.refresh_from_db()
+        return run.status
+
+    def test_expired_lease_fails_the_run(self):
+        run = self.running_run('job-1', lease_expires_in=-1)
+
+        self.assertEqual(job_leases.reap_expired_leases(force=True), ['ASYNC:job-1'])
+        self.assertEqual(self.status(run), 'FAILED')
+        self.assertEqual(run.error_code, 'LEASE_EXPIRED')
+
+    def test_job_with_tasks_waiting_in_the_broker_is_renewed(self):
+        run = self.running_run('job-1', lease_expires_in=-1)
+        for _ in range(2):
+            job_leases.task_published('processing.tasks.split_pdf_chunk_job', (), {'job_id': 'job-1'})
+        job_leases.task_started('processing.tasks.split_pdf_chunk_job', (), {'job_id': 'job-1'})
+
+        self.assertEqual(job_leases.reap_expired_leases(force=True), [])
+        self.assertEqual(self.status(run), 'RUNNING')
+        self.assertGreater(self.redis.zsets[job_leases.LEASES_KEY]['ASYNC:job-1'], time.time())
+
+    def test_started_tasks_no_longer_protect_the_job(self):
+        run = self.running_run('job-1', lease_expires_in=-1)
+        job_leases.task_published('processing.tasks.split_pdf_job', ('job-1',), {})
+        job_leases.task_started('processing.tasks.split_pdf_job', ('job-1',), {})
+        # A redelivered message must not drive the count below zero
+        job_leases.task_started('processing.tasks.split_pdf_job', ('job-1',), {})
+
+        self.assertEqual(job_leases.reap_expired_leases(force=True), ['ASYNC:job-1'])
+        self.assertEqual(self.status(run), 'FAILED')
+        self.assertEqual(self.redis.values, {})
+
+    def test_run_without_a_lease_is_left_alone(self):
+        from pdfs.models import ProcessingRun
+
+        run = self.running_run('job-1')
+        ProcessingRun.objects.filter(pk=run.pk).update(started_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(job_leases.reap_expired_leases(force=True), [])
+        self.assertEqual(self.status(run), 'RUNNING')
+
+    def test_live_lease_is_not_reaped(self):
+        run = self.running_run('job-1', lease_expires_in=30)
+
+        self.assertEqual(job_leases.reap_expired_leases(force=True), [])
+        self.assertEqual(self.status(run), 'RUNNING')
+
+
+class UploadChunkTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media = Path(tmp.name)
+        media = override_settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        for patcher in (
+            mock.patch('processing.job_leases._client', return_value=None),
+            mock.patch('processing.tasks.pooled_drive_service', side_effect=RuntimeError('Drive client pool exhausted')),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.files = [
+            {'index': i, 'local_path': str(self.media / f'{i}.pdf'), 'filename': f'{i}.pdf', 'size_bytes': 1}
+            for i in (1, 2)
+        ]
+
+    def upload(self, retry_side_effect=None):
+        from . import tasks
+
+        upload_dir, _, _ = tasks._upload_state_paths('job-1')
+        completion = tasks._expect_chunks(upload_dir, len(self.files))
+        with mock.patch.object(tasks.upload_split_file_job, 'apply_async', side_effect=retry_side_effect) as retry, \
+                mock.patch.object(tasks.finalize_upload_job, 'apply_async') as finalize:
+            result = tasks.upload_split_chunk_job('job-1', self.files, 'folder', completion=completion)
+        return result, retry, finalize
+
+    def test_files_are_handed_on_when_no_drive_client_is_available(self):
+        result, retry, finalize = self.upload()
+
+        self.assertEqual(result['retried'], 2)
+        self.assertEqual(sorted(c.kwargs['kwargs']['index'] for c in retry.call_args_list), [1, 2])
+        finalize.assert_not_called()
+
+    def test_files_fail_and_finalize_runs_when_retries_cannot_be_scheduled(self):
+        result, retry, finalize = self.upload(retry_side_effect=RuntimeError('broker down'))
+
+        self.assertEqual(result['retried'], 0)
+        finalize.assert_called_once()
+        files_dir = self.media / 'processing' / 'uploads' / 'job-1' / 'files'
+        statuses = [json.loads(p.read_text(encoding='utf-8'))['status'] for p in sorted(files_dir.glob('*.json'))]
+        self.assertEqual(statuses, ['FAILED', 'FAILED'])
+
+
+class ChunkCountTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.job_dir = Path(tmp.name)
+
+    def test_weighted_reports_complete_the_count_once(self):
+        from .tasks import _chunk_finished, _expect_chunks
+
+        completion = _expect_chunks(self.job_dir, 5)
+
+        self.assertFalse(_chunk_finished(self.job_dir, dict(completion, chunk='c000001'), {}, weight=3))
+        # A redelivered report replaces its earlier one instead of adding to the count
+        self.assertFalse(_chunk_finished(self.job_dir, dict(completion, chunk='c000001'), {}, weight=3))
+        self.assertFalse(_chunk_finished(self.job_dir, dict(completion, chunk='f000004'), {}))
+        self.assertTrue(_chunk_finished(self.job_dir, dict(completion, chunk='f000005'), {}))
+        self.assertFalse(_chunk_finished(self.job_dir, dict(completion, chunk='f000005'), {}))
+
+
+@override_settings(
+    DRIVE_API_RATE_PER_SEC=1, DRIVE_API_BURST=1, DRIVE_API_MAX_WAIT_S=0.5, DRIVE_API_PENALTY_S=5,
+    DRIVE_RATE_LIMIT_REDIS_URL='', CELERY_BROKER_URL='',
+)
+class DriveRateLimitTests(SimpleTestCase):
+    """The per-process bucket used without Redis."""
+
+    def setUp(self):
+        patcher = mock.patch('processing.drive_rate_limit.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.key = f'drive_rate:test-{self.id()}'
+
+    def test_burst_is_free_then_calls_wait_for_their_slot(self):
+        self.assertEqual(drive_rate_limit.acquire(self.key), 0.0)
+
+        wait = drive_rate_limit.acquire(self.key)
+
+        self.assertAlmostEqual(wait, 1.0, delta=0.05)
+        self.sleep.assert_called_once_with(wait)
+
+    def test_deferring_raises_instead_of_waiting_too_long(self):
+        drive_rate_limit.acquire(self.key)
+
+        with drive_rate_limit.deferring(), self.assertRaises(drive_rate_limit.DriveRateLimited) as raised:
+            drive_rate_limit.acquire(self.key)
+
+        self.assertAlmostEqual(raised.exception.retry_after, 1.0, delta=0.05)
+        self.sleep.assert_not_called()
+        # Nothing was reserved: the next caller still gets the first free slot
+        self.assertAlmostEqual(drive_rate_limit.acquire(self.key), 1.0, delta=0.05)
+
+    def test_penalty_drains_the_bucket(self):
+        drive_rate_limit.penalize(self.key)
+
+        self.assertAlmostEqual(drive_rate_limit.acquire(self.key), 6.0, delta=0.05)
+
+
+class ChunkFinishedTests(SimpleTestCase):
+    def test_exactly_one_chunk_completes_the_count(self):
+        from .tasks import _chunk_finished, _expect_chunks
+
+        with tempfile.TemporaryDirectory() as tmp:
+            job_dir = Path(tmp)
+            completion = _expect_chunks(job_dir, 2)
+
+            self.assertFalse(_chunk_finished(job_dir, dict(completion, chunk=1), {'chunk': 1}))
+            self.assertTrue(_chunk_finished(job_dir, dict(completion, chunk=2), {'chunk': 2}))
+            # A redelivered chunk sees the full count but not a second completion
+            self.assertFalse(_chunk_finished(job_dir, dict(completion, chunk=2), {'chunk': 2}))
+
+            # A new attempt starts counting from zero
+            retry = _expect_chunks(job_dir, 1)
+            self.assertTrue(_chunk_finished(job_dir, dict(retry, chunk=1), {}))
+
+
+class LinkDocumentsTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            'processing.batch_linker.link_document_worker',
+            side_effect=lambda *args: {'status': 'SUCCESS', 'error': None, 'stats': {}, 'duration_s': 0.1},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failing_on_result_fails_only_that_document(self):
+        from .batch_linker import link_documents
+
+        items = [{'input_path': f'{n}.docx', 'pdf_links': {}, 'output_path': f'{n}-out.docx'} for n in 'ab']
+        reported = []
+
+        def on_result(item, result):
+            reported.append((item['input_path'], result['status']))
+            if item['input_path'] == 'a.docx' and result['status'] == 'SUCCESS':
+                raise OSError('disk full')
+
+        results = link_documents(items, max_workers=1, on_result=on_result)
+
+        self.assertEqual([r['status'] for r in results], ['FAILED', 'SUCCESS'])
+        self.assertEqual(results[0]['error'], 'Could not record result: disk full')
+        self.assertEqual(reported, [('a.docx', 'SUCCESS'), ('a.docx', 'FAILED'), ('b.docx', 'SUCCESS')])
+
+
+def _statement_document(path):
+    from docx import Document
+
+    doc = Document()
+    doc.add_paragraph('06/19/25.  From EMANATE HEALTH.  Attestation. 1-2')
+    doc.add_paragraph('07/01/25.  Records from clinic. 3-5')
+    doc.add_table(rows=1, cols=1).cell(0, 0).text = 'x'
+    doc.save(path)
+    return path
+
+
+class RelinkTests(SimpleTestCase):
+    def setUp(self):
+        from .word_hyperlink_processor_simple import WordHyperlinkProcessorSimple
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.processor = WordHyperlinkProcessorSimple()
+        self.source = _statement_document(str(self.dir / 'in.docx'))
+        self.processed = str(self.dir / 'out.docx')
+        self.processor.process_word_document(self.source, {'1-2': 'https://example.com/1'}, self.processed)
+
+    def test_relinking_with_the_same_links_changes_nothing(self):
+        output = str(self.dir / 'relinked.docx')
+
+        result = self.processor.relink_processed_document(
+            self.processed, {'1-2': 'https://example.com/1'}, output, source_docx_path=self.source,
+        )
+
+        self.assertFalse(result['incremental']['changed'])
+        self.assertEqual(result['incremental']['unchanged'], 1)
+        self.assertEqual(Path(output).read_bytes(), Path(self.processed).read_bytes())
+
+    def test_second_relink_of_new_links_is_a_no_op(self):
+        links = {'1-2': 'https://example.com/2', '3-5': 'https://example.com/3'}
+        first = str(self.dir / 'relinked.docx')
+        second = str(self.dir / 'relinked-again.docx')
+
+        result = self.processor.relink_processed_document(self.processed, links, first, source_docx_path=self.source)
+        self.assertTrue(result['incremental']['changed'])
+        self.assertEqual(result['incremental']['retargeted'], 1)
+        self.assertEqual(result['incremental']['newly_linked'], 1)
+
+        result = self.processor.relink_processed_document(first, links, second)
+        self.assertFalse(result['incremental']['changed'])
+        self.assertEqual(result['incremental']['unchanged'], 2)
+
+    def test_normalization_touches_nothing_on_a_second_pass(self):
+        from docx import Document
+
+        doc = Document(self.source)
+        fonts = self.processor._apply_default_font(doc)
+        self.processor._normalize_tables(doc)
+        self.assertGreater(fonts['runs_touched'], 0)
+
+        fonts = self.processor._apply_default_font(doc)
+        tables = self.processor._normalize_tables(doc)
+
+        self.assertEqual(fonts['runs_touched'], 0)
+        self.assertFalse(fonts['style_touched'])
+        self.assertEqual(tables['tables_touched'], 0)
+        self.assertEqual(tables['cells_touched'], 0)
+
+
+class BodyPackageTests(SimpleTestCase):
+    def test_round_trip_replaces_the_body_and_keeps_other_parts(self):
+        import zipfile
+
+        from docx import Document
+
+        from .docx_streaming import assemble_output, build_body_package
+
+        with tempfile.TemporaryDirectory() as tmp:
+            source, body, output = (str(Path(tmp) / name) for name in ('in.docx', 'body.docx', 'out.docx'))
+            doc = Document()
+            doc.sections[0].header.paragraphs[0].text = 'Page header'
+            doc.add_paragraph('Original body')
+            doc.save(source)
+
+            context = build_body_package(source, body)
+            body_doc = Document(body)
+            body_doc.paragraphs[0].text = 'Processed body'
+            body_doc.save(body)
+            assemble_output(source, body, output, context)
+
+            result = Document(output)
+            self.assertEqual([p.text for p in result.paragraphs], ['Processed body'])
+            self.assertEqual(result.sections[0].header.paragraphs[0].text, 'Page header')
+            with zipfile.ZipFile(source) as zin, zipfile.ZipFile(output) as zout:
+                self.assertEqual(zout.namelist(), zin.namelist())
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'page_ranges': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-page-ranges'},
+})
+class PageRangeCacheTests(SimpleTestCase):
+    def test_second_analysis_of_the_same_digest_is_a_cache_hit(self):
+        from . import page_range_service
+
+        page_range_service._cache().clear()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = _statement_document(str(Path(tmp) / 'in.docx'))
+            with mock.patch.object(page_range_service, 'parse_word_document', wraps=page_range_service.parse_word_document) as parse:
+                first = page_range_service.analyze_word_document(path, sha256='a' * 64)
+                second = page_range_service.analyze_word_document(path, sha256='a' * 64)
+                other = page_range_service.analyze_word_document(path, sha256='b' * 64)
+
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['page_ranges'], ['1-2', '3-5'])
+        self.assertEqual(second['page_ranges'], first['page_ranges'])
+        self.assertFalse(other['cached'])
+        self.assertEqual(parse.call_count, 2)
+
+
+class CostModelTests(SimpleTestCase):
+    MODEL = {'per_chunk_ms': 200.0, 'per_output_ms': 10.0, 'per_page_ms': 3.0, 'per_mb_ms': 50.0}
+
+    def samples(self, count):
+        samples = []
+        for i in range(count):
+            outputs, pages, mb = 1 + i % 4, 5 + 7 * i, round(0.5 * (i % 5) + 0.1 * i, 3)
+            duration = (self.MODEL['per_chunk_ms'] + self.MODEL['per_output_ms'] * outputs
+                        + self.MODEL['per_page_ms'] * pages + self.MODEL['per_mb_ms'] * mb)
+            samples.append({'outputs': outputs, 'pages': pages, 'mb': mb, 'duration_ms': duration})
+        return samples
+
+    def test_enough_samples_recover_the_model(self):
+        from .split_chunking import MIN_FIT_SAMPLES, fit_cost_model
+
+        model = fit_cost_model(self.samples(MIN_FIT_SAMPLES))
+
+        self.assertEqual(model['source'], 'fit')
+        for name, value in self.MODEL.items():
+            self.assertAlmostEqual(model[name], value, places=2)
+
+    def test_few_samples_rescale_the_default(self):
+        from .split_chunking import DEFAULT_COST_MODEL, fit_cost_model
+
+        self.assertEqual(fit_cost_model([])['source'], 'default')
+        model = fit_cost_model(self.samples(3))
+
+        self.assertEqual(model['source'], 'scaled')
+        scale = model['per_chunk_ms'] / DEFAULT_COST_MODEL['per_chunk_ms']
+        self.assertAlmostEqual(model['per_page_ms'], DEFAULT_COST_MODEL['per_page_ms'] * scale, places=3)
+
+    @override_settings(SPLIT_CHUNKS_PER_SLOT=2)
+    def test_chunks_are_balanced_and_keep_input_order(self):
+        from .split_chunking import DEFAULT_COST_MODEL, estimate_output_ms, plan_chunks
+
+        outputs = [{'index': i, 'estimate': {'pages': pages, 'mb': 0.0}} for i, pages in enumerate([4000, 100, 100, 3000, 500, 2000, 200, 1000])]
+
+        chunks = plan_chunks(outputs, DEFAULT_COST_MODEL, slots=2)
+
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(sorted(out['index'] for chunk in chunks for out in chunk), list(range(len(outputs))))
+        for chunk in chunks:
+            self.assertEqual([out['index'] for out in chunk], sorted(out['index'] for out in chunk))
+        loads = [sum(estimate_output_ms(out['estimate'], DEFAULT_COST_MODEL) for out in chunk) for chunk in chunks]
+        # No chunk carries more than the largest output plus the smallest share
+        largest = estimate_output_ms(outputs[0]['estimate'], DEFAULT_COST_MODEL)
+        self.assertLessEqual(max(loads), largest + min(loads))
+
+    def test_small_jobs_are_not_cut_into_overhead_sized_chunks(self):
+        from .split_chunking import DEFAULT_COST_MODEL, plan_chunks
+
+        outputs = [{'index': i, 'estimate': {'pages': 1, 'mb': 0.0}} for i in range(10)]
+
+        self.assertEqual(len(plan_chunks(outputs, DEFAULT_COST_MODEL, slots=8)), 1)
+
+
+class PipelineStageFinishedTests(TestCase):
+    def setUp(self):
+        from pdfs.models import ProcessingRun, ProcessingStep
+
+        patcher = mock.patch('processing.job_leases._client', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('processing.pipeline.job_queue.submit', return_value={'queued': False})
+        self.submit = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.run = ProcessingRun.objects.create(job_id='job-1', run_mode='ASYNC', status='SUCCESS')
+        self.step = ProcessingStep.objects.create(run=self.run, step='PIPELINE', status='RUNNING', extra={
+            'spec': {'input_pdf_path': 'in.pdf', 'page_ranges': ['1-2'], 'patient_name': 'Jane', 'batch_size': 10},
+            'stages': ['PREFLIGHT', 'SPLIT', 'UPLOAD'],
+            'current': 'SPLIT',
+            'transitions': [],
+        })
+
+    def test_success_submits_the_next_stage_once(self):
+        from .pipeline import stage_finished
+
+        stage_finished(self.run, 'SPLIT', 'SUCCESS')
+        # A duplicate finalize of the same stage is ignored
+        stage_finished(self.run, 'SPLIT', 'SUCCESS')
+
+        self.submit.assert_called_once_with('UPLOAD', 'job-1', ['job-1', 'Jane', 10], user=None, cost=1, holds_slot=False)
+        self.step.refresh_from_db()
+        self.assertEqual(self.step.status, 'RUNNING')
+        self.assertEqual(self.step.extra['current'], 'UPLOAD')
+        self.assertEqual(
+            [(t['stage'], t['status']) for t in self.step.extra['transitions']],
+            [('SPLIT', 'SUCCESS'), ('UPLOAD', 'SUBMITTED')],
+        )
+
+    def test_running_run_hands_its_slot_to_the_next_stage(self):
+        from .pipeline import stage_finished
+
+        self.run.status = 'RUNNING'
+        self.run.save(update_fields=['status'])
+
+        stage_finished(self.run, 'SPLIT', 'SUCCESS')
+
+        self.assertTrue(self.submit.call_args.kwargs['holds_slot'])
+
+    def test_failure_stops_the_pipeline(self):
+        from .pipeline import stage_finished
+
+        stage_finished(self.run, 'SPLIT', 'FAILED')
+
+        self.submit.assert_not_called()
+        self.step.refresh_from_db()
+        self.assertEqual(self.step.status, 'FAILED')
+        self.assertIsNone(self.step.extra['current'])
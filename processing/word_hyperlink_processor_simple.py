@@ -7,6 +7,7 @@ SIMPLE PATTERN:
 - Extract page number, make whole statement a hyperlink
 - Result: "04/05/13. Progress Note. US HEALTHWORKS." (linked to 4-9.pdf)
 """
+import os
 import re
 import copy
 from typing import Optional, Dict
@@ -574,19 +575,50 @@ class WordHyperlinkProcessorSimple:
                     for p in cell.paragraphs:
                         yield p
 
-    def _apply_default_font(self, doc: Document, font_name: str = 'Times New Roman', font_size_pt: int = 12) -> None:
+    @staticmethod
+    def _run_font_fingerprint(r) -> tuple:
+        """(ascii, hAnsi, eastAsia, sz) as currently stored on a w:r element."""
+        rPr = r.rPr
+        if rPr is None:
+            return (None, None, None, None)
+        rFonts = rPr.rFonts
+        sz = rPr.find(qn('w:sz'))
+        return (
+            rFonts.get(qn('w:ascii')) if rFonts is not None else None,
+            rFonts.get(qn('w:hAnsi')) if rFonts is not None else None,
+            rFonts.get(qn('w:eastAsia')) if rFonts is not None else None,
+            sz.get(qn('w:val')) if sz is not None else None,
+        )
+
+    def _apply_default_font(self, doc: Document, font_name: str = 'Times New Roman', font_size_pt: int = 12) -> Dict:
+        """
+        Apply the default font to the Normal style and every run, touching only runs whose
+        font fingerprint differs. Returns {'runs_total': n, 'runs_touched': n, 'style_touched': bool}.
+        """
+        expected = (font_name, font_name, font_name, str(font_size_pt * 2))
+        result = {'runs_total': 0, 'runs_touched': 0, 'style_touched': False}
+
         normal = doc.styles['Normal']
-        normal.font.name = font_name
-        normal.font.size = Pt(font_size_pt)
-        if normal._element.rPr is not None and normal._element.rPr.rFonts is not None:
-            normal._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
+        if self._run_font_fingerprint(normal._element) != expected:
+            normal.font.name = font_name
+            normal.font.size = Pt(font_size_pt)
+            if normal._element.rPr is not None and normal._element.rPr.rFonts is not None:
+                normal._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
+            result['style_touched'] = True
 
         for p in self._iter_all_paragraphs(doc):
-            for run in p.runs:
-                run.font.name = font_name
-                run.font.size = Pt(font_size_pt)
-                if run._element is not None and run._element.rPr is not None and run._element.rPr.rFonts is not None:
-                    run._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
+            for r in p._p.r_lst:
+                result['runs_total'] += 1
+                if self._run_font_fingerprint(r) == expected:
+                    continue
+                rPr = r.get_or_add_rPr()
+                rPr.rFonts_ascii = font_name
+                rPr.rFonts_hAnsi = font_name
+                rPr.sz_val = Pt(font_size_pt)
+                rPr.rFonts.set(qn('w:eastAsia'), font_name)
+                result['runs_touched'] += 1
+
+        return result
 
     def _remove_paragraph_borders(self, paragraph) -> None:
         pPr = paragraph._p.pPr
@@ -596,55 +628,87 @@ class WordHyperlinkProcessorSimple:
         if pBdr is not None:
             pPr.remove(pBdr)
 
-    def _normalize_tables(self, doc: Document) -> None:
-        for table in doc.tables:
-            try:
-                table.style = 'Table Grid'
-            except Exception:
-                pass
+    _TABLE_BORDER_TAGS = ('w:top', 'w:left', 'w:bottom', 'w:right', 'w:insideH', 'w:insideV')
+    _TABLE_BORDER_ATTRS = (('w:val', 'single'), ('w:sz', '4'), ('w:space', '0'), ('w:color', 'auto'))
+
+    @classmethod
+    def _table_borders_fingerprint(cls, tblPr) -> tuple:
+        borders = tblPr.find(qn('w:tblBorders')) if tblPr is not None else None
+        if borders is None:
+            return ()
+        return tuple(
+            (el.tag,) + tuple(el.get(qn(attr)) for attr, _ in cls._TABLE_BORDER_ATTRS)
+            for el in borders
+        )
+
+    def _normalize_tables(self, doc: Document) -> Dict:
+        """
+        Force 'Table Grid' with thin single borders and strip cell shading/borders, mutating
+        only tables and cells that do not already conform.
+        Returns {'tables_total': n, 'tables_touched': n, 'cells_touched': n}.
+        """
+        expected_borders = tuple(
+            (qn(tag),) + tuple(value for _, value in self._TABLE_BORDER_ATTRS)
+            for tag in self._TABLE_BORDER_TAGS
+        )
+        try:
+            grid_style_id = doc.styles['Table Grid'].style_id
+        except KeyError:
+            grid_style_id = None
 
+        result = {'tables_total': 0, 'tables_touched': 0, 'cells_touched': 0}
+
+        for table in doc.tables:
+            result['tables_total'] += 1
             tbl = table._tbl
+            touched = False
+
+            if grid_style_id is None or tbl.tblStyle_val != grid_style_id:
+                try:
+                    table.style = 'Table Grid'
+                    touched = True
+                except Exception:
+                    pass
+
             tblPr = tbl.tblPr
             if tblPr is None:
+                result['tables_touched'] += int(touched)
                 continue
 
-            existing_borders = tblPr.find(qn('w:tblBorders'))
-            if existing_borders is not None:
-                tblPr.remove(existing_borders)
-
-            borders = OxmlElement('w:tblBorders')
+            if self._table_borders_fingerprint(tblPr) != expected_borders:
+                existing_borders = tblPr.find(qn('w:tblBorders'))
+                if existing_borders is not None:
+                    tblPr.remove(existing_borders)
 
-            def _add_border(tag: str):
-                el = OxmlElement(tag)
-                el.set(qn('w:val'), 'single')
-                el.set(qn('w:sz'), '4')
-                el.set(qn('w:space'), '0')
-                el.set(qn('w:color'), 'auto')
-                return el
-
-            borders.append(_add_border('w:top'))
-            borders.append(_add_border('w:left'))
-            borders.append(_add_border('w:bottom'))
-            borders.append(_add_border('w:right'))
-            borders.append(_add_border('w:insideH'))
-            borders.append(_add_border('w:insideV'))
-
-            tblPr.append(borders)
+                borders = OxmlElement('w:tblBorders')
+                for tag in self._TABLE_BORDER_TAGS:
+                    el = OxmlElement(tag)
+                    for attr, value in self._TABLE_BORDER_ATTRS:
+                        el.set(qn(attr), value)
+                    borders.append(el)
+                tblPr.append(borders)
+                touched = True
 
             # Clear cell shading/borders that can appear as thick black/gray bands
-            for row in table.rows:
-                for cell in row.cells:
-                    tcPr = cell._tc.tcPr
+            for tr in tbl.tr_lst:
+                for tc in tr.tc_lst:
+                    tcPr = tc.tcPr
                     if tcPr is None:
                         continue
 
-                    shd = tcPr.find(qn('w:shd'))
-                    if shd is not None:
-                        tcPr.remove(shd)
+                    cell_touched = False
+                    for tag in ('w:shd', 'w:tcBorders'):
+                        el = tcPr.find(qn(tag))
+                        if el is not None:
+                            tcPr.remove(el)
+                            cell_touched = True
+                    if cell_touched:
+                        result['cells_touched'] += 1
+                        touched = True
 
-                    tcBorders = tcPr.find(qn('w:tcBorders'))
-                    if tcBorders is not None:
-                        tcPr.remove(tcBorders)
+            result['tables_touched'] += int(touched)
+
+        return result
 
     def get_pdfs_from_drive_folder(self, drive_folder_id: str) -> Dict[str, str]:
         """Get all PDF files from Drive folder"""
@@ -761,7 +825,216 @@ class WordHyperlinkProcessorSimple:
                 'drive_link': drive_link
             })
 
-        self._apply_default_font(doc, font_name='Times New Roman', font_size_pt=12)
-        self._normalize_tables(doc)
+        stats['normalization'] = {
+            **self._apply_default_font(doc, font_name='Times New Roman', font_size_pt=12),
+            **self._normalize_tables(doc),
+        }
+        doc.save(output_docx_path)
+        return stats
+
+    def process_word_document_streaming(
+        self,
+        input_docx_path: str,
+        pdf_links: Dict[str, str],
+        output_docx_path: Optional[str] = None
+    ) -> Dict:
+        """
+        Same as process_word_document, but only the document body and styles are loaded
+        into memory; embedded media and other parts are streamed from input to output.
+        Falls back to process_word_document for package layouts it cannot handle.
+        """
+        import tempfile
+        from .docx_streaming import build_body_package, assemble_output
+
+        if output_docx_path is None:
+            output_docx_path = input_docx_path
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            body_in = os.path.join(tmp_dir, 'body.docx')
+            body_out = os.path.join(tmp_dir, 'body_processed.docx')
+            try:
+                context = build_body_package(input_docx_path, body_in)
+            except ValueError:
+                stats = self.process_word_document(input_docx_path, pdf_links, output_docx_path)
+                stats['engine'] = 'dom'
+                return stats
+
+            stats = self.process_word_document(body_in, pdf_links, body_out)
+            assemble_output(input_docx_path, body_out, output_docx_path, context)
+
+        stats['engine'] = 'streaming'
+        return stats
+
+    def process_word_document_auto(
+        self,
+        input_docx_path: str,
+        pdf_links: Dict[str, str],
+        output_docx_path: Optional[str] = None,
+        streaming_threshold_bytes: int = 0
+    ) -> Dict:
+        """Use the streaming engine for documents at or above streaming_threshold_bytes."""
+        from .docx_streaming import should_stream
+
+        if should_stream(input_docx_path, streaming_threshold_bytes):
+            return self.process_word_document_streaming(input_docx_path, pdf_links, output_docx_path)
+
+        stats = self.process_word_document(input_docx_path, pdf_links, output_docx_path)
+        stats['engine'] = 'dom'
+        return stats
+
+    def _statement_ranges_by_position(self, doc: Document) -> Dict[int, str]:
+        """Map paragraph position (in _iter_all_paragraphs order) -> page range."""
+        ranges = {}
+        for pos, paragraph in enumerate(self._iter_all_paragraphs(doc)):
+            normalized_text = (paragraph.text or '').replace('\u00a0', ' ').replace('–', '-').replace('—', '-').replace('‑', '-')
+            if not normalized_text.strip() or not self.is_statement_line(normalized_text):
+                continue
+            statement_info = self.parse_statement_with_page_number(normalized_text)
+            if statement_info and statement_info.get('pages_span'):
+                ranges[pos] = statement_info['page_range']
+        return ranges
+
+    def relink_processed_document(
+        self,
+        processed_docx_path: str,
+        pdf_links: Dict[str, str],
+        output_docx_path: Optional[str] = None,
+        source_docx_path: Optional[str] = None,
+    ) -> Dict:
+        """
+        Incrementally refresh links in an already processed (_PROCESSED.docx) document.
+
+        Logic:
+        1. Statements that already carry a w:hyperlink keep their runs untouched; only the
+           relationship target is swapped when the Drive link for their page range changed
+        2. Statements that are still unlinked (page range text present) are linked if their
+           page range now resolves
+        3. Nothing changed -> the document is not re-serialized at all
+
+        Linking removes the page range text, so the page range of an existing link is read
+        from source_docx_path (the original input, same paragraph order) when given, and
+        otherwise inferred from the current link target being one of pdf_links' values.
+        """
+        import shutil
+
+        if output_docx_path is None:
+            output_docx_path = processed_docx_path
+
+        doc = Document(processed_docx_path)
+        part = doc.part
+        source_ranges = self._statement_ranges_by_position(Document(source_docx_path)) if source_docx_path else {}
+        range_by_url = {url: page_range for page_range, url in pdf_links.items()}
+
+        stats = {
+            'total_statements': 0,
+            'linked_statements': 0,
+            'unlinked_statements': 0,
+            'statements': [],
+            'incremental': {
+                'retargeted': 0,
+                'newly_linked': 0,
+                'unchanged': 0,
+                'changed': False,
+            },
+        }
+        incremental = stats['incremental']
+        detached_rids = set()
+
+        for pos, paragraph in enumerate(self._iter_all_paragraphs(doc)):
+            hyperlinks = [h for h in paragraph._p.findall(qn('w:hyperlink')) if h.get(qn('r:id'))]
+            if hyperlinks:
+                hyperlink = hyperlinks[0]
+                r_id = hyperlink.get(qn('r:id'))
+                rel = part.rels.get(r_id)
+                current_url = rel.target_ref if rel is not None and rel.is_external else None
+                page_range = source_ranges.get(pos) or range_by_url.get(current_url)
+                if page_range is None and pos not in source_ranges and source_docx_path:
+                    # Not a statement in the source document (e.g. a link typed by hand)
+                    continue
+
+                stats['total_statements'] += 1
+                stats['linked_statements'] += 1
+                desired_url = pdf_links.get(page_range) if page_range else None
+
+                if desired_url and desired_url != current_url:
+                    new_r_id = part.relate_to(
+                        desired_url,
+                        'http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink',
+                        is_external=True,
+                    )
+                    for h in hyperlinks:
+                        if h.get(qn('r:id')) == r_id:
+                            h.set(qn('r:id'), new_r_id)
+                    detached_rids.add(r_id)
+                    incremental['retargeted'] += 1
+                    stmt_status = 'retargeted'
+                else:
+                    incremental['unchanged'] += 1
+                    stmt_status = 'linked'
+
+                stats['statements'].append({
+                    'page_range': page_range or '',
+                    'text': paragraph.text,
+                    'status': stmt_status,
+                    'drive_link': desired_url or current_url,
+                })
+                continue
+
+            normalized_text = (paragraph.text or '').replace('\u00a0', ' ').replace('–', '-').replace('—', '-').replace('‑', '-')
+            if not normalized_text.strip() or not self.is_statement_line(normalized_text):
+                continue
+
+            statement_info = self.parse_statement_with_page_number(normalized_text)
+            if not statement_info or not statement_info.get('pages_span'):
+                continue
+
+            page_range = statement_info['page_range']
+            stats['total_statements'] += 1
+
+            drive_link = pdf_links.get(page_range)
+            if drive_link:
+                try:
+                    self._remove_paragraph_borders(paragraph)
+                    self._link_statement_in_paragraph(paragraph, statement_info['pages_span'], drive_link)
+                except Exception:
+                    drive_link = None
+
+            if not drive_link:
+                stats['unlinked_statements'] += 1
+                stats['statements'].append({
+                    'page_range': page_range,
+                    'text': statement_info.get('header_text', ''),
+                    'status': 'not_found',
+                    'reason': f'No PDF found for pages {page_range}'
+                })
+                continue
+
+            incremental['newly_linked'] += 1
+            stats['linked_statements'] += 1
+            stats['statements'].append({
+                'page_range': page_range,
+                'text': statement_info.get('header_text', ''),
+                'status': 'linked',
+                'drive_link': drive_link
+            })
+
+        for r_id in detached_rids:
+            # Not part.drop_rel(): it also deletes a relationship that one hyperlink
+            # (e.g. a statement this relink skipped) still references
+            if part._rel_ref_count(r_id) == 0:
+                del part.rels[r_id]
+
+        incremental['changed'] = bool(incremental['retargeted'] or incremental['newly_linked'])
+        if not incremental['changed']:
+            if os.path.abspath(output_docx_path) != os.path.abspath(processed_docx_path):
+                shutil.copyfile(processed_docx_path, output_docx_path)
+            return stats
+
+        if incremental['newly_linked']:
+            # Newly linked statements are the only new content; retargets never touch runs.
+            stats['normalization'] = {
+                **self._apply_default_font(doc, font_name='Times New Roman', font_size_pt=12),
+                **self._normalize_tables(doc),
+            }
         doc.save(output_docx_path)
         return stats
@@ -0,0 +1,39 @@
+"""
+Per-process setup of split worker processes.
+
+Celery sends worker_process_init in every prefork child (and once for a solo
+worker) before it takes a task; pdf_automation/celery.py hands it to
+bootstrap_worker_process(). Without it the first split chunk of every process
+paid for importing pikepdf/PyPDF2 (and probing qpdf) on top of opening the input.
+
+Thread pools (the upload and control workers) do not send the signal and do not
+split, so they stay light.
+"""
+import logging
+import time
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def bootstrap_worker_process(**kwargs) -> None:
+    if not getattr(settings, 'WORKER_PRELOAD_SPLIT_BACKENDS', True):
+        return
+    from .split_backends import preload_backends
+
+    t0 = time.perf_counter()
+    timings = preload_backends()
+    logger.debug(
+        "preloaded split backends in %d ms (%s)",
+        int((time.perf_counter() - t0) * 1000),
+        ', '.join(f'{name}={ms}ms' for name, ms in timings.items()) or 'none available',
+    )
+
+
+def shutdown_worker_process(**kwargs) -> None:
+    """Close the inputs this process still holds open."""
+    from .split_backends import input_handles
+
+    input_handles.close()
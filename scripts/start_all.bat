@@ -22,18 +22,10 @@ start "Redis" cmd /k "redis-server"
 REM Start Django
 start "Django" cmd /k "cd /d \"%PROJECT_DIR%\" ^&^& call venv\Scripts\activate.bat ^&^& set \"DJANGO_MEDIA_ROOT=%DJANGO_MEDIA_ROOT%\" ^&^& python manage.py runserver 0.0.0.0:8000"
 
-REM Start Celery workers
-start "Celery Split" cmd /k "cd /d \"%PROJECT_DIR%\" ^&^& call venv\Scripts\activate.bat ^&^& set \"DJANGO_MEDIA_ROOT=%DJANGO_MEDIA_ROOT%\" ^&^& celery -A pdf_automation worker -P solo -l info -Q split --hostname=split@%%h"
-
-REM Upload workers (parallel)
-start "Celery Upload 1" cmd /k "cd /d \"%PROJECT_DIR%\" ^&^& call venv\Scripts\activate.bat ^&^& set \"DJANGO_MEDIA_ROOT=%DJANGO_MEDIA_ROOT%\" ^&^& celery -A pdf_automation worker -P solo -l info -Q upload --hostname=upload1@%%h"
-start "Celery Upload 2" cmd /k "cd /d \"%PROJECT_DIR%\" ^&^& call venv\Scripts\activate.bat ^&^& set \"DJANGO_MEDIA_ROOT=%DJANGO_MEDIA_ROOT%\" ^&^& celery -A pdf_automation worker -P solo -l info -Q upload --hostname=upload2@%%h"
-start "Celery Upload 3" cmd /k "cd /d \"%PROJECT_DIR%\" ^&^& call venv\Scripts\activate.bat ^&^& set \"DJANGO_MEDIA_ROOT=%DJANGO_MEDIA_ROOT%\" ^&^& celery -A pdf_automation worker -P solo -l info -Q upload --hostname=upload3@%%h"
-
-REM Optional default queue worker (uncomment if you have tasks routed to default)
-REM start "Celery Default" cmd /k "cd /d %PROJECT_DIR% ^&^& venv\Scripts\activate ^&^& set DJANGO_MEDIA_ROOT=%DJANGO_MEDIA_ROOT% ^&^& celery -A pdf_automation worker -P solo -l info -Q default --hostname=default@%%h"
+REM Start Celery workers (split, upload and control; see WORKER_PROFILES in settings)
+start "Celery Workers" cmd /k "cd /d \"%PROJECT_DIR%\" ^&^& call venv\Scripts\activate.bat ^&^& set \"DJANGO_MEDIA_ROOT=%DJANGO_MEDIA_ROOT%\" ^&^& python manage.py run_workers"
 
 echo.
-echo Started: Redis, Django, Celery(split), Celery(upload x3)
+echo Started: Redis, Django, Celery(split, upload, control)
 echo.
 endlocal